@@ -0,0 +1,156 @@
+"""
+Zinc Selection Operations Benchmark
+
+Times the bulk selection operations in opencmiss.zincwidgets.selectionoperations
+on a square grid of bilinear elements, by default 1000 x 1000 nodes, and
+prints one line per operation. Requires the OpenCMISS-Zinc Python bindings
+and NumPy; no graphics or Qt are needed.
+
+    python benchmarks/selectionoperations_benchmark.py [--size N] [--repeat R]
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import argparse
+import os
+import sys
+from timeit import default_timer
+
+import numpy
+
+from opencmiss.zinc.context import Context
+from opencmiss.zinc.element import Element, Elementbasis
+from opencmiss.zinc.field import Field
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'opencmiss', 'zincwidgets'))
+
+from selectionoperations import ElementNodeAdjacency, changeNodesetGroup, changeMeshGroup, \
+    invertNodesetGroup, nodesetIdentifiers
+
+
+def createGrid(region, size):
+    '''
+    Create size x size nodes with 3-D coordinates and the (size - 1)^2
+    bilinear square elements between them.
+    '''
+    fieldmodule = region.getFieldmodule()
+    fieldmodule.beginChange()
+    coordinates = fieldmodule.createFieldFiniteElement(3)
+    coordinates.setName('coordinates')
+    coordinates.setManaged(True)
+    coordinates.setTypeCoordinate(True)
+    nodeset = fieldmodule.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
+    nodetemplate = nodeset.createNodetemplate()
+    nodetemplate.defineField(coordinates)
+    fieldcache = fieldmodule.createFieldcache()
+    for j in range(size):
+        for i in range(size):
+            node = nodeset.createNode(j*size + i + 1, nodetemplate)
+            fieldcache.setNode(node)
+            coordinates.assignReal(fieldcache, [float(i), float(j), 0.0])
+    mesh = fieldmodule.findMeshByDimension(2)
+    basis = fieldmodule.createElementbasis(2, Elementbasis.FUNCTION_TYPE_LINEAR_LAGRANGE)
+    eft = mesh.createElementfieldtemplate(basis)
+    elementtemplate = mesh.createElementtemplate()
+    elementtemplate.setElementShapeType(Element.SHAPE_TYPE_SQUARE)
+    elementtemplate.defineField(coordinates, -1, eft)
+    for j in range(size - 1):
+        for i in range(size - 1):
+            element = mesh.createElement(j*(size - 1) + i + 1, elementtemplate)
+            first = j*size + i + 1
+            element.setNodesByIdentifier(eft, [first, first + 1, first + size, first + size + 1])
+    fieldmodule.endChange()
+    return coordinates, nodeset, mesh
+
+
+def timeOperation(name, repeat, setup, operation):
+    '''
+    Run setup then time operation repeat times, printing the best time.
+    '''
+    times = []
+    for _ in range(repeat):
+        setup()
+        start = default_timer()
+        operation()
+        times.append(default_timer() - start)
+    print('%-40s %10.4f s' % (name, min(times)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Zinc bulk selection operations.')
+    parser.add_argument('--size', type=int, default=1000, help='nodes along each side of the grid')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each operation, best is reported')
+    args = parser.parse_args()
+
+    context = Context('selectionoperations_benchmark')
+    region = context.getDefaultRegion()
+    start = default_timer()
+    coordinates, nodeset, mesh = createGrid(region, args.size)
+    print('%-40s %10.4f s' % ('create %d nodes, %d elements' % (nodeset.getSize(), mesh.getSize()),
+                             default_timer() - start))
+
+    fieldmodule = region.getFieldmodule()
+    group = fieldmodule.createFieldGroup()
+    nodegroup = group.createFieldNodeGroup(nodeset)
+    nodesetgroup = nodegroup.getNodesetGroup()
+    elementgroup = group.createFieldElementGroup(mesh)
+    meshgroup = elementgroup.getMeshGroup()
+    node_count = nodeset.getSize()
+    element_count = mesh.getSize()
+    random_identifiers = numpy.unique(numpy.random.randint(1, node_count + 1, node_count//10))
+    most_ranges = [(1, (node_count*9)//10)]
+
+    def clearNodes():
+        nodesetgroup.removeAllNodes()
+
+    def selectAllNodes():
+        changeNodesetGroup(nodesetgroup, nodeset, True, ranges=[(1, node_count)])
+
+    def changed(function, *args, **kwargs):
+        def operation():
+            fieldmodule.beginChange()
+            function(*args, **kwargs)
+            fieldmodule.endChange()
+        return operation
+
+    def selectRandomNodes():
+        clearNodes()
+        changed(changeNodesetGroup, nodesetgroup, nodeset, True, identifiers=random_identifiers)()
+
+    timeOperation('select 10% random nodes by identifier', args.repeat, clearNodes,
+                  changed(changeNodesetGroup, nodesetgroup, nodeset, True, identifiers=random_identifiers))
+    timeOperation('select 40% of nodes by range', args.repeat, clearNodes,
+                  changed(changeNodesetGroup, nodesetgroup, nodeset, True, ranges=[(1, (node_count*4)//10)]))
+    timeOperation('select 90% of nodes by range', args.repeat, clearNodes,
+                  changed(changeNodesetGroup, nodesetgroup, nodeset, True, ranges=most_ranges))
+    timeOperation('select all nodes by range', args.repeat, clearNodes,
+                  changed(changeNodesetGroup, nodesetgroup, nodeset, True, ranges=[(1, node_count)]))
+    timeOperation('deselect 10% random nodes', args.repeat, selectAllNodes,
+                  changed(changeNodesetGroup, nodesetgroup, nodeset, False, identifiers=random_identifiers))
+    timeOperation('deselect 90% of nodes by range', args.repeat, selectAllNodes,
+                  changed(changeNodesetGroup, nodesetgroup, nodeset, False, ranges=most_ranges))
+    timeOperation('invert 10% node selection', args.repeat, selectRandomNodes,
+                  changed(invertNodesetGroup, nodegroup, nodeset))
+    timeOperation('read node group identifiers', args.repeat, selectAllNodes,
+                  lambda: nodesetIdentifiers(nodesetgroup))
+
+    def clearElements():
+        meshgroup.removeAllElements()
+
+    timeOperation('select all elements by range', args.repeat, clearElements,
+                  changed(changeMeshGroup, meshgroup, mesh, True, ranges=[(1, element_count)]))
+
+    adjacency = ElementNodeAdjacency(mesh, coordinates)
+    timeOperation('build element node adjacency', 1, lambda: None, adjacency.getArrays)
+    seed = numpy.arange(1, node_count + 1, 97, dtype=numpy.int64)
+    timeOperation('grow nodes from every 97th node', args.repeat, lambda: None,
+                  lambda: adjacency.growNodes(seed))
+    grown = adjacency.growNodes(seed)
+    timeOperation('shrink grown nodes', args.repeat, lambda: None,
+                  lambda: adjacency.shrinkNodes(grown))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""
+Zinc Camera Animation
+
+Animates the view parameters (eye, lookat, up and view angle) of a Zinc
+Sceneviewer Widget over time with easing, and plays keyframed camera paths
+either live or frame by frame into an OffscreenSceneviewer to produce image
+sequences.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import math
+from timeit import default_timer
+
+try:
+    from PySide import QtCore
+except ImportError:
+    from PyQt4 import QtCore
+
+
+def easeLinear(t):
+    return t
+
+def easeInOutQuad(t):
+    if t < 0.5:
+        return 2.0*t*t
+    return 1.0 - 2.0*(1.0 - t)*(1.0 - t)
+
+def easeInOutCubic(t):
+    if t < 0.5:
+        return 4.0*t*t*t
+    return 1.0 - 4.0*(1.0 - t)*(1.0 - t)*(1.0 - t)
+
+def easeInOutSine(t):
+    return 0.5 - 0.5*math.cos(math.pi*t)
+
+
+def _lerp(a, b, t):
+    return [a[i] + (b[i] - a[i])*t for i in range(len(a))]
+
+def _dot(a, b):
+    return a[0]*b[0] + a[1]*b[1] + a[2]*b[2]
+
+def _cross(a, b):
+    return [a[1]*b[2] - a[2]*b[1], a[2]*b[0] - a[0]*b[2], a[0]*b[1] - a[1]*b[0]]
+
+def _normalise(v):
+    '''
+    Return v scaled to unit length, or None if its length is near zero.
+    '''
+    magnitude = math.sqrt(_dot(v, v))
+    if magnitude > 1.0E-12:
+        return [v[0]/magnitude, v[1]/magnitude, v[2]/magnitude]
+    return None
+
+def _perpendicular(v, unit):
+    '''
+    Return the unit component of v normal to unit vector unit, or None.
+    '''
+    along = _dot(v, unit)
+    return _normalise([v[i] - along*unit[i] for i in range(3)])
+
+
+def _interpolateUp(start_up, end_up, view, t):
+    '''
+    Rotate the start up vector towards the end up vector about the view
+    direction, so opposite up vectors roll the view instead of passing
+    through zero. Falls back to normalised linear interpolation if an up
+    vector is along the view direction.
+    '''
+    direction = _normalise(view)
+    if direction is not None:
+        u0 = _perpendicular(start_up, direction)
+        u1 = _perpendicular(end_up, direction)
+        if u0 is not None and u1 is not None:
+            angle = math.atan2(_dot(_cross(u0, u1), direction), _dot(u0, u1))*t
+            v0 = _cross(direction, u0)
+            return [u0[i]*math.cos(angle) + v0[i]*math.sin(angle) for i in range(3)]
+    up = _normalise(_lerp(start_up, end_up, t))
+    if up is None:
+        up = _normalise(start_up if t < 0.5 else end_up)
+    return up if up is not None else list(end_up)
+
+
+def interpolateViewParameters(start, end, t):
+    '''
+    Interpolate between two (eye, lookat, up, angle) view parameter tuples at
+    fraction t in [0, 1].
+    '''
+    eye = _lerp(start[0], end[0], t)
+    lookat = _lerp(start[1], end[1], t)
+    up = _interpolateUp(start[2], end[2], [lookat[i] - eye[i] for i in range(3)], t)
+    angle = start[3] + (end[3] - start[3])*t
+    return (eye, lookat, up, angle)
+
+
+class CameraKeyframe(object):
+
+    def __init__(self, time, eye, lookat, up, angle, easing=easeInOutSine):
+        '''
+        A view at a time in seconds from the start of the path. The easing
+        function shapes the interpolation from the previous keyframe to this.
+        '''
+        self.time = time
+        self.view_parameters = (list(eye), list(lookat), list(up), angle)
+        self.easing = easing
+
+
+class CameraPath(object):
+
+    def __init__(self):
+        self._keyframes = []
+
+    def addKeyframe(self, time, eye, lookat, up, angle, easing=easeInOutSine):
+        keyframe = CameraKeyframe(time, eye, lookat, up, angle, easing)
+        self._keyframes.append(keyframe)
+        self._keyframes.sort(key=lambda k: k.time)
+        return keyframe
+
+    def appendKeyframe(self, duration, eye, lookat, up, angle, easing=easeInOutSine):
+        '''
+        Add a keyframe duration seconds after the last keyframe.
+        '''
+        time = self._keyframes[-1].time + duration if self._keyframes else 0.0
+        return self.addKeyframe(time, eye, lookat, up, angle, easing)
+
+    def getKeyframes(self):
+        return list(self._keyframes)
+
+    def getDuration(self):
+        if self._keyframes:
+            return self._keyframes[-1].time - self._keyframes[0].time
+        return 0.0
+
+    def evaluate(self, time):
+        '''
+        Return the (eye, lookat, up, angle) view parameters at the time in
+        seconds from the first keyframe, or None if the path is empty.
+        '''
+        if not self._keyframes:
+            return None
+        time += self._keyframes[0].time
+        if time <= self._keyframes[0].time:
+            return self._keyframes[0].view_parameters
+        for previous, keyframe in zip(self._keyframes[:-1], self._keyframes[1:]):
+            if time <= keyframe.time:
+                span = keyframe.time - previous.time
+                t = (time - previous.time)/span if span > 0.0 else 1.0
+                return interpolateViewParameters(previous.view_parameters, keyframe.view_parameters, keyframe.easing(t))
+        return self._keyframes[-1].view_parameters
+
+    def renderFrames(self, offscreen_sceneviewer, filename_pattern, frame_rate=25.0):
+        '''
+        Render the path frame by frame with an OffscreenSceneviewer, saving
+        each frame to filename_pattern % frame_number, e.g. 'frame%04d.png'.
+        Returns the number of frames written, none for an empty path.
+        '''
+        if not self._keyframes:
+            return 0
+        number_of_frames = int(math.floor(self.getDuration()*frame_rate)) + 1
+        for frame_number in range(number_of_frames):
+            eye, lookat, up, angle = self.evaluate(frame_number/float(frame_rate))
+            offscreen_sceneviewer.setViewParameters(eye, lookat, up, angle)
+            offscreen_sceneviewer.renderToFile(filename_pattern % frame_number)
+        return number_of_frames
+
+
+class CameraAnimator(QtCore.QObject):
+
+    try:
+        # PySide
+        animationFinished = QtCore.Signal()
+    except AttributeError:
+        # PyQt
+        animationFinished = QtCore.pyqtSignal()
+
+    def __init__(self, sceneviewerwidget, parent=None):
+        '''
+        Animates the view of the given SceneviewerWidget. A single timer
+        drives all animation, ticking at the widget's maximum frame rate, and
+        the widget's frame scheduler only renders when a frame is due.
+        '''
+        QtCore.QObject.__init__(self, parent)
+        self._sceneviewerwidget = sceneviewerwidget
+        self._path = None
+        self._start_time = None
+        self._timer = QtCore.QTimer(self)
+        self._timer.timeout.connect(self._tick)
+
+    def isAnimating(self):
+        return self._timer.isActive()
+
+    def animateTo(self, eye, lookat, up, angle, duration, easing=easeInOutSine):
+        '''
+        Animate from the current view to the given view over duration seconds.
+        '''
+        current = self._sceneviewerwidget.getViewParameters()
+        path = CameraPath()
+        path.addKeyframe(0.0, current[0], current[1], current[2], current[3])
+        path.addKeyframe(duration, eye, lookat, up, angle, easing)
+        self.play(path)
+
+    def play(self, path):
+        '''
+        Play a CameraPath live in the widget from its start. Returns False
+        without playing if the path has no keyframes.
+        '''
+        if not path.getKeyframes():
+            self.stop()
+            return False
+        self._path = path
+        self._start_time = default_timer()
+        rate = self._sceneviewerwidget.getMaximumFrameRate()
+        self._timer.start(int(1000.0/rate) if rate else 0)
+        self._tick()
+        return True
+
+    def stop(self):
+        self._timer.stop()
+        self._path = None
+
+    def _tick(self):
+        if self._path is None:
+            return
+        elapsed = default_timer() - self._start_time
+        eye, lookat, up, angle = self._path.evaluate(elapsed)
+        self._sceneviewerwidget.setViewParameters(eye, lookat, up, angle)
+        if elapsed >= self._path.getDuration():
+            self.stop()
+            self.animationFinished.emit()
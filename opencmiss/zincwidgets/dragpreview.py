@@ -0,0 +1,76 @@
+"""
+Zinc Drag Preview
+
+Shows where dragged nodes will move to without changing them: proxy point
+graphics for the selected nodes are drawn at their coordinates plus a
+constant offset field, so a drag only re-evaluates the proxy glyphs instead
+of every graphics and field depending on the node coordinates. The offset
+is applied to the nodes once when the drag is committed.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from opencmiss.zinc.field import Field
+from opencmiss.zinc.graphics import Graphics
+from opencmiss.zinc.status import OK
+
+
+class DragPreview(object):
+
+    def __init__(self, graphics, coordinate_field, nodegroup):
+        '''
+        Preview moving the nodes in nodegroup, a node group field, drawn by
+        the node points graphics with coordinate_field.
+        '''
+        self._coordinate_field = coordinate_field
+        self._number_of_components = coordinate_field.getNumberOfComponents()
+        self._delta = [0.0]*self._number_of_components
+        fieldmodule = coordinate_field.getFieldmodule()
+        self._scene = graphics.getScene()
+        self._scene.beginChange()
+        fieldmodule.beginChange()
+        self._fieldcache = fieldmodule.createFieldcache()
+        self._offset = fieldmodule.createFieldConstant(self._delta)
+        proxy_coordinates = fieldmodule.createFieldAdd(coordinate_field, self._offset)
+        fieldmodule.endChange()
+        self._graphics = self._scene.createGraphicsPoints()
+        self._graphics.setFieldDomainType(Field.DOMAIN_TYPE_NODES)
+        self._graphics.setCoordinateField(proxy_coordinates)
+        self._graphics.setSubgroupField(nodegroup)
+        self._graphics.setMaterial(graphics.getSelectedMaterial())
+        self._graphics.setSelectMode(Graphics.SELECT_MODE_OFF)
+        picked_attributes = graphics.getGraphicspointattributes()
+        attributes = self._graphics.getGraphicspointattributes()
+        attributes.setGlyph(picked_attributes.getGlyph())
+        result, base_size = picked_attributes.getBaseSize(3)
+        if result == OK:
+            attributes.setBaseSize(base_size)
+        result, scale_factors = picked_attributes.getScaleFactors(3)
+        if result == OK:
+            attributes.setScaleFactors(scale_factors)
+        attributes.setOrientationScaleField(picked_attributes.getOrientationScaleField())
+        self._scene.endChange()
+
+    def setDelta(self, xdiff, ydiff, zdiff):
+        '''
+        Move the proxy graphics to the node coordinates plus the delta.
+        '''
+        self._delta = ([xdiff, ydiff, zdiff] + [0.0]*self._number_of_components)[:self._number_of_components]
+        self._offset.assignReal(self._fieldcache, self._delta)
+
+    def getDelta(self):
+        return (self._delta + [0.0, 0.0])[:3]
+
+    def isActive(self):
+        return self._graphics is not None
+
+    def end(self):
+        '''
+        Remove the proxy graphics and return the final delta.
+        '''
+        if self._graphics is not None:
+            self._scene.removeGraphics(self._graphics)
+            self._graphics = None
+        return self.getDelta()
@@ -0,0 +1,181 @@
+"""
+Zinc Edit History
+
+Undo and redo of node edits. Each edit records the identifiers of the
+changed nodes and their field values before and after the edit as NumPy
+arrays, and is undone or redone in a single Zinc change. The history is
+bounded by memory, discarding the oldest edits first.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import numpy
+
+from opencmiss.zinc.status import OK
+
+DEFAULT_MEMORY_LIMIT = 64*1024*1024  # bytes
+
+
+def readNodeValues(field, nodeset, identifiers):
+    '''
+    Return the identifiers of the nodes in nodeset where field is defined and
+    an N x components array of its values at them.
+    '''
+    fieldmodule = field.getFieldmodule()
+    fieldcache = fieldmodule.createFieldcache()
+    number_of_components = field.getNumberOfComponents()
+    evaluated = numpy.zeros(len(identifiers), dtype=numpy.int64)
+    values = numpy.zeros((len(identifiers), number_of_components))
+    count = 0
+    for identifier in identifiers:
+        fieldcache.setNode(nodeset.findNodeByIdentifier(int(identifier)))
+        result, value = field.evaluateReal(fieldcache, number_of_components)
+        if result == OK:
+            evaluated[count] = identifier
+            values[count] = value
+            count += 1
+    return evaluated[:count], values[:count]
+
+
+def writeNodeValues(field, nodeset, identifiers, values):
+    '''
+    Assign rows of values to field at the nodes with the given identifiers in
+    a single change.
+    '''
+    fieldmodule = field.getFieldmodule()
+    fieldmodule.beginChange()
+    fieldcache = fieldmodule.createFieldcache()
+    for identifier, value in zip(identifiers, values):
+        node = nodeset.findNodeByIdentifier(int(identifier))
+        if node.isValid():
+            fieldcache.setNode(node)
+            field.assignReal(fieldcache, value.tolist())
+    fieldmodule.endChange()
+
+
+class NodeValuesEdit(object):
+
+    def __init__(self, field, nodeset, identifiers, before, after):
+        '''
+        Change of field values at nodes, with before and after arrays of one
+        row per identifier.
+        '''
+        self._field = field
+        self._nodeset = nodeset
+        self._identifiers = identifiers
+        self._before = before
+        self._after = after
+
+    def getMemorySize(self):
+        return self._identifiers.nbytes + self._before.nbytes + self._after.nbytes
+
+    def undo(self):
+        writeNodeValues(self._field, self._nodeset, self._identifiers, self._before)
+
+    def redo(self):
+        writeNodeValues(self._field, self._nodeset, self._identifiers, self._after)
+
+
+class NodeCreateEdit(object):
+
+    def __init__(self, field, nodeset, identifier, values):
+        '''
+        Creation of a node with field defined and set to values.
+        '''
+        self._field = field
+        self._nodeset = nodeset
+        self._identifier = identifier
+        self._values = numpy.array(values, dtype=numpy.float64)
+
+    def getMemorySize(self):
+        return self._values.nbytes + 8
+
+    def undo(self):
+        node = self._nodeset.findNodeByIdentifier(self._identifier)
+        if node.isValid():
+            self._nodeset.destroyNode(node)
+
+    def redo(self):
+        fieldmodule = self._field.getFieldmodule()
+        fieldmodule.beginChange()
+        nodetemplate = self._nodeset.createNodetemplate()
+        nodetemplate.defineField(self._field)
+        node = self._nodeset.createNode(self._identifier, nodetemplate)
+        fieldcache = fieldmodule.createFieldcache()
+        fieldcache.setNode(node)
+        self._field.assignReal(fieldcache, self._values.tolist())
+        fieldmodule.endChange()
+
+
+class EditHistory(object):
+
+    def __init__(self, memory_limit=DEFAULT_MEMORY_LIMIT):
+        '''
+        Undo and redo stacks of edits. The oldest edits are discarded when
+        the edits use more than memory_limit bytes.
+        '''
+        self._memory_limit = memory_limit
+        self._undo = []
+        self._redo = []
+        # running total of the memory sizes of the edits in both stacks
+        self._memory_size = 0
+
+    def setMemoryLimit(self, memory_limit):
+        self._memory_limit = memory_limit
+        self._evict()
+
+    def getMemoryLimit(self):
+        return self._memory_limit
+
+    def getMemorySize(self):
+        return self._memory_size
+
+    def _evict(self):
+        while self._undo and self._memory_size > self._memory_limit:
+            self._memory_size -= self._undo.pop(0).getMemorySize()
+        while self._redo and self._memory_size > self._memory_limit:
+            self._memory_size -= self._redo.pop(0).getMemorySize()
+
+    def push(self, edit):
+        '''
+        Record an edit which has been made. Clears redo.
+        '''
+        self._undo.append(edit)
+        self._memory_size += edit.getMemorySize() - sum(redo_edit.getMemorySize() for redo_edit in self._redo)
+        self._redo = []
+        self._evict()
+
+    def canUndo(self):
+        return len(self._undo) > 0
+
+    def canRedo(self):
+        return len(self._redo) > 0
+
+    def undo(self):
+        '''
+        Undo the last edit. Returns False if there is nothing to undo.
+        '''
+        if not self._undo:
+            return False
+        edit = self._undo.pop()
+        edit.undo()
+        self._redo.append(edit)
+        return True
+
+    def redo(self):
+        '''
+        Redo the last undone edit. Returns False if there is nothing to redo.
+        '''
+        if not self._redo:
+            return False
+        edit = self._redo.pop()
+        edit.redo()
+        self._undo.append(edit)
+        return True
+
+    def clear(self):
+        self._undo = []
+        self._redo = []
+        self._memory_size = 0
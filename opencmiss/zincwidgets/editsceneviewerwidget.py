@@ -14,12 +14,21 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # See the examples at https://svn.physiomeproject.org/svn/cmiss/zinc/bindings/trunk/python/ for further
 # information.
 
+from timeit import default_timer
+
+import numpy
+
 try:
     from PySide import QtCore, QtOpenGL
 except ImportError:
     from PyQt4 import QtCore, QtOpenGL
     
 from selectionsceneviewerwidget import SelectionSceneviewerWidget, SelectionMode
+from selectionoperations import getRegionGroup, nodesetIdentifiers
+from dragpreview import DragPreview
+from edithistory import EditHistory, NodeValuesEdit, NodeCreateEdit, readNodeValues
+from meshlocationcache import MeshLocationCache
+from raysurface import RaySurfaceIntersector
 from opencmiss.zinc.sceneviewer import Sceneviewer, Sceneviewerevent
 from opencmiss.zinc.graphics import Graphics
 from opencmiss.zinc.sceneviewerinput import Sceneviewerinput
@@ -31,6 +40,7 @@ from opencmiss.zinc.scenecoordinatesystem import \
         SCENECOORDINATESYSTEM_WINDOW_PIXEL_TOP_LEFT,\
         SCENECOORDINATESYSTEM_WORLD
 from opencmiss.zinc.field import Field, FieldFindMeshLocation
+from opencmiss.zinc.status import OK, WARNING_PART_DONE
 import math
 from editsceneviewerwidget_ui import Ui_EditSceneviewerWidget
 
@@ -50,6 +60,7 @@ class NodeEditInfo():
         self._variableScaleField = Field()        
         self._nearestElement = None
         self._elementCoordinateField = None
+        self._surfacesGraphics = None
         self._createCoordinatesField = None
 
 class EditSceneviewerWidget(SelectionSceneviewerWidget):
@@ -66,9 +77,139 @@ class EditSceneviewerWidget(SelectionSceneviewerWidget):
         self._editModifier = QtCore.Qt.CTRL
         self._nodeEditInfo = NodeEditInfo()
         self._createCoordinatesField = None
+        # (coordinate field, constant offset field, assignment of coordinates + offset), reused between moves
+        self._coordinateDeltaAssignments = []
+        self._dragPreviewEnabled = False
+        self._dragPreview = None
+        # Each edit gesture is recorded once, from values read on press and release
+        self._editHistory = EditHistory()
+        self._edit_before = None
+        self._meshLocationCache = MeshLocationCache()
+        self._raySurfaceIntersectors = []
         
     def setEditModifier(self, modifierIn):
         self._editModifier = modifierIn
+
+    def setDragPreview(self, enabled):
+        '''
+        When enabled, dragging selected nodes moves proxy graphics of them and
+        the node coordinates are changed once on mouse release, so graphics
+        depending on the coordinates are not rebuilt during the drag. Escape
+        cancels the drag.
+        '''
+        self._dragPreviewEnabled = enabled
+
+    def isDragPreview(self):
+        return self._dragPreviewEnabled
+
+    def getMeshLocationCache(self):
+        return self._meshLocationCache
+
+    def getPlacementStatistics(self):
+        '''
+        Return a dict of Newton iteration and constraint step counts and
+        times in seconds of surface constrained node placements, see
+        MeshLocationCache.getStatistics.
+        '''
+        return self._meshLocationCache.getStatistics()
+
+    def getRaySurfaceIntersector(self, graphics):
+        '''
+        Return the ray surface intersector for the faces drawn by graphics, a
+        surfaces graphics, created again only if its settings change.
+        '''
+        for index, intersector in enumerate(self._raySurfaceIntersectors):
+            if intersector.getGraphics() == graphics:
+                if not intersector.isCurrent():
+                    intersector = RaySurfaceIntersector(graphics)
+                    self._raySurfaceIntersectors[index] = intersector
+                return intersector
+        intersector = RaySurfaceIntersector(graphics)
+        self._raySurfaceIntersectors.append(intersector)
+        return intersector
+
+    def _setRaySurfaceChangedNodes(self, nodesetgroup):
+        '''
+        Tell the ray surface intersectors which nodes an edit is changing, or
+        None once it is complete.
+        '''
+        for intersector in self._raySurfaceIntersectors:
+            intersector.setChangedNodes(nodesetgroup)
+
+    def getPickRay(self, x, y):
+        '''
+        Return the global coordinates of the point under window coordinates
+        x, y on the clipping plane nearest the eye and the vector from it to
+        the point on the other clipping plane.
+        '''
+        points = self.unprojectPoints([[x, -y, -1.0], [x, -y, 1.0]])
+        if points is None:
+            return None
+        eye = numpy.array(self.getViewParameters()[0])
+        if numpy.sum((points[1] - eye)**2) < numpy.sum((points[0] - eye)**2):
+            points = points[::-1]
+        return points[0], points[1] - points[0]
+
+    def intersectSurface(self, graphics, x, y):
+        '''
+        Return the element, xi and global coordinates of the nearest point on
+        the faces drawn by the surfaces graphics under window coordinates x,
+        y, or None.
+        '''
+        ray = self.getPickRay(x, y)
+        if ray is None:
+            return None
+        return self.getRaySurfaceIntersector(graphics).intersect(ray[0], ray[1], 1.0)
+
+    def getEditHistory(self):
+        return self._editHistory
+
+    def undoEdit(self):
+        '''
+        Undo the last node move, vector edit or node creation. Returns False
+        if there is nothing to undo.
+        '''
+        return self._editHistory.undo()
+
+    def redoEdit(self):
+        '''
+        Redo the last undone node edit. Returns False if there is nothing to redo.
+        '''
+        return self._editHistory.redo()
+
+    def _beginNodeValuesEdit(self, field):
+        '''
+        Read the values of field at the selected nodes before an edit gesture.
+        '''
+        nodeset = self._nodeEditInfo._node.getNodeset()
+        nodegroup = self._getSelectionNodeGroup(nodeset, False)
+        if not nodegroup.isValid():
+            self._edit_before = None
+            return
+        identifiers, before = readNodeValues(field, nodeset, nodesetIdentifiers(nodegroup.getNodesetGroup()))
+        self._edit_before = (field, nodeset, identifiers, before)
+
+    def _endNodeValuesEdit(self):
+        '''
+        Record the nodes whose values were changed by the edit gesture.
+        '''
+        if self._edit_before is None:
+            return
+        field, nodeset, identifiers, before = self._edit_before
+        self._edit_before = None
+        after_identifiers, after = readNodeValues(field, nodeset, identifiers)
+        before = before[numpy.isin(identifiers, after_identifiers)]
+        changed = numpy.any(before != after, axis=1)
+        if numpy.any(changed):
+            self._editHistory.push(NodeValuesEdit(field, nodeset, after_identifiers[changed],
+                                                  before[changed], after[changed]))
+
+    def _moveSelectedNodes(self, delta):
+        if self._dragPreview:
+            self._dragPreview.setDelta(delta[0], delta[1], delta[2])
+        else:
+            self.updateSelectedNodesCoordinatesWithDelta(self._nodeEditInfo, \
+                self._selectionGroup, delta[0], delta[1], delta[2])
         
     def setNodeEdit(self, enabled):
         self._nodeEditMode = enabled
@@ -262,9 +403,7 @@ class EditSceneviewerWidget(SelectionSceneviewerWidget):
         '''
         Return new coordinates which is constrained to the meshGroup
         '''
-        fieldLocation = fieldmodule.createFieldFindMeshLocation(elementCoordinateField, \
-                            elementCoordinateField, meshGroup)
-        fieldLocation.setSearchMode(FieldFindMeshLocation.SEARCH_MODE_NEAREST)
+        fieldLocation = self._meshLocationCache.getFindMeshLocation(elementCoordinateField, meshGroup)
         fieldcache.setFieldReal(elementCoordinateField, coordinates)
         element, chartCoordinates = fieldLocation.evaluateMeshLocation(fieldcache, 3)
         fieldcache.setMeshLocation(element, chartCoordinates)
@@ -287,16 +426,25 @@ class EditSceneviewerWidget(SelectionSceneviewerWidget):
             else:
                 return self._scenepicker.getPickingVolumeCentre()
         else:
+            start_time = default_timer()
+            hit = None
+            if nodeEditInfo._surfacesGraphics and nodeEditInfo._nearestElement.getMesh().getDimension() == 2:
+                hit = self.intersectSurface(nodeEditInfo._surfacesGraphics, x, y)
+            if hit is not None:
+                intersector = self.getRaySurfaceIntersector(nodeEditInfo._surfacesGraphics)
+                self._meshLocationCache.recordRayPlacement(intersector.getLastIterations(), default_timer() - start_time)
+                return True, hit[2]
+            # fall back to iterating between the surface and the pick ray for meshes
+            # which are not 2-D or when the ray misses the tessellated surface
             fieldmodule = nodeEditInfo._nearestElement.getMesh().getFieldmodule()
             fieldcache = fieldmodule.createFieldcache()
             converged = False
             fieldcache.setMeshLocation(nodeEditInfo._nearestElement, [0.5, 0.5, 0.5])
             temp, unprojectCoordinates = self._scenepicker.getPickingVolumeCentre()
             fieldcache.clearLocation()
-            mesh = nodeEditInfo._nearestElement.getMesh()
             fieldmodule = nodeEditInfo._elementCoordinateField.getFieldmodule()
-            meshGroup = fieldmodule.createFieldGroup().createFieldElementGroup(mesh).getMeshGroup()
-            meshGroup.addElement(nodeEditInfo._nearestElement)
+            meshGroup = self._meshLocationCache.getElementMeshGroup(nodeEditInfo._elementCoordinateField, \
+                                                                    nodeEditInfo._nearestElement)
             return_code = True 
             steps = 0
             point = unprojectCoordinates
@@ -323,6 +471,7 @@ class EditSceneviewerWidget(SelectionSceneviewerWidget):
                                         point[2] - previous_point[2]]
                     if math.sqrt(changes[0]*changes[0] + changes[1]*changes[1] + changes[2]*changes[2]) < 1.0e-6:
                         return_code = False
+            self._meshLocationCache.recordConstraintPlacement(steps, default_timer() - start_time)
             return True, point
         
     def getCoordinatesDelta(self, nodeEditInfo, x, y):
@@ -365,24 +514,54 @@ class EditSceneviewerWidget(SelectionSceneviewerWidget):
 #                    while node.isValid():                        
 #                        node = iterator.next()
             
+    def _getCoordinateDeltaAssignment(self, coordinateField):
+        '''
+        Return a constant offset field and a field assignment of coordinateField
+        plus the offset, created once per coordinate field.
+        '''
+        for field, offset, fieldassignment in self._coordinateDeltaAssignments:
+            if field == coordinateField:
+                return offset, fieldassignment
+        fieldmodule = coordinateField.getFieldmodule()
+        fieldmodule.beginChange()
+        offset = fieldmodule.createFieldConstant([0.0]*coordinateField.getNumberOfComponents())
+        fieldassignment = coordinateField.createFieldassignment(fieldmodule.createFieldAdd(coordinateField, offset))
+        fieldmodule.endChange()
+        self._coordinateDeltaAssignments.append((coordinateField, offset, fieldassignment))
+        return offset, fieldassignment
+
     def updateSelectedNodesCoordinatesWithDelta(self, nodeEditInfo, selectionGroup, xdiff, ydiff, zdiff):
         '''
-        Updated nodes in the selection group with delta
+        Updated nodes in the selection group with delta. All nodes are moved
+        by one field assignment of coordinates plus a constant offset over the
+        selected nodes, falling back to updating nodes one at a time only if
+        the assignment fails without assigning any node.
         '''
-        nodegroup = selectionGroup.getFieldNodeGroup(nodeEditInfo._node.getNodeset())
+        nodeset = nodeEditInfo._node.getNodeset()
+        nodegroup = getRegionGroup(selectionGroup, nodeset.getFieldmodule().getRegion()).getFieldNodeGroup(nodeset)
         if nodegroup.isValid():
             group = nodegroup.getNodesetGroup()
             if group.isValid():
                 fieldmodule = nodegroup.getFieldmodule()
+                self._setRaySurfaceChangedNodes(group)
                 fieldmodule.beginChange()
+                coordinateField = nodeEditInfo._coordinateField
+                offset, fieldassignment = self._getCoordinateDeltaAssignment(coordinateField)
                 fieldcahce = fieldmodule.createFieldcache()
-                iterator = group.createNodeiterator()
-                node = iterator.next()
-                while node.isValid():            
-                    self.updateNodePositionWithDelta(fieldcahce, nodeEditInfo._coordinateField, \
-                                                     node, xdiff, ydiff, zdiff)            
+                components = coordinateField.getNumberOfComponents()
+                offset.assignReal(fieldcahce, ([xdiff, ydiff, zdiff] + [0.0]*components)[:components])
+                fieldassignment.setNodeset(group)
+                # part done means nodes without the coordinate field were skipped;
+                # the others have moved and must not be moved again
+                if fieldassignment.assign() not in (OK, WARNING_PART_DONE):
+                    iterator = group.createNodeiterator()
                     node = iterator.next()
+                    while node.isValid():            
+                        self.updateNodePositionWithDelta(fieldcahce, nodeEditInfo._coordinateField, \
+                                                         node, xdiff, ydiff, zdiff)            
+                        node = iterator.next()
                 fieldmodule.endChange()
+                self._setRaySurfaceChangedNodes(None)
                 
     def updateNodeVectorWithDelta(self, fieldcache, orientationField, node, xdiff, ydiff, zdiff):
         '''
@@ -406,11 +585,13 @@ class EditSceneviewerWidget(SelectionSceneviewerWidget):
         '''
         Updated orientation field provided at nodes in the selection group with delta
         '''
-        nodegroup = selectionGroup.getFieldNodeGroup(nodeEditInfo._node.getNodeset())
+        nodeset = nodeEditInfo._node.getNodeset()
+        nodegroup = getRegionGroup(selectionGroup, nodeset.getFieldmodule().getRegion()).getFieldNodeGroup(nodeset)
         if nodegroup.isValid():
             group = nodegroup.getNodesetGroup()
             if group.isValid():
                 fieldmodule = nodegroup.getFieldmodule()
+                self._setRaySurfaceChangedNodes(group)
                 fieldmodule.beginChange()
                 fieldcahce = fieldmodule.createFieldcache()
                 iterator = group.createNodeiterator()
@@ -420,6 +601,7 @@ class EditSceneviewerWidget(SelectionSceneviewerWidget):
                                                      node, xdiff, ydiff, zdiff)            
                     node = iterator.next()
                 fieldmodule.endChange()
+                self._setRaySurfaceChangedNodes(None)
                 
     def createNodeAtCoordinates(self, nodeEditInfo, x, y):
         '''
@@ -437,6 +619,8 @@ class EditSceneviewerWidget(SelectionSceneviewerWidget):
             fieldcache.setNode(node)
             nodeEditInfo._createCoordinatesField.assignReal(fieldcache, newCoordinates)
             fieldmodule.endChange()
+            self._editHistory.push(NodeCreateEdit(nodeEditInfo._createCoordinatesField, nodeset,
+                                                  node.getIdentifier(), newCoordinates))
             
     def mousePressEvent(self, event):
         '''
@@ -455,6 +639,10 @@ class EditSceneviewerWidget(SelectionSceneviewerWidget):
                 self._selection_position_start = (event.x(), event.y())
                 if self._nodeEditMode:
                     self._selection_mode = SelectionMode.EDIT_POSITION
+                    if self._dragPreviewEnabled:
+                        nodegroup = self._getSelectionNodeGroup(selectedNode.getNodeset(), False)
+                        self._dragPreview = DragPreview(selectedGraphics, selectedCoordinateField, nodegroup)
+                    self._beginNodeValuesEdit(selectedCoordinateField)
                 else:
                     attributes = self._nodeEditInfo._graphics.getGraphicspointattributes()
                     if attributes.isValid():
@@ -465,6 +653,7 @@ class EditSceneviewerWidget(SelectionSceneviewerWidget):
                             return_code, self._nodeEditInfo._glyphSize = attributes.getBaseSize(3)
                             return_code, self._nodeEditInfo._glyphScaleFactors = attributes.getScaleFactors(3)
                             self._nodeEditInfo._variableScaleField = attributes.getSignedScaleField()
+                            self._beginNodeValuesEdit(self._nodeEditInfo._orientationField)
             elif self._nodeCreateMode:
                 self._selection_mode = SelectionMode.CREATE
         else:
@@ -476,16 +665,24 @@ class EditSceneviewerWidget(SelectionSceneviewerWidget):
         '''
         if not self._ignore_mouse_events and (self._selection_mode == SelectionMode.EDIT_POSITION or \
                                               self._selection_mode == SelectionMode.EDIT_VECTOR):
+            if self._dragPreview:
+                # apply the previewed move to the nodes once
+                delta = self._dragPreview.end()
+                self._dragPreview = None
+                self.updateSelectedNodesCoordinatesWithDelta(self._nodeEditInfo, \
+                    self._selectionGroup, delta[0], delta[1], delta[2])
+            self._endNodeValuesEdit()
             self._nodeEditInfo.reset()
         elif not self._ignore_mouse_events and self._selection_mode == SelectionMode.CREATE:
             x = event.x()
             y = event.y()
-            self._selection_box.setVisibilityFlag(False)
+            self._setSelectionRectangle(None)
             if self._createCoordinatesField and self._createCoordinatesField.isValid():
                 self._nodeEditInfo._createCoordinatesField = self._createCoordinatesField
                 if self._nodeConstrainMode == True:
                     returnCode, self._nodeEditInfo._nearestElement, self._nodeEditInfo._elementCoordinateField = \
                         self.getNearestSurfacesElementAndCoordinates(x, y)
+                    self._nodeEditInfo._surfacesGraphics = self._scenepicker.getNearestGraphics().castSurfaces()
                     if self._nodeEditInfo._nearestElement and self._nodeEditInfo._elementCoordinateField:
                         self.createNodeAtCoordinates(self._nodeEditInfo, x, y)   
                 else:
@@ -514,14 +711,13 @@ class EditSceneviewerWidget(SelectionSceneviewerWidget):
                 if self._nodeConstrainMode == True:
                     returnCode, self._nodeEditInfo._nearestElement, self._nodeEditInfo._elementCoordinateField = \
                         self.getNearestSurfacesElementAndCoordinates(x, y)
+                    self._nodeEditInfo._surfacesGraphics = self._scenepicker.getNearestGraphics().castSurfaces()
                     if self._nodeEditInfo._nearestElement and self._nodeEditInfo._elementCoordinateField:
                         delta = self.getCoordinatesDelta(self._nodeEditInfo, x, y)
-                        self.updateSelectedNodesCoordinatesWithDelta(self._nodeEditInfo, \
-                            self._selectionGroup, delta[0], delta[1], delta[2])                
+                        self._moveSelectedNodes(delta)
                 else:
                     delta = self.getCoordinatesDelta(self._nodeEditInfo, x, y)
-                    self.updateSelectedNodesCoordinatesWithDelta(self._nodeEditInfo, \
-                            self._selectionGroup, delta[0], delta[1], delta[2])
+                    self._moveSelectedNodes(delta)
             elif self._selection_mode == SelectionMode.EDIT_VECTOR:
                 if self._nodeEditInfo._orientationField and self._nodeEditInfo._orientationField.isValid():
                     delta = self.getVectorDelta(self._nodeEditInfo, x, y)
@@ -529,6 +725,20 @@ class EditSceneviewerWidget(SelectionSceneviewerWidget):
                             self._selectionGroup, delta[0], delta[1], delta[2])
             else:
                 SelectionSceneviewerWidget.mouseMoveEvent(self, event)
-        elif not self._ignore_mouse_events and self._handle_mouse_events:
+        else:
             SelectionSceneviewerWidget.mouseMoveEvent(self, event)
-        
\ No newline at end of file
+        
+
+    def keyPressEvent(self, event):
+        '''
+        Escape cancels a previewed node drag, leaving the nodes unchanged.
+        '''
+        if event.key() == QtCore.Qt.Key_Escape and self._dragPreview:
+            event.accept()
+            self._dragPreview.end()
+            self._dragPreview = None
+            self._edit_before = None
+            self._nodeEditInfo.reset()
+            self._selection_mode = SelectionMode.NONE
+        else:
+            SelectionSceneviewerWidget.keyPressEvent(self, event)
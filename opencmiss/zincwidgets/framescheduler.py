@@ -0,0 +1,154 @@
+"""
+Zinc Frame Scheduler
+
+Coalesces repaint requests for a Zinc Sceneviewer Widget so that a burst of
+Zinc change notifications results in a single render, and limits the rate at
+which frames are rendered.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from timeit import default_timer
+
+try:
+    from PySide import QtCore
+except ImportError:
+    from PyQt4 import QtCore
+
+DEFAULT_MAXIMUM_FRAME_RATE = 60.0
+
+
+class FrameScheduler(QtCore.QObject):
+
+    def __init__(self, render_callback, parent=None):
+        '''
+        The render callback is called when a scheduled frame is due; it is
+        expected to render the frame and call frameRendered() when done.
+        '''
+        QtCore.QObject.__init__(self, parent)
+        self._render_callback = render_callback
+        self._dirty = False
+        self._firing = False
+        self._requested_while_firing = False
+        self._maximum_frame_rate = DEFAULT_MAXIMUM_FRAME_RATE
+        self._last_frame_time = None
+        self._request_time = None
+        self._requested_count = 0
+        self._rendered_count = 0
+        # the single shot timer is the one pending frame token
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._fire)
+
+    def setMaximumFrameRate(self, rate):
+        '''
+        Set the maximum number of frames per second. A rate of 0 or None
+        removes the limit so frames are rendered on the next event loop pass.
+        '''
+        self._maximum_frame_rate = rate
+
+    def getMaximumFrameRate(self):
+        return self._maximum_frame_rate
+
+    def getMinimumFrameInterval(self):
+        '''
+        Get the minimum time in seconds between rendered frames.
+        '''
+        if self._maximum_frame_rate:
+            return 1.0 / self._maximum_frame_rate
+        return 0.0
+
+    def isDirty(self):
+        return self._dirty
+
+    def isFramePending(self):
+        return self._timer.isActive()
+
+    def requestFrame(self):
+        '''
+        Mark the view as needing a repaint. Requests made while a frame is
+        already pending are merged into that frame.
+        '''
+        self._requested_count += 1
+        if not self._dirty:
+            self._request_time = default_timer()
+        self._dirty = True
+        if self._firing:
+            self._requested_while_firing = True
+        elif not self._timer.isActive():
+            self._schedule()
+
+    def forceFrame(self):
+        '''
+        Render a frame immediately, discarding any pending frame and
+        ignoring the frame rate limit.
+        '''
+        self._timer.stop()
+        if not self._dirty:
+            self._request_time = default_timer()
+        self._dirty = True
+        self._fire()
+
+    def cancelFrame(self):
+        '''
+        Discard any pending frame without rendering it.
+        '''
+        self._timer.stop()
+        self._dirty = False
+        self._request_time = None
+
+    def frameRendered(self):
+        '''
+        Inform the scheduler a frame has been rendered, whether it was
+        scheduled or requested by Qt e.g. on expose.
+        '''
+        self._rendered_count += 1
+        self._dirty = False
+        self._request_time = None
+        self._last_frame_time = default_timer()
+        self._timer.stop()
+
+    def getRequestTime(self):
+        '''
+        Get the time of the first repaint request not yet satisfied by a
+        rendered frame, or None if there is none.
+        '''
+        return self._request_time
+
+    def getRequestedFrameCount(self):
+        return self._requested_count
+
+    def getRenderedFrameCount(self):
+        return self._rendered_count
+
+    def getCoalescedFrameCount(self):
+        '''
+        Get the number of requested frames which did not need their own render.
+        '''
+        return max(0, self._requested_count - self._rendered_count)
+
+    def resetCounters(self):
+        self._requested_count = 0
+        self._rendered_count = 0
+
+    def _schedule(self):
+        delay = 0.0
+        if self._last_frame_time is not None:
+            elapsed = default_timer() - self._last_frame_time
+            delay = max(0.0, self.getMinimumFrameInterval() - elapsed)
+        self._timer.start(int(delay * 1000.0 + 0.5))
+
+    def _fire(self):
+        if not self._dirty:
+            return
+        self._firing = True
+        self._requested_while_firing = False
+        try:
+            self._render_callback()
+        finally:
+            self._firing = False
+        # requests made during the render callback which were not satisfied by it
+        if self._dirty and self._requested_while_firing and not self._timer.isActive():
+            self._schedule()
@@ -0,0 +1,141 @@
+"""
+Zinc Frame Statistics
+
+Records per frame timings for a Zinc Sceneviewer Widget in a fixed size ring
+buffer and reports rolling frame rate and render time percentiles.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import json
+from collections import deque
+
+DEFAULT_FRAME_HISTORY_SIZE = 240
+
+
+def percentile(sorted_values, fraction):
+    '''
+    Return the nearest rank percentile of an already sorted list of values,
+    where fraction is in the range [0, 1].
+    '''
+    if not sorted_values:
+        return None
+    rank = int(round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[rank]
+
+
+class FrameSample(object):
+
+    def __init__(self, frame_number, start_time, render_time, latency, interval):
+        '''
+        All times are in seconds. Latency is the time from the first repaint
+        request to the end of the render and is None for frames not requested
+        through the frame scheduler. Interval is the time since the start of
+        the previous frame and is None for the first frame.
+        '''
+        self.frame_number = frame_number
+        self.start_time = start_time
+        self.render_time = render_time
+        self.latency = latency
+        self.interval = interval
+
+    def toDict(self):
+        return {
+            'frame': self.frame_number,
+            'start': self.start_time,
+            'render_time': self.render_time,
+            'latency': self.latency,
+            'interval': self.interval,
+        }
+
+
+class FrameStatistics(object):
+
+    def __init__(self, size=DEFAULT_FRAME_HISTORY_SIZE):
+        self._samples = deque(maxlen=size)
+        self._frame_number = 0
+        self._previous_start_time = None
+        self._export_file = None
+
+    def setHistorySize(self, size):
+        self._samples = deque(self._samples, maxlen=size)
+
+    def getHistorySize(self):
+        return self._samples.maxlen
+
+    def setExportFile(self, filename):
+        '''
+        Write every subsequent frame sample as a line of JSON to the named
+        file, appending to it. Pass None to stop exporting. The file is line
+        buffered and flushed after each sample so no recorded frames are lost
+        if the process ends without calling close().
+        '''
+        self.stopExport()
+        if filename:
+            self._export_file = open(filename, 'a', 1)
+
+    def isExporting(self):
+        return self._export_file is not None
+
+    def stopExport(self):
+        '''
+        Flush and close the export file, if any.
+        '''
+        if self._export_file:
+            self._export_file.close()
+            self._export_file = None
+
+    def close(self):
+        self.stopExport()
+
+    def record(self, start_time, end_time, request_time=None):
+        '''
+        Record a rendered frame and return its sample.
+        '''
+        self._frame_number += 1
+        interval = None
+        if self._previous_start_time is not None:
+            interval = start_time - self._previous_start_time
+        self._previous_start_time = start_time
+        latency = None
+        if request_time is not None:
+            latency = end_time - request_time
+        sample = FrameSample(self._frame_number, start_time, end_time - start_time, latency, interval)
+        self._samples.append(sample)
+        if self._export_file:
+            self._export_file.write(json.dumps(sample.toDict()) + '\n')
+            self._export_file.flush()
+        return sample
+
+    def getSamples(self):
+        return list(self._samples)
+
+    def clear(self):
+        self._samples.clear()
+        self._previous_start_time = None
+
+    def getStatistics(self):
+        '''
+        Return a dict summarising the frames in the history: the number of
+        frames, the rolling frames per second and the 50th, 95th and 99th
+        percentiles of the render time, latency and frame interval.
+        '''
+        samples = list(self._samples)
+        statistics = {'frames': len(samples), 'fps': None}
+        intervals = sorted(s.interval for s in samples if s.interval is not None)
+        if len(samples) > 1:
+            elapsed = samples[-1].start_time - samples[0].start_time
+            if elapsed > 0.0:
+                statistics['fps'] = (len(samples) - 1) / elapsed
+        for name, values in (('render_time', sorted(s.render_time for s in samples)),
+                             ('latency', sorted(s.latency for s in samples if s.latency is not None)),
+                             ('interval', intervals)):
+            statistics[name] = {
+                'p50': percentile(values, 0.50),
+                'p95': percentile(values, 0.95),
+                'p99': percentile(values, 0.99),
+                'max': values[-1] if values else None,
+            }
+        return statistics
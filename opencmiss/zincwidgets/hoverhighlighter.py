@@ -0,0 +1,133 @@
+"""
+Zinc Hover Highlighter
+
+Highlights a single node or element with a hover material, separately from
+the scene's selection, by drawing extra graphics restricted to a hover
+group. Hover graphics are created on demand to match the graphics the
+hovered object was picked from and are not themselves pickable.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from opencmiss.zinc.field import Field
+from opencmiss.zinc.graphics import Graphics
+from opencmiss.zinc.material import Material
+from opencmiss.zinc.status import OK
+
+HOVER_GLYPH_SCALE = 1.25
+
+
+class _HoverRecord(object):
+
+    def __init__(self, picked_graphics, hover_graphics, hover_group):
+        self.picked_graphics = picked_graphics
+        self.hover_graphics = hover_graphics
+        self.hover_group = hover_group
+
+
+class HoverHighlighter(object):
+
+    def __init__(self, context):
+        self._context = context
+        self._material = None
+        self._records = []
+        self._current_record = None
+        self._current_object = None
+
+    def setMaterial(self, material):
+        self._material = material
+        for record in self._records:
+            record.hover_graphics.setMaterial(material)
+
+    def getMaterial(self):
+        if self._material is None:
+            materialmodule = self._context.getMaterialmodule()
+            self._material = materialmodule.createMaterial()
+            self._material.setAttributeReal3(Material.ATTRIBUTE_AMBIENT, [1.0, 0.75, 0.0])
+            self._material.setAttributeReal3(Material.ATTRIBUTE_DIFFUSE, [1.0, 0.75, 0.0])
+            self._material.setAttributeReal3(Material.ATTRIBUTE_EMISSION, [0.3, 0.2, 0.0])
+        return self._material
+
+    def getHoveredObject(self):
+        return self._current_object
+
+    def _getRecord(self, picked_graphics):
+        for record in self._records:
+            if record.picked_graphics == picked_graphics:
+                return record
+        scene = picked_graphics.getScene()
+        fieldmodule = scene.getRegion().getFieldmodule()
+        hover_group = fieldmodule.createFieldGroup()
+        graphics_type = picked_graphics.getType()
+        scene.beginChange()
+        if graphics_type == Graphics.TYPE_POINTS:
+            hover_graphics = scene.createGraphicsPoints()
+            picked_attributes = picked_graphics.getGraphicspointattributes()
+            attributes = hover_graphics.getGraphicspointattributes()
+            attributes.setGlyph(picked_attributes.getGlyph())
+            result, base_size = picked_attributes.getBaseSize(3)
+            if result == OK:
+                attributes.setBaseSize([size*HOVER_GLYPH_SCALE for size in base_size])
+            result, scale_factors = picked_attributes.getScaleFactors(3)
+            if result == OK:
+                attributes.setScaleFactors([factor*HOVER_GLYPH_SCALE for factor in scale_factors])
+            attributes.setOrientationScaleField(picked_attributes.getOrientationScaleField())
+        elif graphics_type == Graphics.TYPE_LINES:
+            hover_graphics = scene.createGraphicsLines()
+        else:
+            hover_graphics = scene.createGraphicsSurfaces()
+        hover_graphics.setFieldDomainType(picked_graphics.getFieldDomainType())
+        hover_graphics.setCoordinateField(picked_graphics.getCoordinateField())
+        hover_graphics.setSubgroupField(hover_group)
+        hover_graphics.setMaterial(self.getMaterial())
+        hover_graphics.setSelectMode(Graphics.SELECT_MODE_OFF)
+        scene.endChange()
+        record = _HoverRecord(picked_graphics, hover_graphics, hover_group)
+        self._records.append(record)
+        return record
+
+    def setHoveredObject(self, picked_object, picked_graphics):
+        '''
+        Highlight the picked node or element, drawn by picked_graphics, or
+        clear the highlight if picked_object is None. Returns True if the
+        hovered object changed.
+        '''
+        if picked_object is None and self._current_object is None:
+            return False
+        if picked_object is not None and self._current_object is not None and \
+                picked_object == self._current_object:
+            return False
+        if self._current_record:
+            self._current_record.hover_group.clear()
+        self._current_record = None
+        self._current_object = picked_object
+        if picked_object is not None:
+            record = self._getRecord(picked_graphics)
+            if picked_graphics.getFieldDomainType() in [Field.DOMAIN_TYPE_NODES, Field.DOMAIN_TYPE_DATAPOINTS]:
+                nodeset = picked_object.getNodeset()
+                nodegroup = record.hover_group.getFieldNodeGroup(nodeset)
+                if not nodegroup.isValid():
+                    nodegroup = record.hover_group.createFieldNodeGroup(nodeset)
+                nodegroup.getNodesetGroup().addNode(picked_object)
+            else:
+                mesh = picked_object.getMesh()
+                elementgroup = record.hover_group.getFieldElementGroup(mesh)
+                if not elementgroup.isValid():
+                    elementgroup = record.hover_group.createFieldElementGroup(mesh)
+                elementgroup.getMeshGroup().addElement(picked_object)
+            self._current_record = record
+        return True
+
+    def clear(self):
+        return self.setHoveredObject(None, None)
+
+    def removeGraphics(self):
+        '''
+        Remove all hover graphics from their scenes.
+        '''
+        self.clear()
+        for record in self._records:
+            record.hover_graphics.getScene().removeGraphics(record.hover_graphics)
+        self._records = []
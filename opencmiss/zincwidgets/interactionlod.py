@@ -0,0 +1,149 @@
+"""
+Zinc Interaction Level of Detail
+
+Temporarily coarsens or hides chosen types of graphics while the view is
+being manipulated so that tumbling, panning and zooming of large scenes
+stays interactive, restoring full quality once the interaction has been
+idle for a short delay.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+try:
+    from PySide import QtCore
+except ImportError:
+    from PyQt4 import QtCore
+
+DEFAULT_RESTORE_DELAY = 250  # milliseconds
+
+
+class LodMode(object):
+
+    NONE = 0
+    COARSE = 1
+    HIDE = 2
+
+
+class InteractionLevelOfDetail(QtCore.QObject):
+
+    def __init__(self, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        self._context = None
+        self._modes = {}
+        self._coarse_tessellation = None
+        self._saved_tessellations = []
+        self._saved_visibilities = []
+        self._region = None
+        self._active = False
+        self._restore_timer = QtCore.QTimer(self)
+        self._restore_timer.setSingleShot(True)
+        self._restore_timer.setInterval(DEFAULT_RESTORE_DELAY)
+        self._restore_timer.timeout.connect(self.restore)
+
+    def setContext(self, context):
+        self._context = context
+
+    def setMode(self, graphics_type, mode):
+        '''
+        Set how graphics of the given Graphics.TYPE_* are drawn during
+        interaction: LodMode.NONE, COARSE or HIDE.
+        '''
+        if mode == LodMode.NONE:
+            self._modes.pop(graphics_type, None)
+        else:
+            self._modes[graphics_type] = mode
+
+    def getMode(self, graphics_type):
+        return self._modes.get(graphics_type, LodMode.NONE)
+
+    def isEnabled(self):
+        return len(self._modes) > 0
+
+    def isActive(self):
+        return self._active
+
+    def setRestoreDelay(self, delay):
+        '''
+        Set the time in milliseconds the interaction must be idle before full
+        quality graphics are restored.
+        '''
+        self._restore_timer.setInterval(delay)
+
+    def getRestoreDelay(self):
+        return self._restore_timer.interval()
+
+    def setCoarseTessellation(self, tessellation):
+        '''
+        Set the tessellation used for graphics in COARSE mode. By default one
+        with a single division per element and few circle divisions is used.
+        '''
+        self._coarse_tessellation = tessellation
+
+    def getCoarseTessellation(self):
+        if self._coarse_tessellation is None and self._context:
+            tessellationmodule = self._context.getTessellationmodule()
+            self._coarse_tessellation = tessellationmodule.createTessellation()
+            self._coarse_tessellation.setMinimumDivisions([1])
+            self._coarse_tessellation.setRefinementFactors([1])
+            self._coarse_tessellation.setCircleDivisions(6)
+        return self._coarse_tessellation
+
+    def begin(self, scene):
+        '''
+        Switch the graphics of scene and its child scenes to their interaction
+        level of detail, if not already.
+        '''
+        self._restore_timer.stop()
+        if self._active or not self.isEnabled():
+            return
+        self._region = scene.getRegion()
+        coarse_tessellation = self.getCoarseTessellation()
+        self._region.beginHierarchicalChange()
+        self._applyToRegion(self._region, coarse_tessellation)
+        self._region.endHierarchicalChange()
+        self._active = True
+
+    def end(self):
+        '''
+        Restore full quality graphics once the restore delay has passed
+        without a further interaction beginning.
+        '''
+        if self._active:
+            self._restore_timer.start()
+
+    def restore(self):
+        '''
+        Immediately restore the graphics changed by begin().
+        '''
+        self._restore_timer.stop()
+        if not self._active:
+            return
+        self._region.beginHierarchicalChange()
+        for graphics, tessellation in self._saved_tessellations:
+            graphics.setTessellation(tessellation)
+        for graphics in self._saved_visibilities:
+            graphics.setVisibilityFlag(True)
+        self._region.endHierarchicalChange()
+        self._saved_tessellations = []
+        self._saved_visibilities = []
+        self._region = None
+        self._active = False
+
+    def _applyToRegion(self, region, coarse_tessellation):
+        scene = region.getScene()
+        graphics = scene.getFirstGraphics()
+        while graphics.isValid():
+            mode = self._modes.get(graphics.getType(), LodMode.NONE)
+            if mode == LodMode.COARSE and coarse_tessellation:
+                self._saved_tessellations.append((graphics, graphics.getTessellation()))
+                graphics.setTessellation(coarse_tessellation)
+            elif mode == LodMode.HIDE and graphics.getVisibilityFlag():
+                self._saved_visibilities.append(graphics)
+                graphics.setVisibilityFlag(False)
+            graphics = scene.getNextGraphics(graphics)
+        child = region.getFirstChild()
+        while child.isValid():
+            self._applyToRegion(child, coarse_tessellation)
+            child = child.getNextSibling()
@@ -0,0 +1,154 @@
+"""
+Zinc Mesh Location Cache
+
+Reuses the find mesh location fields and single element mesh groups used to
+constrain node placement to a mesh surface, instead of creating new fields
+for every iteration and placement. Cached objects for a field module are
+discarded when fields in it are redefined or removed, or elements are
+removed. Also records iteration counts and times per placement.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from opencmiss.zinc.element import Element
+from opencmiss.zinc.field import Field, FieldFindMeshLocation
+
+
+class _FieldmoduleEntries(object):
+
+    def __init__(self, fieldmodule):
+        self.fieldmodule = fieldmodule
+        self.meshgroups = []  # (coordinate field, mesh, element group field, mesh group, element)
+        self.find_mesh_locations = []  # (coordinate field, mesh group, find mesh location field)
+        self.notifier = fieldmodule.createFieldmodulenotifier()
+        self.notifier.setCallback(self._zincFieldmoduleEvent)
+
+    def _zincFieldmoduleEvent(self, event):
+        if event.getSummaryFieldChangeFlags() & (Field.CHANGE_FLAG_DEFINITION | Field.CHANGE_FLAG_REMOVE):
+            self.clear()
+            return
+        for dimension in range(1, 4):
+            meshchanges = event.getMeshchanges(self.fieldmodule.findMeshByDimension(dimension))
+            if meshchanges.getSummaryElementChangeFlags() & Element.CHANGE_FLAG_REMOVE:
+                self.clear()
+                return
+
+    def clear(self):
+        self.meshgroups = []
+        self.find_mesh_locations = []
+
+
+class MeshLocationCache(object):
+
+    def __init__(self):
+        self._entries = []
+        self.resetStatistics()
+
+    def _getEntries(self, fieldmodule):
+        for entries in self._entries:
+            if entries.fieldmodule == fieldmodule:
+                return entries
+        entries = _FieldmoduleEntries(fieldmodule)
+        self._entries.append(entries)
+        return entries
+
+    def getElementMeshGroup(self, coordinate_field, element):
+        '''
+        Return a mesh group containing only element, reusing one mesh group
+        per coordinate field and mesh.
+        '''
+        mesh = element.getMesh()
+        entries = self._getEntries(coordinate_field.getFieldmodule())
+        for index, (field, entry_mesh, elementgroup, meshgroup, entry_element) in enumerate(entries.meshgroups):
+            if field == coordinate_field and entry_mesh == mesh:
+                if entry_element != element:
+                    meshgroup.removeAllElements()
+                    meshgroup.addElement(element)
+                    entries.meshgroups[index] = (field, entry_mesh, elementgroup, meshgroup, element)
+                return meshgroup
+        fieldmodule = coordinate_field.getFieldmodule()
+        fieldmodule.beginChange()
+        elementgroup = fieldmodule.createFieldGroup().createFieldElementGroup(mesh)
+        meshgroup = elementgroup.getMeshGroup()
+        meshgroup.addElement(element)
+        fieldmodule.endChange()
+        entries.meshgroups.append((coordinate_field, mesh, elementgroup, meshgroup, element))
+        return meshgroup
+
+    def getFindMeshLocation(self, coordinate_field, meshgroup):
+        '''
+        Return a find mesh location field finding the nearest location to
+        coordinate_field values on meshgroup, created once per coordinate
+        field and mesh group.
+        '''
+        entries = self._getEntries(coordinate_field.getFieldmodule())
+        for field, entry_meshgroup, find_mesh_location in entries.find_mesh_locations:
+            if field == coordinate_field and entry_meshgroup == meshgroup:
+                return find_mesh_location
+        fieldmodule = coordinate_field.getFieldmodule()
+        find_mesh_location = fieldmodule.createFieldFindMeshLocation(coordinate_field, coordinate_field, meshgroup)
+        find_mesh_location.setSearchMode(FieldFindMeshLocation.SEARCH_MODE_NEAREST)
+        entries.find_mesh_locations.append((coordinate_field, meshgroup, find_mesh_location))
+        return find_mesh_location
+
+    def clear(self):
+        for entries in self._entries:
+            entries.clear()
+        self._entries = []
+
+    def _recordPlacement(self, seconds):
+        self._placement_count += 1
+        self._placement_time += seconds
+        self._last_time = seconds
+
+    def recordRayPlacement(self, newton_iterations, seconds):
+        '''
+        Record a placement found by intersecting the pick ray with the
+        tessellated surface and refining with Newton iterations.
+        '''
+        self._recordPlacement(seconds)
+        self._ray_placement_count += 1
+        self._newton_iteration_count += newton_iterations
+        self._last_newton_iterations = newton_iterations
+
+    def recordConstraintPlacement(self, constraint_steps, seconds):
+        '''
+        Record a placement found by fixed point steps between the surface
+        and the pick ray.
+        '''
+        self._recordPlacement(seconds)
+        self._constraint_placement_count += 1
+        self._constraint_step_count += constraint_steps
+        self._last_constraint_steps = constraint_steps
+
+    def getStatistics(self):
+        '''
+        Return a dict of the number of placements and the time in seconds of
+        the last placement and its mean over all placements, and separately
+        for ray intersection and fixed point constraint placements their
+        number and the Newton iterations or constraint steps of the last one
+        and their mean.
+        '''
+        return {
+            'placements': self._placement_count,
+            'last_time': self._last_time,
+            'mean_time': self._placement_time/max(1, self._placement_count),
+            'ray_placements': self._ray_placement_count,
+            'last_newton_iterations': self._last_newton_iterations,
+            'mean_newton_iterations': float(self._newton_iteration_count)/max(1, self._ray_placement_count),
+            'constraint_placements': self._constraint_placement_count,
+            'last_constraint_steps': self._last_constraint_steps,
+            'mean_constraint_steps': float(self._constraint_step_count)/max(1, self._constraint_placement_count)}
+
+    def resetStatistics(self):
+        self._placement_count = 0
+        self._placement_time = 0.0
+        self._last_time = 0.0
+        self._ray_placement_count = 0
+        self._newton_iteration_count = 0
+        self._last_newton_iterations = 0
+        self._constraint_placement_count = 0
+        self._constraint_step_count = 0
+        self._last_constraint_steps = 0
@@ -0,0 +1,211 @@
+"""
+Zinc Node Spatial Index
+
+CPU side index of the window positions of the nodes drawn by a node points
+graphics, allowing nearest node and rectangle queries without a pick render.
+Node coordinates are re-read when the coordinate field or nodeset changes
+and re-projected when the view changes, both lazily on the next query. The
+index is a uniform 2-D grid of cells over the window built with NumPy.
+Nodes behind the eye or outside the near and far clipping planes are not
+indexed.
+
+Unlike a Zinc Scenepicker the index does not account for occlusion: the
+nearest node to the query position is returned even if hidden by surfaces.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import numpy
+
+from opencmiss.zinc.field import Field
+from opencmiss.zinc.node import Node
+from opencmiss.zinc.status import OK
+
+DEFAULT_CELL_SIZE = 16  # pixels
+
+
+class NodeSpatialIndex(object):
+
+    def __init__(self, sceneviewerwidget, graphics, cell_size=DEFAULT_CELL_SIZE):
+        '''
+        Index the nodes drawn by graphics, a node points graphics shown in the
+        sceneviewerwidget, by their window positions.
+        '''
+        self._sceneviewerwidget = sceneviewerwidget
+        self._graphics = graphics
+        self._cell_size = float(cell_size)
+        self._coordinate_field = graphics.getCoordinateField()
+        self._subgroup_field = graphics.getSubgroupField()
+        fieldmodule = self._coordinate_field.getFieldmodule()
+        self._nodeset = fieldmodule.findNodesetByFieldDomainType(graphics.getFieldDomainType())
+        self._identifiers = None
+        self._coordinates = None
+        self._view_version = None
+        self._screen_identifiers = None
+        self._screen_positions = None
+        self._cell_starts = None
+        self._grid_size = (0, 0)
+        self._fieldmodulenotifier = fieldmodule.createFieldmodulenotifier()
+        self._fieldmodulenotifier.setCallback(self._zincFieldmoduleEvent)
+
+    def getGraphics(self):
+        return self._graphics
+
+    def getCoordinateField(self):
+        return self._coordinate_field
+
+    def getNodeset(self):
+        return self._nodeset
+
+    def invalidate(self):
+        '''
+        Force node coordinates to be re-read on the next query.
+        '''
+        self._identifiers = None
+        self._coordinates = None
+        self._view_version = None
+
+    def _zincFieldmoduleEvent(self, event):
+        if event.getFieldChangeFlags(self._coordinate_field) & Field.CHANGE_FLAG_RESULT:
+            self.invalidate()
+        elif self._subgroup_field.isValid() and (event.getFieldChangeFlags(self._subgroup_field) & Field.CHANGE_FLAG_RESULT):
+            self.invalidate()
+        else:
+            nodesetchanges = event.getNodesetchanges(self._nodeset)
+            if nodesetchanges.getSummaryNodeChangeFlags() & (Node.CHANGE_FLAG_ADD | Node.CHANGE_FLAG_REMOVE):
+                self.invalidate()
+
+    def _readCoordinates(self):
+        fieldmodule = self._coordinate_field.getFieldmodule()
+        fieldcache = fieldmodule.createFieldcache()
+        number_of_components = self._coordinate_field.getNumberOfComponents()
+        use_subgroup = self._subgroup_field.isValid()
+        identifiers = []
+        coordinates = []
+        iterator = self._nodeset.createNodeiterator()
+        node = iterator.next()
+        while node.isValid():
+            fieldcache.setNode(node)
+            include = True
+            if use_subgroup:
+                result, value = self._subgroup_field.evaluateReal(fieldcache, 1)
+                include = (result == OK) and (value != 0.0)
+            if include:
+                result, x = self._coordinate_field.evaluateReal(fieldcache, number_of_components)
+                if result == OK:
+                    identifiers.append(node.getIdentifier())
+                    coordinates.append(x)
+            node = iterator.next()
+        self._identifiers = numpy.array(identifiers, dtype=numpy.int64)
+        coordinates = numpy.array(coordinates, dtype=numpy.float64).reshape(-1, number_of_components)
+        self._coordinates = numpy.zeros((len(identifiers), 3))
+        self._coordinates[:, :min(3, number_of_components)] = coordinates[:, :3]
+
+    def _buildGrid(self):
+        width, height = self._sceneviewerwidget.getViewportSize()
+        matrix = self._sceneviewerwidget.getWorldToWindowMatrix()
+        if matrix is None:
+            matrix = numpy.zeros((4, 4))
+        homogeneous = self._coordinates.dot(matrix[:, :3].T) + matrix[:, 3]
+        w = homogeneous[:, 3]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            window = homogeneous[:, :3] / w[:, numpy.newaxis]
+        # window pixel top left coordinates have y increasing upwards; index in widget coordinates
+        positions = numpy.column_stack((window[:, 0], -window[:, 1]))
+        # points behind the eye have w <= 0 and would otherwise project back into the window;
+        # points beyond the near and far clipping planes have depth outside [-1, 1]
+        visible = (w > 0.0) & (numpy.abs(window[:, 2]) <= 1.0) & \
+            (positions[:, 0] >= 0.0) & (positions[:, 0] < width) & \
+            (positions[:, 1] >= 0.0) & (positions[:, 1] < height) & numpy.all(numpy.isfinite(positions), axis=1)
+        self._screen_identifiers = self._identifiers[visible]
+        self._screen_positions = positions[visible]
+        columns = max(1, int(numpy.ceil(width / self._cell_size)))
+        rows = max(1, int(numpy.ceil(height / self._cell_size)))
+        self._grid_size = (columns, rows)
+        cells = self._cellIndices(self._screen_positions)
+        order = numpy.argsort(cells, kind='mergesort')
+        self._screen_identifiers = self._screen_identifiers[order]
+        self._screen_positions = self._screen_positions[order]
+        self._cell_starts = numpy.searchsorted(cells[order], numpy.arange(columns*rows + 1))
+
+    def _cellIndices(self, positions):
+        columns, rows = self._grid_size
+        cx = numpy.clip((positions[:, 0] / self._cell_size).astype(numpy.int64), 0, columns - 1)
+        cy = numpy.clip((positions[:, 1] / self._cell_size).astype(numpy.int64), 0, rows - 1)
+        return cy*columns + cx
+
+    def update(self):
+        '''
+        Bring the index up to date with the node coordinates and view.
+        '''
+        if self._coordinates is None:
+            self._readCoordinates()
+            self._view_version = None
+        view_version = self._sceneviewerwidget.getViewVersion()
+        if self._view_version != view_version:
+            self._buildGrid()
+            self._view_version = view_version
+
+    def _candidates(self, left, top, right, bottom):
+        '''
+        Return the indexes of the indexed nodes in the grid cells overlapping
+        the rectangle in widget coordinates.
+        '''
+        columns, rows = self._grid_size
+        c0 = max(0, int(left // self._cell_size))
+        c1 = min(columns - 1, int(right // self._cell_size))
+        r0 = max(0, int(top // self._cell_size))
+        r1 = min(rows - 1, int(bottom // self._cell_size))
+        if c0 > c1 or r0 > r1:
+            return numpy.zeros(0, dtype=numpy.int64)
+        ranges = [numpy.arange(self._cell_starts[r*columns + c0], self._cell_starts[r*columns + c1 + 1])
+                  for r in range(r0, r1 + 1)]
+        return numpy.concatenate(ranges)
+
+    def getScreenPositions(self):
+        '''
+        Return an array of the identifiers of the nodes within the window and
+        an N x 2 array of their positions in widget coordinates.
+        '''
+        self.update()
+        return self._screen_identifiers, self._screen_positions
+
+    def findNodeIdentifiersInRectangle(self, left, top, right, bottom):
+        '''
+        Return an array of identifiers of nodes inside the rectangle given in
+        widget coordinates, with y increasing downwards.
+        '''
+        self.update()
+        candidates = self._candidates(left, top, right, bottom)
+        positions = self._screen_positions[candidates]
+        inside = (positions[:, 0] >= left) & (positions[:, 0] <= right) & \
+            (positions[:, 1] >= top) & (positions[:, 1] <= bottom)
+        return self._screen_identifiers[candidates[inside]]
+
+    def findNearestNodeIdentifier(self, x, y, half_size):
+        '''
+        Return the identifier of the node nearest to widget coordinates x, y
+        within the square of the given half size, or None if there is none.
+        '''
+        self.update()
+        candidates = self._candidates(x - half_size, y - half_size, x + half_size, y + half_size)
+        if len(candidates) == 0:
+            return None
+        offsets = self._screen_positions[candidates] - [x, y]
+        inside = numpy.all(numpy.abs(offsets) <= half_size, axis=1)
+        if not numpy.any(inside):
+            return None
+        distances = numpy.sum(offsets[inside]**2, axis=1)
+        return int(self._screen_identifiers[candidates[inside][numpy.argmin(distances)]])
+
+    def findNearestNode(self, x, y, half_size):
+        '''
+        Return the Zinc node nearest to widget coordinates x, y within the
+        square of the given half size; the node is invalid if there is none.
+        '''
+        identifier = self.findNearestNodeIdentifier(x, y, half_size)
+        if identifier is None:
+            return Node()
+        return self._nodeset.findNodeByIdentifier(identifier)
@@ -0,0 +1,215 @@
+"""
+Zinc Offscreen Sceneviewer
+
+Renders a Zinc Scene into an offscreen OpenGL pixel buffer without creating
+a visible window, returning the result as a QImage, a NumPy array or an image
+file. Intended for generating thumbnails and regression snapshots on
+headless machines, e.g. under Xvfb with Mesa software rendering
+(LIBGL_ALWAYS_SOFTWARE=1). A QApplication must exist before rendering.
+
+The pixel buffer provides the one OpenGL context the scene viewer and its
+compiled graphics are used with. Where framebuffer objects are supported,
+images are rendered into one of the image size inside that context, so
+resizing never changes the context.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import numpy
+
+try:
+    from PySide import QtGui, QtOpenGL
+except ImportError:
+    from PyQt4 import QtGui, QtOpenGL
+
+from opencmiss.zinc.sceneviewer import Sceneviewer
+from opencmiss.zinc.status import OK
+from sceneviewerwidget import ProjectionMode
+
+
+def imageToArray(image):
+    '''
+    Convert a QImage to a height x width x 4 NumPy array of RGBA bytes.
+    '''
+    image = image.convertToFormat(QtGui.QImage.Format_ARGB32)
+    width = image.width()
+    height = image.height()
+    pointer = image.constBits()
+    if hasattr(pointer, 'asstring'):
+        # PyQt
+        data = pointer.asstring(image.byteCount())
+    else:
+        # PySide
+        data = bytes(pointer)
+    rows = numpy.frombuffer(data, dtype=numpy.uint8).reshape(height, image.bytesPerLine())
+    bgra = rows[:, :width*4].reshape(height, width, 4)
+    # ARGB32 is stored as native 32-bit integers, i.e. BGRA bytes on little endian machines
+    return bgra[:, :, [2, 1, 0, 3]].copy()
+
+
+class OffscreenSceneviewer(object):
+
+    def __init__(self, context, width=512, height=512, shared=None):
+        '''
+        Create a pixel buffer of the given size with its own OpenGL context,
+        optionally sharing display lists and textures with the shared
+        QGLWidget, and a Zinc scene viewer drawing the default region's scene.
+        '''
+        if not QtOpenGL.QGLPixelBuffer.hasOpenGLPbuffers():
+            raise RuntimeError("OpenGL pixel buffers are not supported, cannot create OffscreenSceneviewer.")
+        self._context = context
+        self._shared = shared
+        self._pbuffer = None
+        self._framebuffer = None
+        self._sceneviewer = None
+        self._createPixelBuffer(width, height)
+        self._createFramebuffer(width, height)
+        self._createSceneviewer()
+
+    def _createPixelBuffer(self, width, height):
+        glformat = QtOpenGL.QGLFormat()
+        glformat.setAlpha(True)
+        glformat.setDepth(True)
+        glformat.setDoubleBuffer(False)
+        self._pbuffer = QtOpenGL.QGLPixelBuffer(width, height, glformat, self._shared)
+        if not self._pbuffer.isValid():
+            raise RuntimeError("Failed to create OpenGL pixel buffer for OffscreenSceneviewer.")
+        self._width = width
+        self._height = height
+
+    def _createFramebuffer(self, width, height):
+        '''
+        Replace the framebuffer object rendered into with one of the given
+        size, in the pixel buffer's context. Without framebuffer object
+        support images are rendered into the pixel buffer itself.
+        '''
+        self._pbuffer.makeCurrent()
+        if self._framebuffer is not None:
+            # delete the old framebuffer while its context is current
+            self._framebuffer = None
+        if QtOpenGL.QGLFramebufferObject.hasOpenGLFramebufferObjects():
+            framebuffer = QtOpenGL.QGLFramebufferObject(width, height, QtOpenGL.QGLFramebufferObject.Depth)
+            if framebuffer.isValid():
+                self._framebuffer = framebuffer
+        self._pbuffer.doneCurrent()
+        self._width = width
+        self._height = height
+
+    def _createSceneviewer(self):
+        self._pbuffer.makeCurrent()
+        scene_viewer_module = self._context.getSceneviewermodule()
+        self._sceneviewer = scene_viewer_module.createSceneviewer(Sceneviewer.BUFFERING_MODE_SINGLE, Sceneviewer.STEREO_MODE_DEFAULT)
+        self._sceneviewer.setProjectionMode(Sceneviewer.PROJECTION_MODE_PERSPECTIVE)
+        filter_module = self._context.getScenefiltermodule()
+        graphics_filter = filter_module.createScenefilterVisibilityFlags()
+        self._sceneviewer.setScenefilter(graphics_filter)
+        scene = self._context.getDefaultRegion().getScene()
+        self._sceneviewer.setScene(scene)
+        self._sceneviewer.setViewportSize(self._width, self._height)
+        self._sceneviewer.viewAll()
+
+    def getContext(self):
+        return self._context
+
+    def getSceneviewer(self):
+        return self._sceneviewer
+
+    def setSize(self, width, height):
+        '''
+        Change the size of the rendered images. The OpenGL context, the scene
+        viewer and its view are kept and only the framebuffer object is
+        replaced. Without framebuffer objects the size cannot exceed the
+        pixel buffer's initial size.
+        '''
+        if (width, height) != (self._width, self._height):
+            size = self._pbuffer.size()
+            if (self._framebuffer is None) and ((width > size.width()) or (height > size.height())):
+                raise RuntimeError("OffscreenSceneviewer cannot grow beyond its initial size without OpenGL framebuffer objects.")
+            self._createFramebuffer(width, height)
+
+    def getSize(self):
+        return (self._width, self._height)
+
+    def setupFromSceneviewer(self, sceneviewer):
+        '''
+        Copy the scene, scene filter, projection mode, view parameters and
+        background colour from another Zinc scene viewer, e.g. the one in a
+        SceneviewerWidget, so the offscreen render matches it.
+        '''
+        self._sceneviewer.beginChange()
+        self._sceneviewer.setScene(sceneviewer.getScene())
+        self._sceneviewer.setScenefilter(sceneviewer.getScenefilter())
+        self._sceneviewer.setProjectionMode(sceneviewer.getProjectionMode())
+        result, eye, lookat, up = sceneviewer.getLookatParameters()
+        if result == OK:
+            self._sceneviewer.setLookatParametersNonSkew(eye, lookat, up)
+            self._sceneviewer.setViewAngle(sceneviewer.getViewAngle())
+        result, rgb = sceneviewer.getBackgroundColourRGB()
+        if result == OK:
+            self._sceneviewer.setBackgroundColourRGB(rgb)
+        self._sceneviewer.endChange()
+
+    def setScene(self, scene):
+        self._sceneviewer.setScene(scene)
+
+    def setScenefilter(self, scenefilter):
+        self._sceneviewer.setScenefilter(scenefilter)
+
+    def setProjectionMode(self, mode):
+        if mode == ProjectionMode.PARALLEL:
+            self._sceneviewer.setProjectionMode(Sceneviewer.PROJECTION_MODE_PARALLEL)
+        elif mode == ProjectionMode.PERSPECTIVE:
+            self._sceneviewer.setProjectionMode(Sceneviewer.PROJECTION_MODE_PERSPECTIVE)
+
+    def getViewParameters(self):
+        result, eye, lookat, up = self._sceneviewer.getLookatParameters()
+        if result == OK:
+            angle = self._sceneviewer.getViewAngle()
+            return (eye, lookat, up, angle)
+
+        return None
+
+    def setViewParameters(self, eye, lookat, up, angle):
+        self._sceneviewer.beginChange()
+        self._sceneviewer.setLookatParametersNonSkew(eye, lookat, up)
+        self._sceneviewer.setViewAngle(angle)
+        self._sceneviewer.endChange()
+
+    def viewAll(self):
+        self._sceneviewer.viewAll()
+
+    def render(self):
+        '''
+        Render the scene into the pixel buffer and return it as a QImage.
+        '''
+        self._pbuffer.makeCurrent()
+        if self._framebuffer is not None:
+            self._framebuffer.bind()
+        self._sceneviewer.setViewportSize(self._width, self._height)
+        self._sceneviewer.renderScene()
+        if self._framebuffer is not None:
+            self._framebuffer.release()
+            image = self._framebuffer.toImage()
+        else:
+            image = self._pbuffer.toImage()
+            if (image.width(), image.height()) != (self._width, self._height):
+                # the viewport is at the bottom left of the pixel buffer
+                image = image.copy(0, image.height() - self._height, self._width, self._height)
+        self._pbuffer.doneCurrent()
+        return image
+
+    def renderToArray(self):
+        '''
+        Render the scene and return it as a height x width x 4 NumPy array
+        of RGBA bytes.
+        '''
+        return imageToArray(self.render())
+
+    def renderToFile(self, filename):
+        '''
+        Render the scene and save it to the named image file, with the format
+        determined from the file extension. Returns True on success.
+        '''
+        return self.render().save(filename)
@@ -0,0 +1,94 @@
+"""
+Zinc Pick Cache
+
+Wraps a Zinc Scenepicker so repeated queries for the same picking rectangle,
+scene filter, view and scene state reuse the results of a single pick
+instead of each causing a pick render.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from opencmiss.zinc.status import OK
+
+
+class CachedScenepicker(object):
+
+    def __init__(self, scenepicker, sceneviewerwidget):
+        '''
+        The sceneviewerwidget supplies the view and scene versions which
+        invalidate cached results when the view or scene changes.
+        '''
+        self._scenepicker = scenepicker
+        self._sceneviewerwidget = sceneviewerwidget
+        self._key = None
+        self._results = {}
+        self._filter_version = 0
+        self._hit_count = 0
+        self._miss_count = 0
+
+    def __getattr__(self, name):
+        # pass anything not cached straight to the Zinc scenepicker
+        return getattr(self._scenepicker, name)
+
+    def getScenepicker(self):
+        return self._scenepicker
+
+    def getCounters(self):
+        '''
+        Return a tuple of the number of queries answered from the cache and
+        the number which needed the Zinc scenepicker.
+        '''
+        return (self._hit_count, self._miss_count)
+
+    def resetCounters(self):
+        self._hit_count = 0
+        self._miss_count = 0
+
+    def invalidate(self):
+        self._key = None
+        self._results = {}
+
+    def setScenefilter(self, scenefilter):
+        self._filter_version += 1
+        self.invalidate()
+        return self._scenepicker.setScenefilter(scenefilter)
+
+    def setSceneviewerRectangle(self, sceneviewer, coordinate_system, left, bottom, right, top):
+        key = (coordinate_system, left, bottom, right, top, self._filter_version,
+               self._sceneviewerwidget.getViewVersion(), self._sceneviewerwidget.getSceneVersion())
+        if key == self._key:
+            return OK
+        self._key = key
+        self._results = {}
+        return self._scenepicker.setSceneviewerRectangle(sceneviewer, coordinate_system, left, bottom, right, top)
+
+    def _cached(self, name, query):
+        if self._key is not None and name in self._results:
+            self._hit_count += 1
+            return self._results[name]
+        self._miss_count += 1
+        result = query()
+        self._results[name] = result
+        return result
+
+    def getNearestGraphics(self):
+        return self._cached('graphics', self._scenepicker.getNearestGraphics)
+
+    def getNearestNode(self):
+        return self._cached('node', self._scenepicker.getNearestNode)
+
+    def getNearestNodeGraphics(self):
+        return self._cached('node_graphics', self._scenepicker.getNearestNodeGraphics)
+
+    def getNearestElement(self):
+        return self._cached('element', self._scenepicker.getNearestElement)
+
+    def getNearestElementGraphics(self):
+        return self._cached('element_graphics', self._scenepicker.getNearestElementGraphics)
+
+    def getPickingVolumeCentre(self):
+        result, centre = self._cached('centre', self._scenepicker.getPickingVolumeCentre)
+        # callers may modify the returned coordinates
+        return result, list(centre)
@@ -0,0 +1,49 @@
+"""
+Zinc Polygon Selection
+
+Vectorised point in polygon tests used for lasso and polygon selection of
+nodes by their window positions.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import numpy
+
+
+class SelectionShape(object):
+
+    RECTANGLE = 0
+    LASSO = 1
+    POLYGON = 2
+
+
+def pointsInPolygon(points, polygon):
+    '''
+    Return a boolean array which is True for each of the N x 2 points inside
+    the closed polygon given as an M x 2 array of vertices, using the even-odd
+    rule. The cost is proportional to N times M.
+    '''
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 2)
+    polygon = numpy.asarray(polygon, dtype=numpy.float64).reshape(-1, 2)
+    inside = numpy.zeros(len(points), dtype=bool)
+    if len(polygon) < 3 or len(points) == 0:
+        return inside
+    # only test points inside the polygon's bounding box
+    minimum = polygon.min(axis=0)
+    maximum = polygon.max(axis=0)
+    candidates = numpy.nonzero(numpy.all((points >= minimum) & (points <= maximum), axis=1))[0]
+    x = points[candidates, 0]
+    y = points[candidates, 1]
+    candidate_inside = numpy.zeros(len(candidates), dtype=bool)
+    xj, yj = polygon[-1]
+    for xi, yi in polygon:
+        crossing = numpy.nonzero((yi > y) != (yj > y))[0]
+        if len(crossing):
+            x_intersect = (xj - xi)*(y[crossing] - yi)/(yj - yi) + xi
+            candidate_inside[crossing] ^= x[crossing] < x_intersect
+        xj, yj = xi, yi
+    inside[candidates] = candidate_inside
+    return inside
+
@@ -0,0 +1,514 @@
+"""
+Zinc Ray Surface Intersection
+
+Intersects pick rays with the faces drawn by a surfaces graphics. The faces
+are tessellated into triangles with a grid of xi locations, the triangles
+are indexed with a bounding volume hierarchy, and the nearest triangle hit
+by the ray is found with the Moller-Trumbore test. The element xi estimated
+from the hit triangle is then refined with a few Gauss-Newton iterations so
+the returned point lies on the element and on the ray.
+
+Only changes to the faces or to the nodes they use affect the tessellation:
+moving nodes which are not on the surface keeps it, moving surface nodes
+re-evaluates just the triangles of their faces and refits the bounding
+boxes above them, and adding, removing or redefining elements, changing
+the graphics subgroup or changing coordinates not tied to known nodes
+rebuilds it, all lazily on the next intersection.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import numpy
+
+from opencmiss.zinc.element import Element
+from opencmiss.zinc.field import Field
+from opencmiss.zinc.node import Node
+from opencmiss.zinc.status import OK
+
+DEFAULT_DIVISIONS = 4
+LEAF_SIZE = 8
+NEWTON_ITERATIONS = 8
+NEWTON_TOLERANCE = 1.0E-8
+
+
+def _cross(a, b):
+    return numpy.column_stack((a[:, 1]*b[:, 2] - a[:, 2]*b[:, 1],
+                               a[:, 2]*b[:, 0] - a[:, 0]*b[:, 2],
+                               a[:, 0]*b[:, 1] - a[:, 1]*b[:, 0]))
+
+
+def intersectTriangles(origin, direction, v0, edge1, edge2, t_max=numpy.inf):
+    '''
+    Moller-Trumbore intersection of one ray with N triangles given by their
+    first vertices and two edge vectors as N x 3 arrays. Returns the index of
+    the nearest triangle hit with ray parameter in [0, t_max], its ray
+    parameter and barycentric coordinates u, v, or None if none are hit.
+    '''
+    directions = numpy.broadcast_to(direction, edge2.shape)
+    p = _cross(directions, edge2)
+    determinant = numpy.sum(edge1*p, axis=1)
+    valid = numpy.abs(determinant) > 1.0E-14
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        inverse = 1.0/determinant
+        s = origin - v0
+        u = numpy.sum(s*p, axis=1)*inverse
+        q = _cross(s, edge1)
+        v = numpy.sum(directions*q, axis=1)*inverse
+        t = numpy.sum(edge2*q, axis=1)*inverse
+    hit = valid & (u >= 0.0) & (v >= 0.0) & (u + v <= 1.0) & (t >= 0.0) & (t <= t_max)
+    if not numpy.any(hit):
+        return None
+    candidates = numpy.nonzero(hit)[0]
+    nearest = candidates[numpy.argmin(t[candidates])]
+    return nearest, t[nearest], u[nearest], v[nearest]
+
+
+def _getSurfacesSettings(graphics):
+    return (graphics.getCoordinateField(), graphics.getSubgroupField(),
+            graphics.isExterior(), graphics.getElementFaceType())
+
+
+class RaySurfaceIntersector(object):
+
+    def __init__(self, graphics, divisions=DEFAULT_DIVISIONS):
+        '''
+        Intersect rays with the 2-D elements drawn by graphics, a surfaces
+        graphics, honouring its coordinate field, subgroup, exterior and face
+        settings. Each element is tessellated with the given number of
+        divisions along each xi direction.
+        '''
+        self._graphics = graphics
+        self._coordinate_field, self._subgroup_field, exterior, face_type = _getSurfacesSettings(graphics)
+        self._settings = (exterior, face_type)
+        self._divisions = divisions
+        fieldmodule = self._coordinate_field.getFieldmodule()
+        self._mesh = fieldmodule.findMeshByDimension(2)
+        self._nodeset = fieldmodule.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
+        self._fieldcache = fieldmodule.createFieldcache()
+        self._derivatives = [fieldmodule.createFieldDerivative(self._coordinate_field, xi_index) for xi_index in [1, 2]]
+        # exterior and face settings only apply to faces of 3-D elements
+        conditions = []
+        if self._subgroup_field.isValid():
+            conditions.append(self._subgroup_field)
+        if fieldmodule.findMeshByDimension(3).getSize() > 0:
+            if exterior:
+                conditions.append(fieldmodule.createFieldIsExterior())
+            if face_type != Element.FACE_TYPE_ALL:
+                conditions.append(fieldmodule.createFieldIsOnFace(face_type))
+        self._condition = None
+        for condition in conditions:
+            self._condition = condition if self._condition is None else \
+                fieldmodule.createFieldAnd(self._condition, condition)
+        self._built = False
+        self._dirty_elements = set()
+        self._changed_nodes = None
+        self._last_iterations = 0
+        self._fieldmodulenotifier = fieldmodule.createFieldmodulenotifier()
+        self._fieldmodulenotifier.setCallback(self._zincFieldmoduleEvent)
+
+    def getGraphics(self):
+        return self._graphics
+
+    def getCoordinateField(self):
+        return self._coordinate_field
+
+    def getMesh(self):
+        return self._mesh
+
+    def isCurrent(self):
+        '''
+        Return True if the graphics settings used for the tessellation have
+        not changed since the intersector was created.
+        '''
+        coordinate_field, subgroup_field, exterior, face_type = _getSurfacesSettings(self._graphics)
+        return (coordinate_field == self._coordinate_field) and (subgroup_field == self._subgroup_field) and \
+            ((exterior, face_type) == self._settings)
+
+    def getLastIterations(self):
+        '''
+        Return the number of Newton iterations used by the last intersection.
+        '''
+        return self._last_iterations
+
+    def invalidate(self):
+        self._built = False
+        self._dirty_elements = set()
+
+    def setChangedNodes(self, nodesetgroup):
+        '''
+        Set a nodeset group containing the nodes whose coordinates are about
+        to change, so only they are looked up when the change is notified
+        instead of every node on the surface. Pass None once the change is
+        complete. Changes to nodes outside the group are still found.
+        '''
+        self._changed_nodes = nodesetgroup
+
+    def _zincFieldmoduleEvent(self, event):
+        if not self._built:
+            return
+        for dimension in [2, 3]:
+            meshchanges = event.getMeshchanges(self._mesh.getFieldmodule().findMeshByDimension(dimension))
+            if meshchanges.getSummaryElementChangeFlags() & (Element.CHANGE_FLAG_ADD | Element.CHANGE_FLAG_REMOVE |
+                                                             Element.CHANGE_FLAG_DEFINITION | Element.CHANGE_FLAG_FIELD):
+                self.invalidate()
+                return
+        field_change_flags = event.getFieldChangeFlags(self._coordinate_field)
+        if field_change_flags & Field.CHANGE_FLAG_DEFINITION:
+            self.invalidate()
+            return
+        if self._subgroup_field.isValid() and (event.getFieldChangeFlags(self._subgroup_field) & Field.CHANGE_FLAG_RESULT):
+            self.invalidate()
+            return
+        if field_change_flags & Field.CHANGE_FLAG_RESULT:
+            nodesetchanges = event.getNodesetchanges(self._nodeset)
+            number_of_changes = nodesetchanges.getNumberOfChanges()
+            if number_of_changes <= 0:
+                # too many changes to be recorded per node, or the coordinates
+                # changed without any node changing, e.g. for a derived field
+                self.invalidate()
+                return
+            if self._unmapped_elements:
+                # faces whose nodes are not known may use any changed node
+                self.invalidate()
+                return
+            self._markChangedNodes(nodesetchanges, number_of_changes)
+
+    def _markChangedNodes(self, nodesetchanges, number_of_changes):
+        '''
+        Add the elements using the changed nodes to the dirty elements,
+        looking up the nodes in the changed nodes group first and only
+        checking every surface node if that does not account for all changes.
+        '''
+        change_flags = Node.CHANGE_FLAG_DEFINITION | Node.CHANGE_FLAG_FIELD
+        found = set()
+        if self._changed_nodes is not None:
+            iterator = self._changed_nodes.createNodeiterator()
+            node = iterator.next()
+            while node.isValid():
+                if nodesetchanges.getNodeChangeFlags(node) & change_flags:
+                    identifier = node.getIdentifier()
+                    found.add(identifier)
+                    entry = self._node_elements.get(identifier)
+                    if entry is not None:
+                        self._dirty_elements.update(entry[1])
+                node = iterator.next()
+            if len(found) >= number_of_changes:
+                return
+        for identifier, (node, elements) in self._node_elements.items():
+            if (identifier not in found) and (nodesetchanges.getNodeChangeFlags(node) & change_flags):
+                found.add(identifier)
+                self._dirty_elements.update(elements)
+                if len(found) >= number_of_changes:
+                    return
+
+    def _evaluate(self, element, xi):
+        '''
+        Return the coordinates at element xi padded to 3 components, or None.
+        '''
+        self._fieldcache.setMeshLocation(element, xi)
+        number_of_components = self._coordinate_field.getNumberOfComponents()
+        result, x = self._coordinate_field.evaluateReal(self._fieldcache, number_of_components)
+        if result != OK:
+            return None
+        if number_of_components == 1:
+            x = [x]
+        return (list(x) + [0.0, 0.0])[:3]
+
+    def _isDrawn(self, element):
+        if self._condition is None:
+            return True
+        self._fieldcache.setElement(element)
+        result, value = self._condition.evaluateReal(self._fieldcache, 1)
+        return (result == OK) and (value != 0.0)
+
+    def _getElementNodes(self, element):
+        '''
+        Return the nodes of element from its coordinate field template or,
+        for faces which have none of their own, all nodes of the field
+        templates of the parent elements they inherit it from. Returns None
+        if the nodes are not known.
+        '''
+        nodes = {}
+        elements = [element]
+        while elements:
+            element = elements.pop()
+            eft = element.getElementfieldtemplate(self._coordinate_field, -1)
+            if eft.isValid():
+                for local_node_index in range(1, eft.getNumberOfLocalNodes() + 1):
+                    node = element.getNode(eft, local_node_index)
+                    if node.isValid():
+                        nodes[node.getIdentifier()] = node
+                continue
+            number_of_parents = element.getNumberOfParents()
+            if number_of_parents <= 0:
+                return None
+            for parent_index in range(1, number_of_parents + 1):
+                elements.append(element.getParentElement(parent_index))
+        return list(nodes.values())
+
+    def _tessellate(self):
+        d = self._divisions
+        square = [(i, j) for j in range(d + 1) for i in range(d + 1)]
+        triangle = [(i, j) for (i, j) in square if i + j <= d]
+        vertices = []
+        vertex_xi = []
+        element_vertex_starts = [0]
+        triangles = []
+        triangle_elements = []
+        elements = []
+        node_elements = {}
+        unmapped_elements = []
+        fieldmodule = self._mesh.getFieldmodule()
+        fieldmodule.beginChange()
+        iterator = self._mesh.createElementiterator()
+        element = iterator.next()
+        while element.isValid():
+            if self._isDrawn(element):
+                element_index = len(elements)
+                grid = triangle if element.getShapeType() == Element.SHAPE_TYPE_TRIANGLE else square
+                indexes = {}
+                for i, j in grid:
+                    xi = [float(i)/d, float(j)/d]
+                    x = self._evaluate(element, xi)
+                    if x is not None:
+                        indexes[(i, j)] = len(vertices)
+                        vertices.append(x)
+                        vertex_xi.append(xi)
+                for i in range(d):
+                    for j in range(d):
+                        a = indexes.get((i, j))
+                        b = indexes.get((i + 1, j))
+                        c = indexes.get((i, j + 1))
+                        e = indexes.get((i + 1, j + 1))
+                        if a is not None and b is not None and c is not None:
+                            triangles.append((a, b, c))
+                            triangle_elements.append(element_index)
+                        if b is not None and e is not None and c is not None:
+                            triangles.append((b, e, c))
+                            triangle_elements.append(element_index)
+                elements.append(element)
+                element_vertex_starts.append(len(vertices))
+                nodes = self._getElementNodes(element)
+                if nodes is None:
+                    unmapped_elements.append(element_index)
+                else:
+                    for node in nodes:
+                        node_elements.setdefault(node.getIdentifier(), (node, []))[1].append(element_index)
+            element = iterator.next()
+        fieldmodule.endChange()
+        self._vertices = numpy.array(vertices, dtype=numpy.float64).reshape(-1, 3)
+        self._vertex_xi = numpy.array(vertex_xi, dtype=numpy.float64).reshape(-1, 2)
+        self._element_vertex_starts = element_vertex_starts
+        self._triangles = numpy.array(triangles, dtype=numpy.int64).reshape(-1, 3)
+        self._triangle_elements = numpy.array(triangle_elements, dtype=numpy.int64)
+        self._elements = elements
+        self._node_elements = node_elements
+        self._unmapped_elements = unmapped_elements
+        self._updateTriangles(slice(None))
+
+    def _updateTriangles(self, triangles):
+        '''
+        Recompute the first vertices and edges of the triangles, a slice or
+        array of triangle positions, from the vertices.
+        '''
+        vertex_indexes = self._triangles[triangles]
+        v0 = self._vertices[vertex_indexes[:, 0]]
+        edge1 = self._vertices[vertex_indexes[:, 1]] - v0
+        edge2 = self._vertices[vertex_indexes[:, 2]] - v0
+        if isinstance(triangles, slice):
+            self._v0, self._edge1, self._edge2 = v0, edge1, edge2
+        else:
+            self._v0[triangles] = v0
+            self._edge1[triangles] = edge1
+            self._edge2[triangles] = edge2
+
+    def _getTriangleBounds(self, start, end):
+        v0 = self._v0[start:end]
+        v1 = v0 + self._edge1[start:end]
+        v2 = v0 + self._edge2[start:end]
+        return numpy.minimum(numpy.minimum(v0, v1), v2), numpy.maximum(numpy.maximum(v0, v1), v2)
+
+    def _buildHierarchy(self):
+        '''
+        Build a bounding volume hierarchy over the triangles by recursive
+        median splits along the longest axis of the triangle centroids.
+        Nodes are numbered depth first so children follow their parents.
+        '''
+        triangle_min, triangle_max = self._getTriangleBounds(0, len(self._triangles))
+        centroids = self._v0 + (self._edge1 + self._edge2)/3.0
+        order = numpy.arange(len(self._triangles))
+        node_min = []
+        node_max = []
+        # children for branch nodes; first triangle and count for leaves (count 0 for branches)
+        node_children = []
+        node_range = []
+        node_parent = []
+
+        def build(start, end, parent):
+            index = len(node_min)
+            selection = order[start:end]
+            node_min.append(triangle_min[selection].min(axis=0))
+            node_max.append(triangle_max[selection].max(axis=0))
+            node_children.append((-1, -1))
+            node_range.append((start, end - start))
+            node_parent.append(parent)
+            if end - start > LEAF_SIZE:
+                c = centroids[selection]
+                axis = numpy.argmax(c.max(axis=0) - c.min(axis=0))
+                middle = (end - start)//2
+                order[start:end] = selection[numpy.argpartition(c[:, axis], middle)]
+                left = build(start, start + middle, index)
+                right = build(start + middle, end, index)
+                node_children[index] = (left, right)
+                node_range[index] = (start, 0)
+            return index
+
+        if len(order):
+            build(0, len(order), -1)
+        self._node_min = numpy.array(node_min, dtype=numpy.float64).reshape(-1, 3)
+        self._node_max = numpy.array(node_max, dtype=numpy.float64).reshape(-1, 3)
+        self._node_children = node_children
+        self._node_range = node_range
+        self._node_parent = node_parent
+        self._triangles = self._triangles[order]
+        self._triangle_elements = self._triangle_elements[order]
+        self._v0 = self._v0[order]
+        self._edge1 = self._edge1[order]
+        self._edge2 = self._edge2[order]
+        self._triangle_leaves = numpy.zeros(len(order), dtype=numpy.int64)
+        for node, (start, count) in enumerate(node_range):
+            if count:
+                self._triangle_leaves[start:start + count] = node
+
+    def _refit(self):
+        '''
+        Re-evaluate the vertices of the dirty elements and refit the bounding
+        boxes of the leaves containing their triangles and of their
+        ancestors. Returns False if a vertex could not be evaluated, in which
+        case the tessellation must be rebuilt.
+        '''
+        dirty = numpy.array(sorted(self._dirty_elements), dtype=numpy.int64)
+        self._dirty_elements = set()
+        for element_index in dirty:
+            element = self._elements[element_index]
+            for vertex in range(self._element_vertex_starts[element_index], self._element_vertex_starts[element_index + 1]):
+                x = self._evaluate(element, self._vertex_xi[vertex].tolist())
+                if x is None:
+                    return False
+                self._vertices[vertex] = x
+        triangles = numpy.nonzero(numpy.isin(self._triangle_elements, dirty))[0]
+        if len(triangles) == 0:
+            return True
+        self._updateTriangles(triangles)
+        nodes = set(self._triangle_leaves[triangles].tolist())
+        for node in list(nodes):
+            parent = self._node_parent[node]
+            while parent >= 0 and parent not in nodes:
+                nodes.add(parent)
+                parent = self._node_parent[parent]
+        # children have higher numbers than their parents so are refitted first
+        for node in sorted(nodes, reverse=True):
+            start, count = self._node_range[node]
+            if count:
+                triangle_min, triangle_max = self._getTriangleBounds(start, start + count)
+                self._node_min[node] = triangle_min.min(axis=0)
+                self._node_max[node] = triangle_max.max(axis=0)
+            else:
+                left, right = self._node_children[node]
+                self._node_min[node] = numpy.minimum(self._node_min[left], self._node_min[right])
+                self._node_max[node] = numpy.maximum(self._node_max[left], self._node_max[right])
+        return True
+
+    def update(self):
+        if self._built and self._dirty_elements:
+            if not self._refit():
+                self.invalidate()
+        if not self._built:
+            self._tessellate()
+            self._buildHierarchy()
+            self._built = True
+
+    def _intersectHierarchy(self, origin, direction, t_max):
+        with numpy.errstate(divide='ignore'):
+            inverse_direction = 1.0/direction
+        best = None
+        best_t = t_max
+        stack = [0] if len(self._node_min) else []
+        while stack:
+            node = stack.pop()
+            with numpy.errstate(invalid='ignore'):
+                t1 = (self._node_min[node] - origin)*inverse_direction
+                t2 = (self._node_max[node] - origin)*inverse_direction
+            t_near = numpy.nanmax(numpy.minimum(t1, t2))
+            t_far = numpy.nanmin(numpy.maximum(t1, t2))
+            if t_near > t_far or t_far < 0.0 or t_near > best_t:
+                continue
+            start, count = self._node_range[node]
+            if count:
+                hit = intersectTriangles(origin, direction, self._v0[start:start + count],
+                                         self._edge1[start:start + count], self._edge2[start:start + count], best_t)
+                if hit is not None:
+                    best = (start + hit[0], hit[2], hit[3])
+                    best_t = hit[1]
+            else:
+                stack.extend(self._node_children[node])
+        return best
+
+    def _refine(self, element, xi, origin, direction):
+        '''
+        Gauss-Newton iterations for the element xi whose coordinates are on
+        the ray, solving for the component of the offset from the ray normal
+        to it. Returns the refined xi and coordinates.
+        '''
+        unit = direction/numpy.linalg.norm(direction)
+        projector = numpy.identity(3) - numpy.outer(unit, unit)
+        xi = numpy.array(xi, dtype=numpy.float64)
+        self._last_iterations = 0
+        simplex = element.getShapeType() == Element.SHAPE_TYPE_TRIANGLE
+        for iteration in range(NEWTON_ITERATIONS):
+            x = self._evaluate(element, xi.tolist())
+            if x is None:
+                return None
+            jacobian = numpy.zeros((3, 2))
+            for column, derivative in enumerate(self._derivatives):
+                result, dx = derivative.evaluateReal(self._fieldcache, self._coordinate_field.getNumberOfComponents())
+                if result != OK:
+                    return xi.tolist(), x
+                if not isinstance(dx, (list, tuple)):
+                    dx = [dx]
+                jacobian[:len(dx[:3]), column] = dx[:3]
+            residual = projector.dot(numpy.array(x) - origin)
+            step = numpy.linalg.lstsq(projector.dot(jacobian), -residual, rcond=None)[0]
+            xi = numpy.clip(xi + step, 0.0, 1.0)
+            if simplex and xi.sum() > 1.0:
+                xi /= xi.sum()
+            self._last_iterations = iteration + 1
+            if numpy.dot(step, step) < NEWTON_TOLERANCE*NEWTON_TOLERANCE:
+                break
+        x = self._evaluate(element, xi.tolist())
+        if x is None:
+            return None
+        return xi.tolist(), x
+
+    def intersect(self, origin, direction, t_max=numpy.inf):
+        '''
+        Return the element, xi and coordinates of the nearest intersection of
+        the ray origin + t*direction, 0 <= t <= t_max, with the surfaces, or
+        None if the ray misses.
+        '''
+        self.update()
+        origin = numpy.array(origin, dtype=numpy.float64)
+        direction = numpy.array(direction, dtype=numpy.float64)
+        hit = self._intersectHierarchy(origin, direction, t_max)
+        if hit is None:
+            return None
+        index, u, v = hit
+        element = self._elements[self._triangle_elements[index]]
+        a, b, c = self._triangles[index]
+        xi = (1.0 - u - v)*self._vertex_xi[a] + u*self._vertex_xi[b] + v*self._vertex_xi[c]
+        refined = self._refine(element, xi, origin, direction)
+        if refined is None:
+            return None
+        return element, refined[0], refined[1]
@@ -0,0 +1,199 @@
+"""
+Zinc Sceneviewer Manager
+
+Creates and tracks several Zinc Sceneviewer Widgets which share one OpenGL
+context and one Zinc context, optionally linking their cameras, and reports
+how much graphics memory sharing saves where the driver can tell us.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+try:
+    from PySide import QtCore
+except ImportError:
+    from PyQt4 import QtCore
+
+try:
+    from OpenGL import GL
+except ImportError:
+    GL = None
+
+from opencmiss.zinc.sceneviewer import Sceneviewerevent
+from sceneviewerwidget import SceneviewerWidget
+
+GPU_MEMORY_INFO_CURRENT_AVAILABLE_VIDMEM_NVX = 0x9049
+TEXTURE_FREE_MEMORY_ATI = 0x87FC
+
+
+def queryFreeVideoMemory():
+    '''
+    Return the free video memory in kilobytes reported by the driver for the
+    current OpenGL context, or None if PyOpenGL is not installed or the
+    driver has neither the NVX_gpu_memory_info nor ATI_meminfo extension.
+    '''
+    if GL is None:
+        return None
+    try:
+        extensions = GL.glGetString(GL.GL_EXTENSIONS) or b''
+        if b'GL_NVX_gpu_memory_info' in extensions:
+            return int(GL.glGetIntegerv(GPU_MEMORY_INFO_CURRENT_AVAILABLE_VIDMEM_NVX))
+        if b'GL_ATI_meminfo' in extensions:
+            return int(GL.glGetIntegerv(TEXTURE_FREE_MEMORY_ATI)[0])
+    except Exception:
+        pass
+    return None
+
+
+class _ViewerRecord(object):
+
+    def __init__(self, widget):
+        self.widget = widget
+        self.notifier = None
+        self.linked = False
+        self.memory_before_first_frame = None
+        self.memory_after_first_frame = None
+
+    def getFirstFrameMemoryCost(self):
+        if self.memory_before_first_frame is None or self.memory_after_first_frame is None:
+            return None
+        return self.memory_before_first_frame - self.memory_after_first_frame
+
+
+class SceneviewerManager(QtCore.QObject):
+
+    def __init__(self, context, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        self._context = context
+        self._records = []
+        self._propagating_view = False
+
+    def getContext(self):
+        return self._context
+
+    def createSceneviewerWidget(self, parent=None, widget_class=SceneviewerWidget):
+        '''
+        Create a sceneviewer widget of the given class using the managed Zinc
+        context and sharing the OpenGL context of the first managed widget.
+        '''
+        shared = self._records[0].widget if self._records else None
+        widget = widget_class(parent, shared)
+        widget.setContext(self._context)
+        record = _ViewerRecord(widget)
+        self._records.append(record)
+        widget.graphicsInitialized.connect(lambda: self._viewerInitialized(record))
+        return widget
+
+    def removeSceneviewerWidget(self, widget):
+        '''
+        Stop managing the widget. It is not destroyed.
+        '''
+        record = self._findRecord(widget)
+        if record:
+            if record.notifier:
+                record.notifier.clearCallback()
+            self._records.remove(record)
+
+    def getSceneviewerWidgets(self):
+        return [record.widget for record in self._records]
+
+    def setCameraLinked(self, widget, linked):
+        '''
+        Set whether the widget's camera follows and drives the cameras of all
+        other linked widgets.
+        '''
+        record = self._findRecord(widget)
+        if record:
+            record.linked = linked
+            if linked:
+                for other in self._records:
+                    if other is not record and other.linked and other.widget.getSceneviewer():
+                        self._copyView(other.widget, [record])
+                        break
+
+    def linkAllCameras(self):
+        for record in self._records:
+            self.setCameraLinked(record.widget, True)
+
+    def unlinkAllCameras(self):
+        for record in self._records:
+            record.linked = False
+
+    def isCameraLinked(self, widget):
+        record = self._findRecord(widget)
+        return record is not None and record.linked
+
+    def getFrameCounters(self):
+        '''
+        Return a list of (requested, rendered) frame counts for each managed
+        widget, in creation order.
+        '''
+        return [record.widget.getFrameCounters() for record in self._records]
+
+    def getMemoryReport(self):
+        '''
+        Return a dict describing OpenGL context sharing: the number of viewers,
+        how many share the first viewer's context and, where the driver reports
+        free video memory, each viewer's memory cost in kilobytes for its first
+        frame and the estimated kilobytes saved compared with every viewer
+        uploading its graphics to a separate context as the first one did.
+        '''
+        costs = [record.getFirstFrameMemoryCost() for record in self._records]
+        report = {
+            'viewers': len(self._records),
+            'sharing_viewers': len([record for record in self._records if record.widget.isSharing()]),
+            'first_frame_memory_kb': costs,
+            'estimated_saved_kb': None,
+        }
+        if costs and costs[0] is not None:
+            saved = 0
+            for record, cost in zip(self._records[1:], costs[1:]):
+                if cost is not None and record.widget.isSharing():
+                    saved += max(0, costs[0] - cost)
+            report['estimated_saved_kb'] = saved
+        return report
+
+    def _findRecord(self, widget):
+        for record in self._records:
+            if record.widget is widget:
+                return record
+        return None
+
+    def _viewerInitialized(self, record):
+        sceneviewer = record.widget.getSceneviewer()
+        record.notifier = sceneviewer.createSceneviewernotifier()
+        record.notifier.setCallback(lambda event: self._zincSceneviewerEvent(record, event))
+        # context is current during initializeGL; graphics are uploaded on the first render
+        record.memory_before_first_frame = queryFreeVideoMemory()
+        if record.memory_before_first_frame is not None:
+            record.widget.frameRendered.connect(lambda sample: self._firstFrameRendered(record))
+        if record.linked:
+            self.setCameraLinked(record.widget, True)
+
+    def _firstFrameRendered(self, record):
+        if record.memory_after_first_frame is None:
+            record.memory_after_first_frame = queryFreeVideoMemory()
+
+    def _zincSceneviewerEvent(self, record, event):
+        if record.linked and not self._propagating_view and \
+                (event.getChangeFlags() & Sceneviewerevent.CHANGE_FLAG_TRANSFORM):
+            targets = [other for other in self._records
+                       if other is not record and other.linked and other.widget.getSceneviewer()]
+            self._copyView(record.widget, targets)
+
+    def _copyView(self, source_widget, target_records):
+        '''
+        Copy the view to the target widgets whose view differs, so widgets
+        already showing the view are not repainted.
+        '''
+        view_parameters = source_widget.getViewParameters()
+        if view_parameters is None:
+            return
+        self._propagating_view = True
+        try:
+            for target in target_records:
+                if target.widget.getViewParameters() != view_parameters:
+                    target.widget.setViewParameters(*view_parameters)
+        finally:
+            self._propagating_view = False
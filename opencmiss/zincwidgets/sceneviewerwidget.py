@@ -14,10 +14,14 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # See the examples at https://svn.physiomeproject.org/svn/cmiss/zinc/bindings/trunk/python/ for further
 # information.
 
+from timeit import default_timer
+
+import numpy
+
 try:
-    from PySide import QtCore, QtOpenGL
+    from PySide import QtCore, QtGui, QtOpenGL
 except ImportError:
-    from PyQt4 import QtCore, QtOpenGL
+    from PyQt4 import QtCore, QtGui, QtOpenGL
 
 # from opencmiss.zinc.glyph import Glyph
 from opencmiss.zinc.sceneviewer import Sceneviewer, Sceneviewerevent
@@ -29,6 +33,11 @@ from opencmiss.zinc.scenecoordinatesystem import \
 from opencmiss.zinc.field import Field
 from opencmiss.zinc.glyph import Glyph
 from opencmiss.zinc.status import OK
+from framescheduler import FrameScheduler
+from framestatistics import FrameStatistics
+from interactionlod import InteractionLevelOfDetail, LodMode
+from cameraanimation import CameraAnimator, easeInOutSine
+from selectionsummary import SelectionSummary, selectionIdentifiers
 
 # mapping from qt to zinc start
 # Create a button map of Qt mouse buttons to Zinc input buttons
@@ -48,6 +57,15 @@ def modifier_map(qt_modifiers):
 
     return modifiers
 
+def transformPoints(matrix, points):
+    '''
+    Transform an N x 3 array of points by a 4 x 4 homogeneous transformation
+    matrix, including the perspective divide.
+    '''
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+    homogeneous = points.dot(matrix[:, :3].T) + matrix[:, 3]
+    return homogeneous[:, :3] / homogeneous[:, 3:4]
+
 # projectionMode start
 class ProjectionMode(object):
 
@@ -61,9 +79,13 @@ class SceneviewerWidget(QtOpenGL.QGLWidget):
     try:
         # PySide
         graphicsInitialized = QtCore.Signal()
+        frameRendered = QtCore.Signal(object)
+        selectionChanged = QtCore.Signal(object)
     except AttributError:
         # PyQt
         graphicsInitialized = QtCore.pyqtSignal()
+        frameRendered = QtCore.pyqtSignal(object)
+        selectionChanged = QtCore.pyqtSignal(object)
     
 
     # Create a signal to notify when the sceneviewer is ready.
@@ -80,6 +102,37 @@ class SceneviewerWidget(QtOpenGL.QGLWidget):
         self._context = None
         self._sceneviewer = None
         self._ignore_mouse_events = False
+        self._frameScheduler = FrameScheduler(self._renderScheduledFrame, self)
+        self._frameStatistics = FrameStatistics()
+        self._world_to_window_matrix = None
+        self._window_to_world_matrix = None
+        self._view_version = 0
+        self._scene_version = 0
+        # Mouse motion is merged so at most one motion event is processed per frame
+        self._button_input = None
+        self._motion_input = None
+        self._pending_motion_position = None
+        self._processed_motion_count = 0
+        self._dropped_motion_count = 0
+        self._interactionLod = InteractionLevelOfDetail(self)
+        # interaction level of detail starts with the first drag motion, not the press
+        self._camera_drag_started = False
+        self._cameraAnimator = CameraAnimator(self, self)
+        # Viewport updates are deferred until the size has been stable for the resize delay
+        self._resize_timer = QtCore.QTimer(self)
+        self._resize_timer.setSingleShot(True)
+        self._resize_timer.setInterval(0)
+        self._resize_timer.timeout.connect(self._applyPendingViewportSize)
+        self._pending_viewport_size = None
+        # last rendered frame, captured when a deferred resize starts and stretched until it ends
+        self._resize_snapshot = None
+        self._viewport_size_set = False
+        # Zinc selection events are merged into one selectionChanged emission per event loop pass
+        self._selection_timer = QtCore.QTimer(self)
+        self._selection_timer.setSingleShot(True)
+        self._selection_timer.setInterval(0)
+        self._selection_timer.timeout.connect(self._emitSelectionChanged)
+        self._selection_identifiers = {}
         # init end
 
     def setContext(self, context):
@@ -88,6 +141,7 @@ class SceneviewerWidget(QtOpenGL.QGLWidget):
         method is called otherwise the scene viewer cannot be created.
         '''
         self._context = context
+        self._interactionLod.setContext(context)
 
     def getContext(self):
         if not self._context is None:
@@ -137,21 +191,15 @@ class SceneviewerWidget(QtOpenGL.QGLWidget):
             self._selectionGroup = fieldmodule.createFieldGroup()
             scene.setSelectionField(self._selectionGroup)
 
-            # Set up unproject pipeline
-            self._window_coords_from = fieldmodule.createFieldConstant([0, 0, 0])
-            self._global_coords_from = fieldmodule.createFieldConstant([0, 0, 0])
-            unproject = fieldmodule.createFieldSceneviewerProjection(self._sceneviewer, SCENECOORDINATESYSTEM_WINDOW_PIXEL_TOP_LEFT, SCENECOORDINATESYSTEM_WORLD)
-            project = fieldmodule.createFieldSceneviewerProjection(self._sceneviewer, SCENECOORDINATESYSTEM_WORLD, SCENECOORDINATESYSTEM_WINDOW_PIXEL_TOP_LEFT)
-
-    #         unproject_t = fieldmodule.createFieldTranspose(4, unproject)
-            self._global_coords_to = fieldmodule.createFieldProjection(self._window_coords_from, unproject)
-            self._window_coords_to = fieldmodule.createFieldProjection(self._global_coords_from, project)
+            # Set up project/unproject matrices, evaluated on demand and cached until the view changes
+            self._unproject_matrix_field = fieldmodule.createFieldSceneviewerProjection(self._sceneviewer, SCENECOORDINATESYSTEM_WINDOW_PIXEL_TOP_LEFT, SCENECOORDINATESYSTEM_WORLD)
+            self._project_matrix_field = fieldmodule.createFieldSceneviewerProjection(self._sceneviewer, SCENECOORDINATESYSTEM_WORLD, SCENECOORDINATESYSTEM_WINDOW_PIXEL_TOP_LEFT)
+            self._projection_fieldcache = fieldmodule.createFieldcache()
 
             self._sceneviewer.viewAll()
 
-    #  Not really applicable to us yet.
-    #         self._selection_notifier = scene.createSelectionnotifier()
-    #         self._selection_notifier.setCallback(self._zincSelectionEvent)
+            self._selection_notifier = scene.createSelectionnotifier()
+            self._selection_notifier.setCallback(self._zincSelectionEvent)
 
             self._sceneviewernotifier = self._sceneviewer.createSceneviewernotifier()
             self._sceneviewernotifier.setCallback(self._zincSceneviewerEvent)
@@ -185,6 +233,26 @@ class SceneviewerWidget(QtOpenGL.QGLWidget):
         self._sceneviewer.setViewAngle(angle)
         self._sceneviewer.endChange()
 
+    def animateViewParameters(self, eye, lookat, up, angle, duration, easing=easeInOutSine):
+        '''
+        Move the camera smoothly from the current view to the given view over
+        duration seconds, with the easing function mapping [0, 1] to [0, 1].
+        '''
+        self._cameraAnimator.animateTo(eye, lookat, up, angle, duration, easing)
+
+    def playCameraPath(self, path):
+        '''
+        Play a cameraanimation.CameraPath of keyframed views live. Returns
+        False if the path has no keyframes.
+        '''
+        return self._cameraAnimator.play(path)
+
+    def stopCameraAnimation(self):
+        self._cameraAnimator.stop()
+
+    def getCameraAnimator(self):
+        return self._cameraAnimator
+
     def setScenefilter(self, scenefilter):
         self._sceneviewer.setScenefilter(scenefilter)
 
@@ -195,18 +263,61 @@ class SceneviewerWidget(QtOpenGL.QGLWidget):
 
         return None
 
+    def _invalidateViewMatrices(self):
+        '''
+        Discard the cached projection matrices; called when the view changes.
+        '''
+        self._world_to_window_matrix = None
+        self._window_to_world_matrix = None
+        self._view_version += 1
+
+    def getViewVersion(self):
+        '''
+        Get a number which is incremented whenever the view transformation
+        changes, so callers can tell when cached screen space data is stale.
+        '''
+        return self._view_version
+
+    def getSceneVersion(self):
+        '''
+        Get a number which is incremented whenever the scene viewer reports
+        that a repaint is required, i.e. its scene or view has changed.
+        '''
+        return self._scene_version
+
+    def _evaluateMatrix(self, matrix_field):
+        result, values = matrix_field.evaluateReal(self._projection_fieldcache, 16)
+        if result == OK:
+            return numpy.array(values, dtype=numpy.float64).reshape(4, 4)
+
+        return None
+
+    def getWorldToWindowMatrix(self):
+        '''
+        Get the 4 x 4 matrix transforming homogeneous global coordinates into
+        window coordinates with the origin at the window's top left pixel.
+        '''
+        if self._world_to_window_matrix is None:
+            self._world_to_window_matrix = self._evaluateMatrix(self._project_matrix_field)
+        return self._world_to_window_matrix
+
+    def getWindowToWorldMatrix(self):
+        '''
+        Get the 4 x 4 matrix transforming homogeneous window coordinates with
+        the origin at the window's top left pixel into global coordinates.
+        '''
+        if self._window_to_world_matrix is None:
+            self._window_to_world_matrix = self._evaluateMatrix(self._unproject_matrix_field)
+        return self._window_to_world_matrix
+
     def project(self, x, y, z):
         '''
         project the given point in global coordinates into window coordinates
         with the origin at the window's top left pixel.
         '''
-        in_coords = [x, y, z]
-        fieldmodule = self._global_coords_from.getFieldmodule()
-        fieldcache = fieldmodule.createFieldcache()
-        self._global_coords_from.assignReal(fieldcache, in_coords)
-        result, out_coords = self._window_coords_to.evaluateReal(fieldcache, 3)
-        if result == OK:
-            return out_coords  # [out_coords[0] / out_coords[3], out_coords[1] / out_coords[3], out_coords[2] / out_coords[3]]
+        matrix = self.getWorldToWindowMatrix()
+        if matrix is not None:
+            return transformPoints(matrix, [x, y, z])[0].tolist()
 
         return None
 
@@ -218,13 +329,33 @@ class SceneviewerWidget(QtOpenGL.QGLWidget):
         on the far plane.
         ???GRC -1 on the far and +1 on the near clipping plane
         '''
-        in_coords = [x, y, z]
-        fieldmodule = self._window_coords_from.getFieldmodule()
-        fieldcache = fieldmodule.createFieldcache()
-        self._window_coords_from.assignReal(fieldcache, in_coords)
-        result, out_coords = self._global_coords_to.evaluateReal(fieldcache, 3)
-        if result == OK:
-            return out_coords  # [out_coords[0] / out_coords[3], out_coords[1] / out_coords[3], out_coords[2] / out_coords[3]]
+        matrix = self.getWindowToWorldMatrix()
+        if matrix is not None:
+            return transformPoints(matrix, [x, y, z])[0].tolist()
+
+        return None
+
+    def projectPoints(self, points):
+        '''
+        project an N x 3 array of points in global coordinates into window
+        coordinates with the origin at the window's top left pixel, returning
+        an N x 3 array.
+        '''
+        matrix = self.getWorldToWindowMatrix()
+        if matrix is not None:
+            return transformPoints(matrix, points)
+
+        return None
+
+    def unprojectPoints(self, points):
+        '''
+        unproject an N x 3 array of points in window coordinates, with the
+        origin at the window's top left pixel, into global coordinates
+        returning an N x 3 array. See unproject() for the meaning of z.
+        '''
+        matrix = self.getWindowToWorldMatrix()
+        if matrix is not None:
+            return transformPoints(matrix, points)
 
         return None
 
@@ -235,6 +366,119 @@ class SceneviewerWidget(QtOpenGL.QGLWidget):
 
         return None
 
+    def requestFrame(self):
+        '''
+        Request a repaint of the scene. Requests are merged so that a burst
+        of changes produces a single render, no sooner than the maximum frame
+        rate allows.
+        '''
+        self._frameScheduler.requestFrame()
+
+    def forceFrame(self):
+        '''
+        Render the scene immediately, ignoring the maximum frame rate.
+        '''
+        self._frameScheduler.forceFrame()
+
+    def setMaximumFrameRate(self, rate):
+        '''
+        Set the maximum number of frames rendered per second in response to
+        repaint requests. A rate of 0 or None removes the limit.
+        '''
+        self._frameScheduler.setMaximumFrameRate(rate)
+
+    def getMaximumFrameRate(self):
+        return self._frameScheduler.getMaximumFrameRate()
+
+    def getFrameCounters(self):
+        '''
+        Return a tuple of the number of frames requested and the number of
+        frames actually rendered.
+        '''
+        return (self._frameScheduler.getRequestedFrameCount(), self._frameScheduler.getRenderedFrameCount())
+
+    def resetFrameCounters(self):
+        self._frameScheduler.resetCounters()
+
+    def getFrameStats(self):
+        '''
+        Return a dict of rolling frame statistics: frames per second and the
+        p50/p95/p99 render time, request latency and frame interval in seconds
+        over the recent frame history.
+        '''
+        return self._frameStatistics.getStatistics()
+
+    def getFrameStatistics(self):
+        return self._frameStatistics
+
+    def setFrameStatsHistorySize(self, size):
+        '''
+        Set the number of recent frames the frame statistics are computed from.
+        '''
+        self._frameStatistics.setHistorySize(size)
+
+    def setFrameStatsExportFile(self, filename):
+        '''
+        Append the timings of each rendered frame as JSON lines to the named
+        file. Pass None to stop exporting.
+        '''
+        self._frameStatistics.setExportFile(filename)
+
+    def stopFrameStatsExport(self):
+        '''
+        Flush and close the frame statistics export file, if any.
+        '''
+        self._frameStatistics.stopExport()
+
+    def getMotionEventCounters(self):
+        '''
+        Return a tuple of the number of mouse motion events processed by the
+        scene viewer and the number dropped because a later motion event
+        arrived before the next frame.
+        '''
+        return (self._processed_motion_count, self._dropped_motion_count)
+
+    def resetMotionEventCounters(self):
+        self._processed_motion_count = 0
+        self._dropped_motion_count = 0
+
+    def setInteractionLodMode(self, graphics_type, mode):
+        '''
+        Set how graphics of the given Graphics.TYPE_* are drawn while the view
+        is being tumbled, panned or zoomed with the mouse: LodMode.NONE draws
+        them normally, LodMode.COARSE with a coarse tessellation and
+        LodMode.HIDE not at all.
+        '''
+        self._interactionLod.setMode(graphics_type, mode)
+
+    def getInteractionLodMode(self, graphics_type):
+        return self._interactionLod.getMode(graphics_type)
+
+    def setInteractionLodRestoreDelay(self, delay):
+        '''
+        Set the idle time in milliseconds after the mouse is released before
+        full quality graphics are restored.
+        '''
+        self._interactionLod.setRestoreDelay(delay)
+
+    def getInteractionLevelOfDetail(self):
+        return self._interactionLod
+
+    def setResizeDelay(self, delay):
+        '''
+        Set the time in milliseconds the widget size must be stable before the
+        scene viewer's viewport is resized and the scene rendered at the new
+        size. In the meantime the last rendered frame is stretched to fit,
+        for which each frame is read back after rendering. A delay of 0
+        resizes the viewport immediately.
+        '''
+        self._resize_timer.setInterval(delay)
+        if delay <= 0:
+            self._resize_snapshot = None
+
+    def getResizeDelay(self):
+        return self._resize_timer.interval()
+
     def setTumbleRate(self, rate):
         self._sceneviewer.setTumbleRate(rate)
 
@@ -252,31 +496,140 @@ class SceneviewerWidget(QtOpenGL.QGLWidget):
         correct OpenGL buffer for us so all we need do is render into it.  The scene viewer
         will clear the background so any OpenGL drawing of your own needs to go after this
         API call.
+        While a resize is pending the last frame is stretched over the widget instead.
         '''
+        if self._pending_viewport_size is not None and self._resize_snapshot is not None:
+            painter = QtGui.QPainter(self)
+            painter.drawImage(self.rect(), self._resize_snapshot)
+            painter.end()
+            self._frameScheduler.frameRendered()
+            return
+        request_time = self._frameScheduler.getRequestTime()
+        start_time = default_timer()
         self._sceneviewer.renderScene()
+        end_time = default_timer()
+        self._frameScheduler.frameRendered()
+        sample = self._frameStatistics.record(start_time, end_time, request_time)
+        self.frameRendered.emit(sample)
         # paintGL end
 
+    def _renderScheduledFrame(self):
+        '''
+        Render a frame on behalf of the frame scheduler, first passing the
+        latest mouse motion to the scene viewer.
+        '''
+        self._processPendingMotion()
+        self.updateGL()
+
     def _zincSceneviewerEvent(self, event):
         '''
-        Process a scene viewer event.  The updateGL() method is called for a
-        repaint required event all other events are ignored.
+        Process a scene viewer event.  The cached projection matrices are
+        discarded on a transform change and a frame is requested from the
+        frame scheduler for a repaint required event.
+        '''
+        change_flags = event.getChangeFlags()
+        if change_flags & Sceneviewerevent.CHANGE_FLAG_TRANSFORM:
+            self._invalidateViewMatrices()
+        if change_flags & Sceneviewerevent.CHANGE_FLAG_REPAINT_REQUIRED:
+            self._scene_version += 1
+            self._frameScheduler.requestFrame()
+
+    def _zincSelectionEvent(self, event):
+        '''
+        Process a scene selection event by scheduling a single selectionChanged
+        emission for all selection events until the timer fires.
+        '''
+        if not self._selection_timer.isActive():
+            self._selection_timer.start()
+
+    def _getSelectionChangedReceivers(self):
+        try:
+            return self.receivers(self.selectionChanged)
+        except TypeError:
+            # older bindings only accept the signal signature
+            return max(self.receivers(QtCore.SIGNAL(signature))
+                       for signature in ['selectionChanged(PyObject)', 'selectionChanged(PyQt_PyObject)'])
+
+    def _isSelectionSummaryRequired(self):
+        '''
+        Return True if selection changes must be summarised, by default only
+        if selectionChanged is connected.
+        '''
+        return self._getSelectionChangedReceivers() > 0
+
+    def _summariseSelection(self, previous):
+        '''
+        Return the identifiers of the current selection and the
+        SelectionSummary of its change from previous, which may be None, by
+        reading the whole selection group.
+        '''
+        group = self._sceneviewer.getScene().getSelectionField().castGroup()
+        identifiers = selectionIdentifiers(group)
+        return identifiers, SelectionSummary(previous or {}, identifiers)
+
+    def _emitSelectionChanged(self):
+        '''
+        Emit selectionChanged with a summary of the selection change, or do
+        nothing and return None if no summary is required. The selection is
+        not tracked while skipped, so the first summary after that reports
+        the whole selection as added.
+        '''
+        if not self._isSelectionSummaryRequired():
+            self._selection_identifiers = None
+            return None
+        identifiers, summary = self._summariseSelection(self._selection_identifiers)
+        self._selection_identifiers = identifiers
+        if summary.isChanged():
+            self.selectionChanged.emit(summary)
+        return summary
+
+    def setSelectionChangedDelay(self, milliseconds):
         '''
-        if event.getChangeFlags() & Sceneviewerevent.CHANGE_FLAG_REPAINT_REQUIRED:
-            QtCore.QTimer.singleShot(0, self.updateGL)
+        Set the time selection events are merged over before selectionChanged
+        is emitted. The default of 0 emits once per event loop pass; the frame
+        interval limits emissions to the maximum frame rate.
+        '''
+        self._selection_timer.setInterval(milliseconds)
 
-#  Not applicable at the current point in time.
-#     def _zincSelectionEvent(self, event):
-#         print(event.getChangeFlags())
-#         print('go the selection change')
+    def getSelectionChangedDelay(self):
+        return self._selection_timer.interval()
+
+    def resizeEvent(self, event):
+        '''
+        Capture the last rendered frame once when a deferred resize starts,
+        before the framebuffer is reallocated and its contents are undefined.
+        '''
+        if self._viewport_size_set and (self._resize_timer.interval() > 0) and \
+                (self._pending_viewport_size is None) and self.isVisible():
+            self._resize_snapshot = self.grabFrameBuffer()
+        QtOpenGL.QGLWidget.resizeEvent(self, event)
 
     # resizeGL start
     def resizeGL(self, width, height):
         '''
-        Respond to widget resize events.
+        Respond to widget resize events. With a resize delay the viewport
+        update is deferred until resizing has stopped.
         '''
+        if self._viewport_size_set and self._resize_timer.interval() > 0:
+            self._pending_viewport_size = (width, height)
+            self._resize_timer.start()
+            return
         self._sceneviewer.setViewportSize(width, height)
+        self._invalidateViewMatrices()
+        self._viewport_size_set = True
         # resizeGL end
 
+    def _applyPendingViewportSize(self):
+        if self._pending_viewport_size is None:
+            return
+        width, height = self._pending_viewport_size
+        self._pending_viewport_size = None
+        self._resize_snapshot = None
+        self.makeCurrent()
+        self._sceneviewer.setViewportSize(width, height)
+        self._invalidateViewMatrices()
+        self._frameScheduler.forceFrame()
+
 
     def mousePressEvent(self, event):
         '''
@@ -284,7 +637,8 @@ class SceneviewerWidget(QtOpenGL.QGLWidget):
         '''
         event.accept()
         if not self._ignore_mouse_events and not event.modifiers() or (event.modifiers() & self._selectionModifier and button_map[event.button()] == Sceneviewerinput.BUTTON_TYPE_RIGHT):
-            scene_input = self._sceneviewer.createSceneviewerinput()
+            self._processPendingMotion()
+            scene_input = self._getButtonInput()
             scene_input.setPosition(event.x(), event.y())
             scene_input.setEventType(Sceneviewerinput.EVENT_TYPE_BUTTON_PRESS)
             scene_input.setButtonType(button_map[event.button()])
@@ -292,6 +646,7 @@ class SceneviewerWidget(QtOpenGL.QGLWidget):
 
             self._sceneviewer.processSceneviewerinput(scene_input)
 
+            self._camera_drag_started = False
             self._handle_mouse_events = True
         else:
             event.ignore()
@@ -302,27 +657,62 @@ class SceneviewerWidget(QtOpenGL.QGLWidget):
         '''
         event.accept()
         if not self._ignore_mouse_events and self._handle_mouse_events:
-            scene_input = self._sceneviewer.createSceneviewerinput()
+            self._processPendingMotion()
+            scene_input = self._getButtonInput()
             scene_input.setPosition(event.x(), event.y())
             scene_input.setEventType(Sceneviewerinput.EVENT_TYPE_BUTTON_RELEASE)
             scene_input.setButtonType(button_map[event.button()])
+            scene_input.setModifierFlags(Sceneviewerinput.MODIFIER_FLAG_NONE)
 
             self._sceneviewer.processSceneviewerinput(scene_input)
+            if self._camera_drag_started:
+                self._camera_drag_started = False
+                self._interactionLod.end()
         else:
             event.ignore()
 
+    def _getButtonInput(self):
+        if self._button_input is None:
+            self._button_input = self._sceneviewer.createSceneviewerinput()
+        return self._button_input
+
+    def _processPendingMotion(self):
+        '''
+        Pass the latest merged mouse motion, if any, to the scene viewer.
+        '''
+        if self._pending_motion_position is None:
+            return
+        x, y = self._pending_motion_position
+        self._pending_motion_position = None
+        if self._motion_input is None:
+            self._motion_input = self._sceneviewer.createSceneviewerinput()
+            self._motion_input.setEventType(Sceneviewerinput.EVENT_TYPE_MOTION_NOTIFY)
+        self._motion_input.setPosition(x, y)
+        self._sceneviewer.processSceneviewerinput(self._motion_input)
+        self._processed_motion_count += 1
+
     def mouseMoveEvent(self, event):
         '''
         Inform the scene viewer of a mouse move event and update the OpenGL scene to reflect this
-        change to the viewport.
+        change to the viewport. Motion is passed on when the next frame is rendered, with
+        any earlier motion not yet passed on replaced by the latest position.
         '''
         event.accept()
         if not self._ignore_mouse_events and self._handle_mouse_events:
-            scene_input = self._sceneviewer.createSceneviewerinput()
-            scene_input.setPosition(event.x(), event.y())
-            scene_input.setEventType(Sceneviewerinput.EVENT_TYPE_MOTION_NOTIFY)
             if event.type() == QtCore.QEvent.Leave:
-                scene_input.setPosition(-1, -1)
-            self._sceneviewer.processSceneviewerinput(scene_input)
+                position = (-1, -1)
+            elif event.buttons() == QtCore.Qt.NoButton:
+                # only seen with mouse tracking on; nothing for the scene viewer to do
+                return
+            else:
+                position = (event.x(), event.y())
+                if not self._camera_drag_started:
+                    # the camera is being dragged, not just clicked
+                    self._camera_drag_started = True
+                    self._interactionLod.begin(self._sceneviewer.getScene())
+            if self._pending_motion_position is not None:
+                self._dropped_motion_count += 1
+            self._pending_motion_position = position
+            self._frameScheduler.requestFrame()
         else:
             event.ignore()
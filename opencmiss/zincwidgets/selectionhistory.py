@@ -0,0 +1,231 @@
+"""
+Zinc Selection History
+
+Compact snapshots of a selection group as sorted NumPy identifier arrays
+per nodeset and mesh, optionally run-length encoded, and a bounded undo and
+redo history of snapshots evicted by memory use.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import numpy
+
+from selectionoperations import addNodesByIdentifier, removeNodesByIdentifier, \
+    addElementsByIdentifier, removeElementsByIdentifier, getRegionGroup, splitSelectionKey
+from selectionsummary import selectionIdentifiers
+
+DEFAULT_MEMORY_LIMIT = 16*1024*1024  # bytes
+DEFAULT_MAXIMUM_DEPTH = 100
+
+
+def encodeRuns(identifiers):
+    '''
+    Return arrays of the first identifier and length of each run of
+    consecutive identifiers in a sorted identifier array.
+    '''
+    if len(identifiers) == 0:
+        return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+    breaks = numpy.nonzero(numpy.diff(identifiers) != 1)[0] + 1
+    starts = numpy.concatenate(([0], breaks))
+    lengths = numpy.diff(numpy.concatenate((starts, [len(identifiers)])))
+    return identifiers[starts].astype(numpy.int64), lengths.astype(numpy.int64)
+
+
+def decodeRuns(firsts, lengths):
+    '''
+    Return the sorted identifier array encoded by encodeRuns.
+    '''
+    if len(firsts) == 0:
+        return numpy.zeros(0, dtype=numpy.int64)
+    # offset of each identifier from the first identifier of its run
+    run_starts = numpy.cumsum(lengths) - lengths
+    offsets = numpy.arange(numpy.sum(lengths)) - numpy.repeat(run_starts, lengths)
+    return numpy.repeat(firsts, lengths) + offsets
+
+
+class SelectionSnapshot(object):
+
+    def __init__(self, identifiers, run_length=False):
+        '''
+        Snapshot from a dict mapping nodeset and mesh keys to sorted
+        identifier arrays, as returned by selectionIdentifiers. With
+        run_length each array is stored run-length encoded, which is smaller
+        for selections of mostly consecutive identifiers.
+        '''
+        self._run_length = run_length
+        self._data = {}
+        for name, name_identifiers in identifiers.items():
+            if len(name_identifiers):
+                if run_length:
+                    self._data[name] = encodeRuns(name_identifiers)
+                else:
+                    self._data[name] = numpy.array(name_identifiers, dtype=numpy.int64)
+
+    @classmethod
+    def capture(cls, group, run_length=False):
+        return cls(selectionIdentifiers(group), run_length)
+
+    def isRunLength(self):
+        return self._run_length
+
+    def getNames(self):
+        return sorted(self._data)
+
+    def getIdentifiers(self, name):
+        data = self._data.get(name)
+        if data is None:
+            return numpy.zeros(0, dtype=numpy.int64)
+        if self._run_length:
+            return decodeRuns(*data)
+        return data
+
+    def getIdentifiersDict(self):
+        return dict((name, self.getIdentifiers(name)) for name in self._data)
+
+    def getSize(self):
+        '''
+        Return the total number of nodes and elements in the snapshot.
+        '''
+        return sum(len(self.getIdentifiers(name)) for name in self._data)
+
+    def getMemorySize(self):
+        '''
+        Return the number of bytes used by the identifier arrays.
+        '''
+        size = 0
+        for data in self._data.values():
+            if self._run_length:
+                size += data[0].nbytes + data[1].nbytes
+            else:
+                size += data.nbytes
+        return size
+
+    def restore(self, group):
+        '''
+        Make the hierarchical group hold exactly the nodes and elements in the
+        snapshot, adding and removing only the differences from its current
+        contents. Regions and objects which no longer exist are ignored. The
+        caller should wrap this in a hierarchical change. Returns True if the
+        group changed.
+        '''
+        top_region = group.getFieldmodule().getRegion()
+        current = selectionIdentifiers(group)
+        changed = False
+        for name in set(current) | set(self._data):
+            target = self.getIdentifiers(name)
+            existing = current.get(name, numpy.zeros(0, dtype=numpy.int64))
+            added = numpy.setdiff1d(target, existing, assume_unique=True)
+            removed = numpy.setdiff1d(existing, target, assume_unique=True)
+            if not (len(added) or len(removed)):
+                continue
+            changed = True
+            path, object_name = splitSelectionKey(name)
+            region = top_region.findSubregion(path) if path else top_region
+            if not region.isValid():
+                continue
+            region_group = getRegionGroup(group, region, create=True)
+            fieldmodule = region.getFieldmodule()
+            nodeset = fieldmodule.findNodesetByName(object_name)
+            if nodeset.isValid():
+                nodegroup = region_group.getFieldNodeGroup(nodeset)
+                if not nodegroup.isValid():
+                    nodegroup = region_group.createFieldNodeGroup(nodeset)
+                nodesetgroup = nodegroup.getNodesetGroup()
+                removeNodesByIdentifier(nodesetgroup, nodeset, removed)
+                addNodesByIdentifier(nodesetgroup, nodeset, added)
+            else:
+                mesh = fieldmodule.findMeshByName(object_name)
+                elementgroup = region_group.getFieldElementGroup(mesh)
+                if not elementgroup.isValid():
+                    elementgroup = region_group.createFieldElementGroup(mesh)
+                meshgroup = elementgroup.getMeshGroup()
+                removeElementsByIdentifier(meshgroup, mesh, removed)
+                addElementsByIdentifier(meshgroup, mesh, added)
+        return changed
+
+
+class SelectionHistory(object):
+
+    def __init__(self, memory_limit=DEFAULT_MEMORY_LIMIT, maximum_depth=DEFAULT_MAXIMUM_DEPTH):
+        '''
+        Undo and redo stacks of selection snapshots. The oldest undo
+        snapshots are discarded when the snapshots use more than memory_limit
+        bytes or there are more than maximum_depth of them.
+        '''
+        self._memory_limit = memory_limit
+        self._maximum_depth = maximum_depth
+        self._undo = []
+        self._redo = []
+        # running total of the memory sizes of the snapshots in both stacks
+        self._memory_size = 0
+
+    def setMemoryLimit(self, memory_limit):
+        self._memory_limit = memory_limit
+        self._evict()
+
+    def getMemoryLimit(self):
+        return self._memory_limit
+
+    def setMaximumDepth(self, maximum_depth):
+        self._maximum_depth = maximum_depth
+        self._evict()
+
+    def getMaximumDepth(self):
+        return self._maximum_depth
+
+    def getMemorySize(self):
+        return self._memory_size
+
+    def _evict(self):
+        while self._redo and self._memory_size > self._memory_limit:
+            self._memory_size -= self._redo.pop(0).getMemorySize()
+        while self._undo and (len(self._undo) > self._maximum_depth or self._memory_size > self._memory_limit):
+            self._memory_size -= self._undo.pop(0).getMemorySize()
+
+    def push(self, snapshot):
+        '''
+        Record the snapshot of the selection before a change. Clears redo.
+        '''
+        self._undo.append(snapshot)
+        self._memory_size += snapshot.getMemorySize() - sum(redo.getMemorySize() for redo in self._redo)
+        self._redo = []
+        self._evict()
+
+    def canUndo(self):
+        return len(self._undo) > 0
+
+    def canRedo(self):
+        return len(self._redo) > 0
+
+    def undo(self, current):
+        '''
+        Return the snapshot to restore to undo the last change, saving the
+        current snapshot for redo, or None if there is nothing to undo.
+        '''
+        if not self._undo:
+            return None
+        self._redo.append(current)
+        snapshot = self._undo.pop()
+        self._memory_size += current.getMemorySize() - snapshot.getMemorySize()
+        self._evict()
+        return snapshot
+
+    def redo(self, current):
+        '''
+        Return the snapshot to restore to redo the last undone change, saving
+        the current snapshot for undo, or None if there is nothing to redo.
+        '''
+        if not self._redo:
+            return None
+        self._undo.append(current)
+        snapshot = self._redo.pop()
+        self._memory_size += current.getMemorySize() - snapshot.getMemorySize()
+        self._evict()
+        return snapshot
+
+    def clear(self):
+        self._undo = []
+        self._redo = []
+        self._memory_size = 0
@@ -0,0 +1,486 @@
+"""
+Zinc Selection Operations
+
+Helpers for bulk changes to node and element groups: reading group
+identifiers into NumPy arrays, adding or removing objects by identifier,
+inverting groups with conditional fields and growing or shrinking
+selections through element to node adjacency.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import numpy
+
+from opencmiss.zinc.element import Element
+from opencmiss.zinc.field import FieldGroup
+
+# changes to at least this many objects in at most this many runs of consecutive
+# identifiers are made with one conditional operation on their identifiers
+CONDITIONAL_MINIMUM_COUNT = 256
+CONDITIONAL_MAXIMUM_RANGES = 64
+
+
+def regionTree(region):
+    '''
+    Generate region and all its descendants, parents before children.
+    '''
+    yield region
+    child = region.getFirstChild()
+    while child.isValid():
+        for descendant in regionTree(child):
+            yield descendant
+        child = child.getNextSibling()
+
+
+def getRegionGroup(group, region, create=False):
+    '''
+    Return the group for region in the hierarchical group: the group itself
+    for its own region, otherwise its subregion group for region, which is
+    created if create is True. The returned group is invalid if not found.
+    '''
+    if region == group.getFieldmodule().getRegion():
+        return group
+    subgroup = group.getSubregionFieldGroup(region)
+    if not subgroup.isValid():
+        if not create:
+            return FieldGroup()
+        subgroup = group.createSubregionFieldGroup(region)
+    return subgroup
+
+
+def findCoordinateField(fieldmodule):
+    '''
+    Return the first finite element coordinate field in fieldmodule; the
+    field is invalid if there is none.
+    '''
+    fielditer = fieldmodule.createFielditerator()
+    field = fielditer.next()
+    while field.isValid():
+        if field.isTypeCoordinate() and field.castFiniteElement().isValid():
+            return field
+        field = fielditer.next()
+    return field
+
+
+def selectionKey(path, name):
+    '''
+    Return the key for the nodeset or mesh name in the region at the path
+    relative to the selection group's region: the name alone for the group's
+    own region, otherwise path/name.
+    '''
+    if path:
+        return path + '/' + name
+    return name
+
+
+def splitSelectionKey(key):
+    '''
+    Return the relative region path and nodeset or mesh name from a key made
+    by selectionKey.
+    '''
+    if '/' in key:
+        return tuple(key.rsplit('/', 1))
+    return '', key
+
+
+def getRelativeRegionPath(top_region, region):
+    if region == top_region:
+        return ''
+    return region.getRelativePath(top_region).strip('/')
+
+
+def identifiersFromRanges(ranges):
+    '''
+    Return a sorted array of the unique identifiers in a list of inclusive
+    (first, last) identifier ranges.
+    '''
+    if not ranges:
+        return numpy.zeros(0, dtype=numpy.int64)
+    return numpy.unique(numpy.concatenate([numpy.arange(first, last + 1, dtype=numpy.int64) for first, last in ranges]))
+
+
+def identifierRanges(identifiers):
+    '''
+    Return a list of inclusive (first, last) identifier ranges of the runs
+    of consecutive identifiers in an array of identifiers.
+    '''
+    identifiers = numpy.unique(numpy.asarray(identifiers, dtype=numpy.int64))
+    if len(identifiers) == 0:
+        return []
+    breaks = numpy.nonzero(numpy.diff(identifiers) != 1)[0]
+    firsts = numpy.concatenate((identifiers[:1], identifiers[breaks + 1]))
+    lasts = numpy.concatenate((identifiers[breaks], identifiers[-1:]))
+    return list(zip(firsts.tolist(), lasts.tolist()))
+
+
+def nodesetIdentifiers(nodeset):
+    '''
+    Return a sorted array of the identifiers of the nodes in a nodeset or
+    nodeset group.
+    '''
+    identifiers = numpy.empty(nodeset.getSize(), dtype=numpy.int64)
+    iterator = nodeset.createNodeiterator()
+    node = iterator.next()
+    count = 0
+    while node.isValid():
+        identifiers[count] = node.getIdentifier()
+        count += 1
+        node = iterator.next()
+    return numpy.sort(identifiers[:count])
+
+
+def meshIdentifiers(mesh):
+    '''
+    Return a sorted array of the identifiers of the elements in a mesh or
+    mesh group.
+    '''
+    identifiers = numpy.empty(mesh.getSize(), dtype=numpy.int64)
+    iterator = mesh.createElementiterator()
+    element = iterator.next()
+    count = 0
+    while element.isValid():
+        identifiers[count] = element.getIdentifier()
+        count += 1
+        element = iterator.next()
+    return numpy.sort(identifiers[:count])
+
+
+def getRangesSize(ranges):
+    '''
+    Return the number of identifiers in a list of inclusive (first, last)
+    identifier ranges, counting overlaps more than once.
+    '''
+    return sum(max(0, last - first + 1) for first, last in ranges)
+
+
+def rangesContain(ranges, identifiers):
+    '''
+    Return a mask of the identifiers array which lie in any of the inclusive
+    (first, last) identifier ranges, without expanding the ranges.
+    '''
+    ranges = numpy.array(ranges, dtype=numpy.int64).reshape(-1, 2)
+    if len(ranges) == 0:
+        return numpy.zeros(len(identifiers), dtype=bool)
+    order = numpy.argsort(ranges[:, 0], kind='mergesort')
+    firsts = ranges[order, 0]
+    # an identifier after the first of a range is in some range if it is within the largest last so far
+    lasts = numpy.maximum.accumulate(ranges[order, 1])
+    index = numpy.searchsorted(firsts, identifiers, side='right') - 1
+    mask = index >= 0
+    mask[mask] = identifiers[mask] <= lasts[index[mask]]
+    return mask
+
+
+def _getRangesCondition(fieldmodule, identifiers, ranges):
+    '''
+    Return a field which is true for the objects with the given identifiers
+    or in the inclusive (first, last) identifier ranges, comparing the
+    cmiss_number field giving each object's identifier with the ranges.
+    Returns None if there are too few objects to be worth it or too many
+    ranges, in which case objects are changed individually.
+    '''
+    if identifiers is not None:
+        if len(identifiers) < CONDITIONAL_MINIMUM_COUNT:
+            return None
+        ranges = identifierRanges(identifiers)
+    elif getRangesSize(ranges) < CONDITIONAL_MINIMUM_COUNT:
+        return None
+    if len(ranges) > CONDITIONAL_MAXIMUM_RANGES:
+        return None
+    cmiss_number = fieldmodule.findFieldByName('cmiss_number')
+    if not cmiss_number.isValid():
+        return None
+    condition = None
+    for first, last in ranges:
+        # identifiers are integers so compare with half way values
+        in_range = fieldmodule.createFieldAnd(
+            fieldmodule.createFieldGreaterThan(cmiss_number, fieldmodule.createFieldConstant([first - 0.5])),
+            fieldmodule.createFieldLessThan(cmiss_number, fieldmodule.createFieldConstant([last + 0.5])))
+        condition = in_range if condition is None else fieldmodule.createFieldOr(condition, in_range)
+    return condition
+
+
+def _splitCandidates(candidates, read_identifiers, identifiers, ranges):
+    '''
+    Split the objects in candidates, a nodeset or mesh (group), into those
+    with the given identifiers or in ranges and the others, whose identifiers
+    are read with read_identifiers. The others are None if changing the
+    chosen objects one at a time is cheaper than a group operation followed
+    by undoing it for the others.
+    '''
+    count = len(identifiers) if identifiers is not None else getRangesSize(ranges)
+    if count*2 < candidates.getSize():
+        if identifiers is None:
+            identifiers = identifiersFromRanges(ranges)
+        return identifiers, None
+    candidate_identifiers = read_identifiers(candidates)
+    if identifiers is not None:
+        mask = numpy.isin(candidate_identifiers, identifiers)
+    else:
+        mask = rangesContain(ranges, candidate_identifiers)
+    chosen = candidate_identifiers[mask]
+    others = candidate_identifiers[~mask]
+    if len(chosen) <= len(others):
+        return chosen, None
+    return chosen, others
+
+
+def changeNodesetGroup(nodesetgroup, nodeset, add, identifiers=None, ranges=None):
+    '''
+    Add the nodes of nodeset with the given identifiers or in the inclusive
+    (first, last) identifier ranges to nodesetgroup, or remove them if add is
+    False. Many nodes in few identifier ranges are changed with one
+    conditional add or remove. Otherwise, when most of the nodes change, all
+    are added with one conditional add or removed with one remove all, and
+    only the others are changed back one at a time.
+    '''
+    candidates = nodeset if add else nodesetgroup
+    if candidates.getSize() == 0:
+        return
+    condition = _getRangesCondition(nodeset.getFieldmodule(), identifiers, ranges)
+    if condition is not None:
+        if add:
+            nodesetgroup.addNodesConditional(condition)
+        else:
+            nodesetgroup.removeNodesConditional(condition)
+        return
+    chosen, others = _splitCandidates(candidates, nodesetIdentifiers, identifiers, ranges)
+    if others is None:
+        for identifier in chosen:
+            node = nodeset.findNodeByIdentifier(int(identifier))
+            if node.isValid():
+                if add:
+                    nodesetgroup.addNode(node)
+                else:
+                    nodesetgroup.removeNode(node)
+    elif add:
+        unselected = []
+        for identifier in others:
+            node = nodeset.findNodeByIdentifier(int(identifier))
+            if not nodesetgroup.containsNode(node):
+                unselected.append(node)
+        nodesetgroup.addNodesConditional(nodeset.getFieldmodule().createFieldConstant([1.0]))
+        for node in unselected:
+            nodesetgroup.removeNode(node)
+    else:
+        nodesetgroup.removeAllNodes()
+        for identifier in others:
+            nodesetgroup.addNode(nodeset.findNodeByIdentifier(int(identifier)))
+
+
+def changeMeshGroup(meshgroup, mesh, add, identifiers=None, ranges=None):
+    '''
+    Add the elements of mesh with the given identifiers or in the inclusive
+    (first, last) identifier ranges to meshgroup, or remove them if add is
+    False, as for changeNodesetGroup.
+    '''
+    candidates = mesh if add else meshgroup
+    if candidates.getSize() == 0:
+        return
+    condition = _getRangesCondition(mesh.getFieldmodule(), identifiers, ranges)
+    if condition is not None:
+        if add:
+            meshgroup.addElementsConditional(condition)
+        else:
+            meshgroup.removeElementsConditional(condition)
+        return
+    chosen, others = _splitCandidates(candidates, meshIdentifiers, identifiers, ranges)
+    if others is None:
+        for identifier in chosen:
+            element = mesh.findElementByIdentifier(int(identifier))
+            if element.isValid():
+                if add:
+                    meshgroup.addElement(element)
+                else:
+                    meshgroup.removeElement(element)
+    elif add:
+        unselected = []
+        for identifier in others:
+            element = mesh.findElementByIdentifier(int(identifier))
+            if not meshgroup.containsElement(element):
+                unselected.append(element)
+        meshgroup.addElementsConditional(mesh.getFieldmodule().createFieldConstant([1.0]))
+        for element in unselected:
+            meshgroup.removeElement(element)
+    else:
+        meshgroup.removeAllElements()
+        for identifier in others:
+            meshgroup.addElement(mesh.findElementByIdentifier(int(identifier)))
+
+
+def addNodesByIdentifier(nodesetgroup, nodeset, identifiers):
+    changeNodesetGroup(nodesetgroup, nodeset, True, identifiers=identifiers)
+
+
+def removeNodesByIdentifier(nodesetgroup, nodeset, identifiers):
+    changeNodesetGroup(nodesetgroup, nodeset, False, identifiers=identifiers)
+
+
+def addElementsByIdentifier(meshgroup, mesh, identifiers):
+    changeMeshGroup(meshgroup, mesh, True, identifiers=identifiers)
+
+
+def removeElementsByIdentifier(meshgroup, mesh, identifiers):
+    changeMeshGroup(meshgroup, mesh, False, identifiers=identifiers)
+
+
+def invertNodesetGroup(nodegroup, nodeset):
+    '''
+    Replace the nodes in the node group field with all other nodes in
+    nodeset, using conditional fields rather than iterating nodes in Python.
+    '''
+    fieldmodule = nodeset.getFieldmodule()
+    fieldmodule.beginChange()
+    inverse = fieldmodule.createFieldGroup()
+    inverse_nodegroup = inverse.createFieldNodeGroup(nodeset)
+    inverse_nodegroup.getNodesetGroup().addNodesConditional(fieldmodule.createFieldNot(nodegroup))
+    nodesetgroup = nodegroup.getNodesetGroup()
+    nodesetgroup.removeAllNodes()
+    nodesetgroup.addNodesConditional(inverse_nodegroup)
+    fieldmodule.endChange()
+
+
+def invertMeshGroup(elementgroup, mesh):
+    '''
+    Replace the elements in the element group field with all other elements
+    in mesh, using conditional fields.
+    '''
+    fieldmodule = mesh.getFieldmodule()
+    fieldmodule.beginChange()
+    inverse = fieldmodule.createFieldGroup()
+    inverse_elementgroup = inverse.createFieldElementGroup(mesh)
+    inverse_elementgroup.getMeshGroup().addElementsConditional(fieldmodule.createFieldNot(elementgroup))
+    meshgroup = elementgroup.getMeshGroup()
+    meshgroup.removeAllElements()
+    meshgroup.addElementsConditional(inverse_elementgroup)
+    fieldmodule.endChange()
+
+
+class ElementNodeAdjacency(object):
+
+    def __init__(self, mesh, field):
+        '''
+        Element to node adjacency of mesh from the element field templates
+        of field, stored as compressed rows of node identifiers. The arrays
+        are rebuilt lazily after elements in mesh are added, removed,
+        redefined or remapped to different nodes.
+        '''
+        self._mesh = mesh
+        self._field = field
+        self._element_identifiers = None
+        self._offsets = None
+        self._node_identifiers = None
+        fieldmodule = mesh.getFieldmodule()
+        self._fieldmodulenotifier = fieldmodule.createFieldmodulenotifier()
+        self._fieldmodulenotifier.setCallback(self._zincFieldmoduleEvent)
+
+    def getMesh(self):
+        return self._mesh
+
+    def getField(self):
+        return self._field
+
+    def _zincFieldmoduleEvent(self, event):
+        meshchanges = event.getMeshchanges(self._mesh)
+        # field changes include elements being remapped to different nodes
+        if meshchanges.getSummaryElementChangeFlags() & (Element.CHANGE_FLAG_ADD | Element.CHANGE_FLAG_REMOVE |
+                                                         Element.CHANGE_FLAG_DEFINITION | Element.CHANGE_FLAG_FIELD):
+            self._element_identifiers = None
+
+    def _build(self):
+        element_identifiers = []
+        counts = []
+        node_identifiers = []
+        iterator = self._mesh.createElementiterator()
+        element = iterator.next()
+        while element.isValid():
+            count = 0
+            eft = element.getElementfieldtemplate(self._field, -1)
+            if eft.isValid():
+                for local_node_index in range(1, eft.getNumberOfLocalNodes() + 1):
+                    node = element.getNode(eft, local_node_index)
+                    if node.isValid():
+                        node_identifiers.append(node.getIdentifier())
+                        count += 1
+            element_identifiers.append(element.getIdentifier())
+            counts.append(count)
+            element = iterator.next()
+        self._element_identifiers = numpy.array(element_identifiers, dtype=numpy.int64)
+        self._offsets = numpy.zeros(len(counts) + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=self._offsets[1:])
+        self._node_identifiers = numpy.array(node_identifiers, dtype=numpy.int64)
+
+    def getArrays(self):
+        '''
+        Return the element identifiers, the offsets of each element's nodes
+        in the node identifier array and the node identifier array.
+        '''
+        if self._element_identifiers is None:
+            self._build()
+        return self._element_identifiers, self._offsets, self._node_identifiers
+
+    def _reduceElements(self, node_mask, ufunc):
+        '''
+        Combine a per entry mask of the node identifier array per element.
+        Elements without nodes are False.
+        '''
+        element_identifiers, offsets, node_identifiers = self.getArrays()
+        counts = numpy.diff(offsets)
+        result = numpy.zeros(len(element_identifiers), dtype=bool)
+        has_nodes = counts > 0
+        if len(node_mask):
+            result[has_nodes] = ufunc.reduceat(node_mask, offsets[:-1][has_nodes])
+        return result
+
+    def getElementsWithAnyNode(self, node_identifiers):
+        element_identifiers, offsets, all_node_identifiers = self.getArrays()
+        mask = numpy.isin(all_node_identifiers, node_identifiers)
+        return element_identifiers[self._reduceElements(mask, numpy.logical_or)]
+
+    def getElementsWithAllNodes(self, node_identifiers):
+        element_identifiers, offsets, all_node_identifiers = self.getArrays()
+        mask = numpy.isin(all_node_identifiers, node_identifiers)
+        return element_identifiers[self._reduceElements(mask, numpy.logical_and)]
+
+    def getNodesOfElements(self, element_identifiers):
+        all_element_identifiers, offsets, node_identifiers = self.getArrays()
+        element_mask = numpy.isin(all_element_identifiers, element_identifiers)
+        node_mask = numpy.repeat(element_mask, numpy.diff(offsets))
+        return numpy.unique(node_identifiers[node_mask])
+
+    def growNodes(self, node_identifiers):
+        '''
+        Return the identifiers of nodes not in node_identifiers which share an
+        element with one of them.
+        '''
+        elements = self.getElementsWithAnyNode(node_identifiers)
+        return numpy.setdiff1d(self.getNodesOfElements(elements), node_identifiers)
+
+    def shrinkNodes(self, node_identifiers):
+        '''
+        Return the identifiers of nodes in node_identifiers which share an
+        element with a node not in node_identifiers.
+        '''
+        partial = numpy.setdiff1d(self.getElementsWithAnyNode(node_identifiers),
+                                  self.getElementsWithAllNodes(node_identifiers))
+        return numpy.intersect1d(self.getNodesOfElements(partial), node_identifiers)
+
+    def growElements(self, element_identifiers):
+        '''
+        Return the identifiers of elements not in element_identifiers which
+        share a node with one of them.
+        '''
+        nodes = self.getNodesOfElements(element_identifiers)
+        return numpy.setdiff1d(self.getElementsWithAnyNode(nodes), element_identifiers)
+
+    def shrinkElements(self, element_identifiers):
+        '''
+        Return the identifiers of elements in element_identifiers which share
+        a node with an element not in element_identifiers.
+        '''
+        all_element_identifiers = self.getArrays()[0]
+        others = numpy.setdiff1d(all_element_identifiers, element_identifiers)
+        boundary_nodes = self.getNodesOfElements(others)
+        return numpy.intersect1d(self.getElementsWithAnyNode(boundary_nodes), element_identifiers)
@@ -14,10 +14,12 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # See the examples at https://svn.physiomeproject.org/svn/cmiss/zinc/bindings/trunk/python/ for further
 # information.
 
+import numpy
+
 try:
-    from PySide import QtCore, QtOpenGL
+    from PySide import QtCore, QtGui, QtOpenGL
 except ImportError:
-    from PyQt4 import QtCore, QtOpenGL
+    from PyQt4 import QtCore, QtGui, QtOpenGL
 
 from opencmiss.zinc.sceneviewer import Sceneviewer, Sceneviewerevent
 from opencmiss.zinc.graphics import Graphics
@@ -29,11 +31,24 @@ from opencmiss.zinc.scenecoordinatesystem import \
         SCENECOORDINATESYSTEM_LOCAL, \
         SCENECOORDINATESYSTEM_WINDOW_PIXEL_TOP_LEFT,\
         SCENECOORDINATESYSTEM_WORLD
-from opencmiss.zinc.field import Field
+from opencmiss.zinc.field import Field, FieldNodeGroup, FieldElementGroup
 from selectionsceneviewerwidget_ui import Ui_SelectionSceneviewerWidgetDlg
+from nodespatialindex import NodeSpatialIndex
+from pickcache import CachedScenepicker
+from hoverhighlighter import HoverHighlighter
+from polygonselection import SelectionShape, pointsInPolygon
+from selectionhistory import SelectionHistory, SelectionSnapshot
+from selectionoperations import ElementNodeAdjacency, nodesetIdentifiers, meshIdentifiers, \
+    addNodesByIdentifier, changeNodesetGroup, changeMeshGroup, \
+    invertNodesetGroup, invertMeshGroup, regionTree, getRegionGroup, findCoordinateField, \
+    identifiersFromRanges, selectionKey, getRelativeRegionPath
+from selectionstatistics import SelectionStatistics
+from selectionsummary import SelectionSummary, SelectionChanges, selectionIdentifiers
 
 
 SELECTION_RUBBERBAND_NAME = 'selection_rubberband'
+LASSO_POINT_SPACING = 3.0  # pixels
+POLYGON_CLOSE_DISTANCE = 6.0  # pixels
 
 class SelectionMode(object):
 
@@ -49,9 +64,11 @@ class SelectionSceneviewerWidget(SceneviewerWidget):
     try:
         # PySide
         selectionSettingsChanged = QtCore.Signal()
+        hoverChanged = QtCore.Signal(object)
     except AttributError:
         # PyQt
         selectionSettingsChanged = QtCore.pyqtSignal()
+        hoverChanged = QtCore.pyqtSignal(object)
     
     selectionSettingsChanged = QtCore.Signal()
     
@@ -59,6 +76,8 @@ class SelectionSceneviewerWidget(SceneviewerWidget):
         
         # Selection attributes
         SceneviewerWidget.__init__(self, parent, shared)
+        # take keyboard focus when clicked so Escape can cancel a polygon
+        self.setFocusPolicy(QtCore.Qt.StrongFocus)
         self._nodeSelectMode = False
         self._dataSelectMode = False
         self._1delemSelectMode = False
@@ -71,6 +90,31 @@ class SelectionSceneviewerWidget(SceneviewerWidget):
         self._additiveSelectionModifier = QtCore.Qt.ALT
         self._sceneSurfacesFilter = None
         self._handle_mouse_events = False
+        self._nodeSpatialIndex = None
+        # Hover picking runs from a timer at most once per frame interval
+        self._hoverHighlighter = None
+        self._hoverEnabled = False
+        self._hover_position = None
+        self._hover_timer = QtCore.QTimer(self)
+        self._hover_timer.setSingleShot(True)
+        self._hover_timer.timeout.connect(self._updateHover)
+        self._selectionShape = SelectionShape.RECTANGLE
+        self._selection_polygon = []
+        self._polygon_selection_mode = SelectionMode.NONE
+        self._polygonNodeIndexes = []
+        self._elementNodeAdjacency = None
+        # Rubber band corners in widget coordinates, drawn over the rendered scene
+        self._selection_rectangle = None
+        # Snapshots of the selection before each change, for undo and redo, when enabled
+        self._selectionHistoryEnabled = False
+        self._selectionHistory = SelectionHistory()
+        self._selectionSnapshotRunLength = False
+        self._restoring_selection = False
+        self._selectionStatistics = None
+        # Changes made by this widget's own operations since the last selection summary,
+        # or None if the selection must be read again, e.g. after changes by others
+        self._selectionChanges = None
+        self._selectionChangeDepth = 0
        # self.ui = Ui_InteractiveToolWidget()
        # self.ui.setupUi(self)
         
@@ -89,7 +133,6 @@ class SelectionSceneviewerWidget(SceneviewerWidget):
         if self._sceneviewer and self._sceneviewer.isValid():
             scene = self._sceneviewer.getScene()
             graphics_filter = self._sceneviewer.getScenefilter()
-            self._scenepicker = scene.createScenepicker()
             region = scene.getRegion()
 
             fieldmodule = region.getFieldmodule()
@@ -97,15 +140,28 @@ class SelectionSceneviewerWidget(SceneviewerWidget):
             self._selectionGroup = fieldmodule.createFieldGroup()
             scene.setSelectionField(self._selectionGroup)
 
-            self._scenepicker = scene.createScenepicker()
+            # repeated queries for the same pick reuse its results
+            self._scenepicker = CachedScenepicker(scene.createScenepicker(), self)
             self._scenepicker.setScenefilter(graphics_filter)
             sceneFilterModule = self.getContext().getScenefiltermodule()
             self._sceneSurfacesFilter = sceneFilterModule.createScenefilterOperatorAnd()
             surfacesFilter = sceneFilterModule.createScenefilterGraphicsType(Graphics.TYPE_SURFACES)
             self._sceneSurfacesFilter.appendOperand(graphics_filter)
             self._sceneSurfacesFilter.appendOperand(surfacesFilter)
-            self.createSelectionBox(scene)            
         
+    def setSelectionShape(self, shape):
+        '''
+        Set the shape dragged or clicked out to select with: SelectionShape.RECTANGLE,
+        LASSO (freehand drag) or POLYGON (click to place vertices, finished by
+        double clicking or clicking the first vertex). Lasso and polygon
+        selection select nodes only.
+        '''
+        self._selectionShape = shape
+        self._cancelPolygonSelection()
+
+    def getSelectionShape(self):
+        return self._selectionShape
+
     def setNodeSelection(self, enabled):
         self._nodeSelectMode = enabled
         self.selectionSettingsChanged.emit()
@@ -141,6 +197,11 @@ class SelectionSceneviewerWidget(SceneviewerWidget):
         self._elemSelectMode = True
         
     def createSelectionBox(self, scene):
+        '''
+        Create rubber band graphics in scene. Not used by the widget, which
+        draws its rubber band over the rendered scene; kept for applications
+        calling it directly.
+        '''
         if self._selection_box:
             previousScene = self._selection_box.getScene()
             previousScene.removeGraphics(self._selection_box)
@@ -160,6 +221,13 @@ class SelectionSceneviewerWidget(SceneviewerWidget):
     def getScenepicker(self):
         return self._scenepicker
 
+    def getPickCacheCounters(self):
+        '''
+        Return a tuple of the number of pick queries answered from the pick
+        cache and the number which needed a pick.
+        '''
+        return self._scenepicker.getCounters()
+
     def setPickingRectangle(self, coordinate_system, left, bottom, right, top):
         self._scenepicker.setSceneviewerRectangle(self._sceneviewer, coordinate_system, left, bottom, right, top);
 
@@ -194,15 +262,592 @@ class SelectionSceneviewerWidget(SceneviewerWidget):
         '''
         return self._getNearestGraphic(x, y, Field.DOMAIN_TYPE_POINT)
 
+    def setNodeSpatialIndexGraphics(self, graphics):
+        '''
+        Answer node picking queries from a screen space index of the nodes
+        drawn by the given node points graphics instead of a pick render.
+        The index ignores occlusion. Pass None to go back to pick renders.
+        '''
+        if graphics and graphics.isValid():
+            self._nodeSpatialIndex = NodeSpatialIndex(self, graphics)
+        else:
+            self._nodeSpatialIndex = None
+
+    def getNodeSpatialIndex(self):
+        return self._nodeSpatialIndex
+
+    def setHoverHighlighting(self, enabled):
+        '''
+        Enable highlighting of the node or element under the cursor with the
+        hover material, emitting hoverChanged with the hovered node, element
+        or None whenever it changes. Picking is limited to the maximum frame
+        rate and skipped while a mouse button is held or the camera animates.
+        '''
+        self._hoverEnabled = enabled
+        self.setMouseTracking(enabled)
+        if not enabled:
+            self._hover_timer.stop()
+            self._hover_position = None
+            if self._hoverHighlighter and self._hoverHighlighter.clear():
+                self.hoverChanged.emit(None)
+
+    def isHoverHighlighting(self):
+        return self._hoverEnabled
+
+    def setHoverMaterial(self, material):
+        self._getHoverHighlighter().setMaterial(material)
+
+    def getHoveredObject(self):
+        if self._hoverHighlighter:
+            return self._hoverHighlighter.getHoveredObject()
+        return None
+
+    def _getHoverHighlighter(self):
+        if self._hoverHighlighter is None:
+            self._hoverHighlighter = HoverHighlighter(self.getContext())
+        return self._hoverHighlighter
+
+    def _scheduleHover(self, event):
+        self._hover_position = (event.x(), event.y())
+        if not self._hover_timer.isActive():
+            interval = self._frameScheduler.getMinimumFrameInterval()
+            self._hover_timer.start(int(interval*1000.0))
+
+    def _updateHover(self):
+        if not self._hoverEnabled or self._hover_position is None or not self._sceneviewer:
+            return
+        if (QtGui.QApplication.mouseButtons() != QtCore.Qt.NoButton) or self._cameraAnimator.isAnimating():
+            return
+        x, y = self._hover_position
+        self._scenepicker.setSceneviewerRectangle(self._sceneviewer, SCENECOORDINATESYSTEM_LOCAL, x - 3, y - 3, x + 3, y + 3)
+        picked_object = None
+        graphics = self._scenepicker.getNearestGraphics()
+        if graphics.isValid():
+            domain_type = graphics.getFieldDomainType()
+            if self._nodeSelectMode and domain_type in [Field.DOMAIN_TYPE_NODES, Field.DOMAIN_TYPE_DATAPOINTS]:
+                picked_object = self._scenepicker.getNearestNode()
+            elif self._elemSelectMode and domain_type in [Field.DOMAIN_TYPE_MESH1D, Field.DOMAIN_TYPE_MESH2D, Field.DOMAIN_TYPE_MESH3D, Field.DOMAIN_TYPE_MESH_HIGHEST_DIMENSION]:
+                picked_object = self._scenepicker.getNearestElement()
+            if picked_object is not None and not picked_object.isValid():
+                picked_object = None
+        if self._getHoverHighlighter().setHoveredObject(picked_object, graphics):
+            self.hoverChanged.emit(picked_object)
+
     def getNearestNode(self, x, y):
+        if self._nodeSpatialIndex:
+            return self._nodeSpatialIndex.findNearestNode(x, y, 0.5)
         self._scenepicker.setSceneviewerRectangle(self._sceneviewer, SCENECOORDINATESYSTEM_LOCAL, x - 0.5, y - 0.5, x + 0.5, y + 0.5)
         node = self._scenepicker.getNearestNode()
 
         return node
 
+    def _addNodeIdentifiersToSelection(self, nodeset, identifiers):
+        '''
+        Add the nodes with the given identifiers in nodeset to the selection.
+        '''
+        group = self._getSelectionNodeGroup(nodeset).getNodesetGroup()
+        addNodesByIdentifier(group, nodeset, identifiers)
+        self._recordSelectionChange(nodeset, True, identifiers, group)
+
+    def _beginSelectionChange(self):
+        '''
+        Begin a hierarchical change to the selection by this widget whose
+        changes are recorded with _recordSelectionChange or _clearSelection.
+        '''
+        self._selectionChangeDepth += 1
+        self._sceneviewer.getScene().getRegion().beginHierarchicalChange()
+
+    def _endSelectionChange(self):
+        self._sceneviewer.getScene().getRegion().endHierarchicalChange()
+        self._selectionChangeDepth -= 1
+
+    def _recordSelectionChange(self, domain, selected, identifiers, group):
+        '''
+        Record that the objects of domain, a nodeset or mesh, with the given
+        identifiers were added to the selection, or removed if selected is
+        False, where group is the nodeset or mesh group of the selection
+        after the change. Changes not recorded this way during a selection
+        change must call _untrackSelectionChange.
+        '''
+        if self._selectionChanges is None:
+            return
+        top_region = self._sceneviewer.getScene().getRegion()
+        key = selectionKey(getRelativeRegionPath(top_region, domain.getFieldmodule().getRegion()), domain.getName())
+        if not self._selectionChanges.change(key, selected, identifiers, group.getSize()):
+            self._untrackSelectionChange()
+
+    def _untrackSelectionChange(self):
+        '''
+        Read the whole selection for the next summary.
+        '''
+        self._selectionChanges = None
+
+    def _clearSelection(self):
+        self._selectionGroup.clear()
+        if self._selectionChanges is not None:
+            self._selectionChanges.clear()
+
+    def _zincSelectionEvent(self, event):
+        if self._selectionChangeDepth == 0:
+            # the selection was changed by others so must be read again
+            self._untrackSelectionChange()
+        SceneviewerWidget._zincSelectionEvent(self, event)
+
+    def _summariseSelection(self, previous):
+        '''
+        Summarise the selection change from the changes recorded since the
+        last summary, reading the whole selection only if they are unknown.
+        '''
+        if (previous is None) or (self._selectionChanges is None):
+            identifiers, summary = SceneviewerWidget._summariseSelection(self, previous)
+        else:
+            identifiers, summary = self._selectionChanges.getSummary()
+        self._selectionChanges = SelectionChanges(identifiers)
+        return identifiers, summary
+
+    def _readSelectionIdentifiers(self):
+        '''
+        Read the whole selection if it is not being summarised.
+        '''
+        if self._selection_identifiers is None:
+            self._selection_identifiers = selectionIdentifiers(self._selectionGroup)
+            self._selectionChanges = SelectionChanges(self._selection_identifiers)
+
+    def _getSelectionNodeGroup(self, nodeset, create=True):
+        '''
+        Get the node group for nodeset in the selection group, or in its
+        subregion group if nodeset is in a child region. With create False
+        the node group is invalid if nothing in nodeset has been selected.
+        '''
+        region_group = getRegionGroup(self._selectionGroup, nodeset.getFieldmodule().getRegion(), create)
+        if not region_group.isValid():
+            return FieldNodeGroup()
+        nodegroup = region_group.getFieldNodeGroup(nodeset)
+        if create and not nodegroup.isValid():
+            nodegroup = region_group.createFieldNodeGroup(nodeset)
+        return nodegroup
+
+    def _getSelectionElementGroup(self, mesh, create=True):
+        '''
+        Get the element group for mesh in the selection group or its subregion
+        group for the mesh's region, as for _getSelectionNodeGroup.
+        '''
+        region_group = getRegionGroup(self._selectionGroup, mesh.getFieldmodule().getRegion(), create)
+        if not region_group.isValid():
+            return FieldElementGroup()
+        elementgroup = region_group.getFieldElementGroup(mesh)
+        if create and not elementgroup.isValid():
+            elementgroup = region_group.createFieldElementGroup(mesh)
+        return elementgroup
+
+    def _getSelectionNodeset(self, nodeset):
+        if nodeset is None:
+            fieldmodule = self._sceneviewer.getScene().getRegion().getFieldmodule()
+            nodeset = fieldmodule.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
+        return nodeset
+
+    def _getSelectionMesh(self, mesh):
+        if mesh is None:
+            fieldmodule = self._sceneviewer.getScene().getRegion().getFieldmodule()
+            for dimension in range(3, 0, -1):
+                mesh = fieldmodule.findMeshByDimension(dimension)
+                if mesh.getSize() > 0:
+                    break
+        return mesh
+
+    def getElementNodeAdjacency(self, mesh=None, field=None):
+        '''
+        Get the element to node adjacency used to grow and shrink selections,
+        built from the element field templates of field, by default the first
+        finite element coordinate field. The adjacency is kept until a
+        different mesh or field is asked for.
+        '''
+        mesh = self._getSelectionMesh(mesh)
+        if field is None:
+            field = findCoordinateField(mesh.getFieldmodule())
+        adjacency = self._elementNodeAdjacency
+        if adjacency is None or not (adjacency.getMesh() == mesh and adjacency.getField() == field):
+            adjacency = ElementNodeAdjacency(mesh, field)
+            self._elementNodeAdjacency = adjacency
+        return adjacency
+
+    def _changeNodeSelection(self, nodeset, selected, identifiers=None, ranges=None):
+        nodeset = self._getSelectionNodeset(nodeset)
+        self._beginSelectionChange()
+        group = self._getSelectionNodeGroup(nodeset).getNodesetGroup()
+        changeNodesetGroup(group, nodeset, selected, identifiers=identifiers, ranges=ranges)
+        self._recordSelectionChange(nodeset, selected,
+                                    identifiersFromRanges(ranges) if identifiers is None else identifiers, group)
+        self._endSelectionChange()
+
+    def _changeElementSelection(self, mesh, selected, identifiers=None, ranges=None):
+        mesh = self._getSelectionMesh(mesh)
+        self._beginSelectionChange()
+        group = self._getSelectionElementGroup(mesh).getMeshGroup()
+        changeMeshGroup(group, mesh, selected, identifiers=identifiers, ranges=ranges)
+        self._recordSelectionChange(mesh, selected,
+                                    identifiersFromRanges(ranges) if identifiers is None else identifiers, group)
+        self._endSelectionChange()
+
+    def selectNodesByIdentifier(self, identifiers, nodeset=None, selected=True):
+        '''
+        Add the nodes with the given identifiers to the selection, or remove
+        them if selected is False. The nodeset defaults to the nodes of the
+        scene's region. Identifiers without a node are ignored.
+        '''
+        self._changeNodeSelection(nodeset, selected, identifiers=identifiers)
+
+    def selectNodesByIdentifierRanges(self, ranges, nodeset=None, selected=True):
+        '''
+        As selectNodesByIdentifier for a list of inclusive (first, last)
+        identifier ranges.
+        '''
+        self._changeNodeSelection(nodeset, selected, ranges=ranges)
+
+    def selectElementsByIdentifier(self, identifiers, mesh=None, selected=True):
+        '''
+        Add the elements with the given identifiers to the selection, or remove
+        them if selected is False. The mesh defaults to the highest dimension
+        mesh of the scene's region containing elements.
+        '''
+        self._changeElementSelection(mesh, selected, identifiers=identifiers)
+
+    def selectElementsByIdentifierRanges(self, ranges, mesh=None, selected=True):
+        '''
+        As selectElementsByIdentifier for a list of inclusive (first, last)
+        identifier ranges.
+        '''
+        self._changeElementSelection(mesh, selected, ranges=ranges)
+
+    def invertNodeSelection(self, nodeset=None):
+        nodeset = self._getSelectionNodeset(nodeset)
+        top_region = self._sceneviewer.getScene().getRegion()
+        top_region.beginHierarchicalChange()
+        invertNodesetGroup(self._getSelectionNodeGroup(nodeset), nodeset)
+        top_region.endHierarchicalChange()
+
+    def invertElementSelection(self, mesh=None):
+        mesh = self._getSelectionMesh(mesh)
+        top_region = self._sceneviewer.getScene().getRegion()
+        top_region.beginHierarchicalChange()
+        invertMeshGroup(self._getSelectionElementGroup(mesh), mesh)
+        top_region.endHierarchicalChange()
+
+    def clearSelectionDomain(self, domain_type):
+        '''
+        Remove only the nodes, data points or elements of the given field
+        domain type from the selection, in all regions.
+        '''
+        top_region = self._sceneviewer.getScene().getRegion()
+        top_region.beginHierarchicalChange()
+        for region in regionTree(top_region):
+            fieldmodule = region.getFieldmodule()
+            if domain_type in [Field.DOMAIN_TYPE_NODES, Field.DOMAIN_TYPE_DATAPOINTS]:
+                nodegroup = self._getSelectionNodeGroup(fieldmodule.findNodesetByFieldDomainType(domain_type), False)
+                if nodegroup.isValid():
+                    nodegroup.getNodesetGroup().removeAllNodes()
+            else:
+                if domain_type == Field.DOMAIN_TYPE_MESH_HIGHEST_DIMENSION:
+                    meshes = [fieldmodule.findMeshByDimension(dimension) for dimension in range(1, 4)]
+                else:
+                    meshes = [fieldmodule.findMeshByDimension({Field.DOMAIN_TYPE_MESH1D: 1, Field.DOMAIN_TYPE_MESH2D: 2,
+                                                               Field.DOMAIN_TYPE_MESH3D: 3}[domain_type])]
+                for mesh in meshes:
+                    elementgroup = self._getSelectionElementGroup(mesh, False)
+                    if elementgroup.isValid():
+                        elementgroup.getMeshGroup().removeAllElements()
+        top_region.endHierarchicalChange()
+
+    def growNodeSelection(self, mesh=None, field=None):
+        '''
+        Add all nodes sharing an element of mesh with a selected node. See
+        getElementNodeAdjacency for mesh and field.
+        '''
+        adjacency = self.getElementNodeAdjacency(mesh, field)
+        nodeset = self._getSelectionNodeset(None)
+        selected = nodesetIdentifiers(self._getSelectionNodeGroup(nodeset).getNodesetGroup())
+        self._changeNodeSelection(nodeset, True, identifiers=adjacency.growNodes(selected))
+
+    def shrinkNodeSelection(self, mesh=None, field=None):
+        '''
+        Remove selected nodes sharing an element of mesh with an unselected node.
+        '''
+        adjacency = self.getElementNodeAdjacency(mesh, field)
+        nodeset = self._getSelectionNodeset(None)
+        selected = nodesetIdentifiers(self._getSelectionNodeGroup(nodeset).getNodesetGroup())
+        self._changeNodeSelection(nodeset, False, identifiers=adjacency.shrinkNodes(selected))
+
+    def growElementSelection(self, mesh=None, field=None):
+        '''
+        Add all elements of mesh sharing a node with a selected element.
+        '''
+        adjacency = self.getElementNodeAdjacency(mesh, field)
+        mesh = adjacency.getMesh()
+        selected = meshIdentifiers(self._getSelectionElementGroup(mesh).getMeshGroup())
+        self._changeElementSelection(mesh, True, identifiers=adjacency.growElements(selected))
+
+    def shrinkElementSelection(self, mesh=None, field=None):
+        '''
+        Remove selected elements of mesh sharing a node with an unselected element.
+        '''
+        adjacency = self.getElementNodeAdjacency(mesh, field)
+        mesh = adjacency.getMesh()
+        selected = meshIdentifiers(self._getSelectionElementGroup(mesh).getMeshGroup())
+        self._changeElementSelection(mesh, False, identifiers=adjacency.shrinkElements(selected))
+
+    def _isSelectionSummaryRequired(self):
+        return self._selectionHistoryEnabled or (self._selectionStatistics is not None) or \
+            SceneviewerWidget._isSelectionSummaryRequired(self)
+
+    def _emitSelectionChanged(self):
+        '''
+        Record the selection before each change in the selection history,
+        except changes made by undo and redo.
+        '''
+        previous = self._selection_identifiers
+        summary = SceneviewerWidget._emitSelectionChanged(self)
+        if summary is None:
+            self._untrackSelectionChange()
+            return None
+        if self._selectionStatistics is not None:
+            self._selectionStatistics.update(summary)
+        if self._selectionHistoryEnabled and summary.isChanged() and not self._restoring_selection and \
+                (previous is not None):
+            self._selectionHistory.push(SelectionSnapshot(previous, self._selectionSnapshotRunLength))
+        self._restoring_selection = False
+        return summary
+
+    def _flushSelectionChanged(self):
+        if self._selection_timer.isActive():
+            self._selection_timer.stop()
+            self._emitSelectionChanged()
+
+    def getSelectionStatistics(self):
+        '''
+        Get the SelectionStatistics of the selected nodes' coordinates. They
+        are created on first use and then updated from each selection change,
+        evaluating only added nodes.
+        '''
+        self._flushSelectionChanged()
+        if self._selectionStatistics is None:
+            self._selectionStatistics = SelectionStatistics(self._sceneviewer.getScene().getRegion())
+            self._readSelectionIdentifiers()
+            self._selectionStatistics.update(SelectionSummary({}, self._selection_identifiers))
+        return self._selectionStatistics
+
+    def frameSelection(self, duration=0.0, margin=1.1):
+        '''
+        Fit the view to the bounding box of the selected nodes, keeping the
+        view direction, up vector and view angle. The bounding sphere is
+        enlarged by margin. With a duration in seconds the camera is
+        animated. Returns False if no nodes are selected.
+        '''
+        bounding_box = self.getSelectionStatistics().getBoundingBox()
+        if bounding_box is None:
+            return False
+        minimum = numpy.array(bounding_box[0])
+        maximum = numpy.array(bounding_box[1])
+        centre = 0.5*(minimum + maximum)
+        radius = max(0.5*numpy.linalg.norm(maximum - minimum), 1.0E-6)*margin
+        eye, lookat, up, angle = self.getViewParameters()
+        direction = numpy.array(eye) - numpy.array(lookat)
+        length = numpy.linalg.norm(direction)
+        direction = direction/length if length > 0.0 else numpy.array([0.0, 0.0, 1.0])
+        # view angle is in radians
+        distance = radius/numpy.sin(0.5*angle)
+        eye = (centre + direction*distance).tolist()
+        if self._sceneviewer.getFarClippingPlane() < distance + radius:
+            self._sceneviewer.setFarClippingPlane(distance + radius)
+        if duration > 0.0:
+            self.animateViewParameters(eye, centre.tolist(), up, angle, duration)
+        else:
+            self.setViewParameters(eye, centre.tolist(), up, angle)
+        return True
+
+    def setSelectionHistoryEnabled(self, enabled):
+        '''
+        When enabled, the selection before each change is recorded for
+        undoSelection and redoSelection, at the cost of summarising every
+        selection change. Disabling clears the history.
+        '''
+        if enabled and not self._selectionHistoryEnabled:
+            self._flushSelectionChanged()
+            self._readSelectionIdentifiers()
+        elif not enabled:
+            self._selectionHistory.clear()
+        self._selectionHistoryEnabled = enabled
+
+    def isSelectionHistoryEnabled(self):
+        return self._selectionHistoryEnabled
+
+    def setSelectionSnapshotRunLength(self, run_length):
+        '''
+        Set whether selection snapshots are stored run-length encoded, which
+        is smaller for selections of mostly consecutive identifiers.
+        '''
+        self._selectionSnapshotRunLength = run_length
+
+    def getSelectionHistory(self):
+        return self._selectionHistory
+
+    def captureSelection(self):
+        '''
+        Return a SelectionSnapshot of the nodes and elements in the selection.
+        '''
+        return SelectionSnapshot.capture(self._selectionGroup, self._selectionSnapshotRunLength)
+
+    def restoreSelection(self, snapshot):
+        '''
+        Make the selection match the snapshot in one hierarchical change.
+        '''
+        top_region = self._sceneviewer.getScene().getRegion()
+        top_region.beginHierarchicalChange()
+        changed = snapshot.restore(self._selectionGroup)
+        top_region.endHierarchicalChange()
+        return changed
+
+    def undoSelection(self):
+        '''
+        Go back to the selection before the last change. Returns False if
+        there is nothing to undo.
+        '''
+        self._flushSelectionChanged()
+        snapshot = self._selectionHistory.undo(self.captureSelection())
+        if snapshot is None:
+            return False
+        self._restoring_selection = self.restoreSelection(snapshot)
+        return True
+
+    def redoSelection(self):
+        '''
+        Reapply the last undone selection change. Returns False if there is
+        nothing to redo.
+        '''
+        self._flushSelectionChanged()
+        snapshot = self._selectionHistory.redo(self.captureSelection())
+        if snapshot is None:
+            return False
+        self._restoring_selection = self.restoreSelection(snapshot)
+        return True
+
+    def _getNodeSpatialIndexes(self):
+        '''
+        Get screen space indexes of the nodes drawn by the visible node points
+        graphics in the scene and its child scenes, or only the node spatial
+        index if one is set.
+        '''
+        if self._nodeSpatialIndex:
+            return [self._nodeSpatialIndex]
+        domain_types = []
+        if self._nodeSelectMode:
+            domain_types.append(Field.DOMAIN_TYPE_NODES)
+        if self._dataSelectMode:
+            domain_types.append(Field.DOMAIN_TYPE_DATAPOINTS)
+        indexes = []
+        for region in regionTree(self._sceneviewer.getScene().getRegion()):
+            scene = region.getScene()
+            if not scene.getVisibilityFlag():
+                continue
+            graphics = scene.getFirstGraphics()
+            while graphics.isValid():
+                if graphics.getType() == Graphics.TYPE_POINTS and graphics.getFieldDomainType() in domain_types and \
+                        graphics.getVisibilityFlag() and graphics.getCoordinateField().isValid() and \
+                        graphics.getSelectMode() != Graphics.SELECT_MODE_OFF:
+                    for index in self._polygonNodeIndexes:
+                        if index.getGraphics() == graphics:
+                            break
+                    else:
+                        index = NodeSpatialIndex(self, graphics)
+                        self._polygonNodeIndexes.append(index)
+                    indexes.append(index)
+                graphics = scene.getNextGraphics(graphics)
+        # only keep indexes for graphics still drawn, releasing removed regions and their notifiers
+        self._polygonNodeIndexes = indexes
+        return indexes
+
+    def selectNodesInPolygon(self, polygon, selection_mode=SelectionMode.ADDITIVE):
+        '''
+        Select the nodes whose window positions are inside the polygon given
+        as a list of (x, y) widget coordinates. All node positions are
+        projected and tested in one batch and the selection is updated in a
+        single hierarchical change. An EXCLUSIVE selection mode clears the
+        existing selection first.
+        '''
+        self._beginSelectionChange()
+        if selection_mode == SelectionMode.EXCLUSIVE:
+            self._clearSelection()
+        if len(polygon) >= 3:
+            for index in self._getNodeSpatialIndexes():
+                identifiers, positions = index.getScreenPositions()
+                inside = pointsInPolygon(positions, polygon)
+                self._addNodeIdentifiersToSelection(index.getNodeset(), identifiers[inside])
+        self._endSelectionChange()
+
+    def _finishPolygonSelection(self, selection_mode):
+        polygon = self._selection_polygon
+        self._selection_polygon = []
+        if self._nodeSelectMode or self._dataSelectMode:
+            self.selectNodesInPolygon(polygon, selection_mode)
+        self.requestFrame()
+
+    def _cancelPolygonSelection(self):
+        if self._selection_polygon:
+            self._selection_polygon = []
+            self.requestFrame()
+
+    def _setSelectionRectangle(self, rectangle):
+        '''
+        Set the rubber band corners (x1, y1, x2, y2) or None to hide it, and
+        request a frame if it changed. The Zinc scene is not modified.
+        '''
+        if rectangle != self._selection_rectangle:
+            self._selection_rectangle = rectangle
+            self.requestFrame()
+
+    def paintGL(self):
+        '''
+        Render the scene then draw the rubber band or the outline of any
+        lasso or polygon selection in progress over it.
+        '''
+        SceneviewerWidget.paintGL(self)
+        if self._selection_rectangle or self._selection_polygon:
+            painter = QtGui.QPainter(self)
+            painter.setPen(QtGui.QPen(QtCore.Qt.white, 1, QtCore.Qt.DashLine))
+            if self._selection_rectangle:
+                x1, y1, x2, y2 = self._selection_rectangle
+                painter.drawRect(QtCore.QRectF(QtCore.QPointF(x1, y1), QtCore.QPointF(x2, y2)).normalized())
+            if self._selection_polygon:
+                points = [QtCore.QPointF(x, y) for x, y in self._selection_polygon]
+                if self._selectionShape == SelectionShape.LASSO:
+                    painter.drawPolygon(QtGui.QPolygonF(points))
+                else:
+                    painter.drawPolyline(QtGui.QPolygonF(points))
+            painter.end()
+
+    def mouseDoubleClickEvent(self, event):
+        '''
+        Finish a polygon selection in progress.
+        '''
+        if self._selectionShape == SelectionShape.POLYGON and self._selection_polygon:
+            event.accept()
+            self._finishPolygonSelection(self._polygon_selection_mode)
+        else:
+            SceneviewerWidget.mouseDoubleClickEvent(self, event)
+
+    def keyPressEvent(self, event):
+        '''
+        Escape cancels a polygon selection in progress.
+        '''
+        if event.key() == QtCore.Qt.Key_Escape and self._selection_polygon:
+            event.accept()
+            self._cancelPolygonSelection()
+        else:
+            SceneviewerWidget.keyPressEvent(self, event)
+
     def setScenefilter(self, scenefilter):
         self._scenepicker.setScenefilter(scenefilter)
         SceneviewerWidget.setScenefilter(self, scenefilter)
+        self._polygonNodeIndexes = []
 
     def addPickedNodesToFieldGroup(self, selection_group):
         self._scenepicker.addPickedNodesToFieldGroup(selection_group)
@@ -224,13 +869,20 @@ class SelectionSceneviewerWidget(SceneviewerWidget):
         '''
         Return node and its coordinates field if its valid
         '''
+        if self._nodeSpatialIndex:
+            node = self._nodeSpatialIndex.findNearestNode(x, y, 3)
+            if node.isValid():
+                nodegroup = self._getSelectionNodeGroup(node.getNodeset(), False)
+                if nodegroup.isValid() and nodegroup.getNodesetGroup().containsNode(node):
+                    graphics = self._nodeSpatialIndex.getGraphics()
+                    return True, node, graphics.getCoordinateField(), graphics
+            return False, None, None, None
         self._scenepicker.setSceneviewerRectangle(self._sceneviewer, SCENECOORDINATESYSTEM_LOCAL, \
                                                   x - 3, y - 3, \
                                                   x + 3, y + 3);
         node = self._scenepicker.getNearestNode()
         if node.isValid():
-            nodeset = node.getNodeset()
-            nodegroup = self._selectionGroup.getFieldNodeGroup(nodeset)
+            nodegroup = self._getSelectionNodeGroup(node.getNodeset(), False)
             if nodegroup.isValid():
                 group = nodegroup.getNodesetGroup()
                 if group.containsNode(node):
@@ -266,6 +918,20 @@ class SelectionSceneviewerWidget(SceneviewerWidget):
             self._selection_mode = SelectionMode.EXCLUSIVE
             if event.modifiers() & self._additiveSelectionModifier:
                 self._selection_mode = SelectionMode.ADDITIVE
+            if self._selectionShape == SelectionShape.LASSO:
+                self._selection_polygon = [self._selection_position_start]
+            elif self._selectionShape == SelectionShape.POLYGON:
+                if not self._selection_polygon:
+                    self._polygon_selection_mode = self._selection_mode
+                elif len(self._selection_polygon) >= 3:
+                    dx = event.x() - self._selection_polygon[0][0]
+                    dy = event.y() - self._selection_polygon[0][1]
+                    if dx*dx + dy*dy <= POLYGON_CLOSE_DISTANCE*POLYGON_CLOSE_DISTANCE:
+                        self._selection_mode = SelectionMode.NONE
+                        self._finishPolygonSelection(self._polygon_selection_mode)
+                        return
+                self._selection_polygon.append(self._selection_position_start)
+                self.requestFrame()
         elif not self._ignore_mouse_events and not event.modifiers() or (event.modifiers() & self._selectionModifier and button_map[event.button()] == Sceneviewerinput.BUTTON_TYPE_RIGHT):
             SceneviewerWidget.mousePressEvent(self, event)
 
@@ -274,13 +940,18 @@ class SelectionSceneviewerWidget(SceneviewerWidget):
         Inform the scene viewer of a mouse release event.
         '''
         event.accept()
-        if not self._ignore_mouse_events and self._selection_mode != SelectionMode.NONE:
+        if not self._ignore_mouse_events and self._selection_mode != SelectionMode.NONE and \
+                self._selectionShape != SelectionShape.RECTANGLE:
+            if self._selectionShape == SelectionShape.LASSO:
+                self._selection_polygon.append((event.x(), event.y()))
+                self._finishPolygonSelection(self._selection_mode)
+            # polygon vertices are added on press; the polygon stays open for more
+        elif not self._ignore_mouse_events and self._selection_mode != SelectionMode.NONE:
             x = event.x()
             y = event.y()
             # Construct a small frustum to look for nodes in.
-            top_region = self._sceneviewer.getScene().getRegion()
-            top_region.beginHierarchicalChange()
-            self._selection_box.setVisibilityFlag(False)
+            self._beginSelectionChange()
+            self._setSelectionRectangle(None)
             if (x != self._selection_position_start[0] and y != self._selection_position_start[1]):
                 left = min(x, self._selection_position_start[0])
                 right = max(x, self._selection_position_start[0])
@@ -288,51 +959,57 @@ class SelectionSceneviewerWidget(SceneviewerWidget):
                 top = max(y, self._selection_position_start[1])
                 self._scenepicker.setSceneviewerRectangle(self._sceneviewer, SCENECOORDINATESYSTEM_LOCAL, left, bottom, right, top);
                 if self._selection_mode == SelectionMode.EXCLUSIVE:
-                    self._selectionGroup.clear()
-                if self._nodeSelectMode or self._dataSelectMode:
+                    self._clearSelection()
+                if self._nodeSpatialIndex and self._nodeSelectMode:
+                    identifiers = self._nodeSpatialIndex.findNodeIdentifiersInRectangle(left, bottom, right, top)
+                    self._addNodeIdentifiersToSelection(self._nodeSpatialIndex.getNodeset(), identifiers)
+                elif self._nodeSelectMode or self._dataSelectMode:
                     self._scenepicker.addPickedNodesToFieldGroup(self._selectionGroup)
+                    self._untrackSelectionChange()
                 if self._elemSelectMode:
                     self._scenepicker.addPickedElementsToFieldGroup(self._selectionGroup)
+                    self._untrackSelectionChange()
             else:
                 self._scenepicker.setSceneviewerRectangle(self._sceneviewer, SCENECOORDINATESYSTEM_LOCAL, x - 3.5, y - 3.5, x + 3.5, y + 3.5)
                 if self._nodeSelectMode and self._elemSelectMode and self._selection_mode == SelectionMode.EXCLUSIVE and not self._scenepicker.getNearestGraphics().isValid():
-                    self._selectionGroup.clear()
+                    self._clearSelection()
 
                 if self._nodeSelectMode and (self._scenepicker.getNearestGraphics().getFieldDomainType() == Field.DOMAIN_TYPE_NODES):
                     node = self._scenepicker.getNearestNode()
-                    nodeset = node.getNodeset()
-                    nodegroup = self._selectionGroup.getFieldNodeGroup(nodeset)
-                    if not nodegroup.isValid():
-                        nodegroup = self._selectionGroup.createFieldNodeGroup(nodeset)
-                    group = nodegroup.getNodesetGroup()
-                    if self._selection_mode == SelectionMode.EXCLUSIVE:
-                        remove_current = group.getSize() == 1 and group.containsNode(node)
-                        self._selectionGroup.clear()
-                        if not remove_current:
-                            group.addNode(node)
-                    elif self._selection_mode == SelectionMode.ADDITIVE:
-                        if group.containsNode(node):
-                            group.removeNode(node)
-                        else:
-                            group.addNode(node)
+                    if node.isValid():
+                        # picked nodes may be in a child region's subgroup of the selection
+                        group = self._getSelectionNodeGroup(node.getNodeset()).getNodesetGroup()
+                        if self._selection_mode == SelectionMode.EXCLUSIVE:
+                            remove_current = group.getSize() == 1 and group.containsNode(node)
+                            self._clearSelection()
+                            if not remove_current:
+                                group.addNode(node)
+                                self._recordSelectionChange(node.getNodeset(), True, [node.getIdentifier()], group)
+                        elif self._selection_mode == SelectionMode.ADDITIVE:
+                            if group.containsNode(node):
+                                group.removeNode(node)
+                                self._recordSelectionChange(node.getNodeset(), False, [node.getIdentifier()], group)
+                            else:
+                                group.addNode(node)
+                                self._recordSelectionChange(node.getNodeset(), True, [node.getIdentifier()], group)
                 if self._elemSelectMode and (self._scenepicker.getNearestGraphics().getFieldDomainType() in [Field.DOMAIN_TYPE_MESH1D, Field.DOMAIN_TYPE_MESH2D, Field.DOMAIN_TYPE_MESH3D, Field.DOMAIN_TYPE_MESH_HIGHEST_DIMENSION]):
                     elem = self._scenepicker.getNearestElement()
-                    mesh = elem.getMesh()
-                    elementgroup = self._selectionGroup.getFieldElementGroup(mesh)
-                    if not elementgroup.isValid():
-                        elementgroup = self._selectionGroup.createFieldElementGroup(mesh)
-                    group = elementgroup.getMeshGroup()
-                    if self._selection_mode == SelectionMode.EXCLUSIVE:
-                        remove_current = group.getSize() == 1 and group.containsElement(elem)
-                        self._selectionGroup.clear()
-                        if not remove_current:
-                            group.addElement(elem)
-                    elif self._selection_mode == SelectionMode.ADDITIVE:
-                        if group.containsElement(elem):
-                            group.removeElement(elem)
-                        else:
-                            group.addElement(elem)
-            top_region.endHierarchicalChange()
+                    if elem.isValid():
+                        group = self._getSelectionElementGroup(elem.getMesh()).getMeshGroup()
+                        if self._selection_mode == SelectionMode.EXCLUSIVE:
+                            remove_current = group.getSize() == 1 and group.containsElement(elem)
+                            self._clearSelection()
+                            if not remove_current:
+                                group.addElement(elem)
+                                self._recordSelectionChange(elem.getMesh(), True, [elem.getIdentifier()], group)
+                        elif self._selection_mode == SelectionMode.ADDITIVE:
+                            if group.containsElement(elem):
+                                group.removeElement(elem)
+                                self._recordSelectionChange(elem.getMesh(), False, [elem.getIdentifier()], group)
+                            else:
+                                group.addElement(elem)
+                                self._recordSelectionChange(elem.getMesh(), True, [elem.getIdentifier()], group)
+            self._endSelectionChange()
             self._selection_mode = SelectionMode.NONE
         elif not self._ignore_mouse_events and self._handle_mouse_events:
             SceneviewerWidget.mouseReleaseEvent(self, event)
@@ -344,24 +1021,20 @@ class SelectionSceneviewerWidget(SceneviewerWidget):
         change to the viewport.
         '''
         event.accept()
-        if not self._ignore_mouse_events and self._selection_mode != SelectionMode.NONE:
-            x = event.x()
-            y = event.y()
-            xdiff = float(x - self._selection_position_start[0])
-            ydiff = float(y - self._selection_position_start[1])
-            if abs(xdiff) < 0.0001:
-                xdiff = 1
-            if abs(ydiff) < 0.0001:
-                ydiff = 1
-            xoff = float(self._selection_position_start[0]) / xdiff + 0.5
-            yoff = float(self._selection_position_start[1]) / ydiff + 0.5
-            scene = self._selection_box.getScene()
-            scene.beginChange()
-            attributes = self._selection_box.getGraphicspointattributes()
-            attributes.setBaseSize([xdiff, ydiff, 0.999])
-            attributes.setGlyphOffset([xoff, -yoff, 0])
-            self._selection_box.setVisibilityFlag(True)
-            scene.endChange()
+        if self._hoverEnabled and not self._ignore_mouse_events and event.buttons() == QtCore.Qt.NoButton:
+            self._scheduleHover(event)
+        if not self._ignore_mouse_events and self._selection_mode != SelectionMode.NONE and \
+                self._selectionShape != SelectionShape.RECTANGLE:
+            if self._selectionShape == SelectionShape.LASSO:
+                # skip points too close to the last to keep the lasso polygon short
+                dx = event.x() - self._selection_polygon[-1][0]
+                dy = event.y() - self._selection_polygon[-1][1]
+                if dx*dx + dy*dy >= LASSO_POINT_SPACING*LASSO_POINT_SPACING:
+                    self._selection_polygon.append((event.x(), event.y()))
+                    self.requestFrame()
+        elif not self._ignore_mouse_events and self._selection_mode != SelectionMode.NONE:
+            x0, y0 = self._selection_position_start
+            self._setSelectionRectangle((x0, y0, event.x(), event.y()))
         elif not self._ignore_mouse_events and self._handle_mouse_events:
             SceneviewerWidget.mouseMoveEvent(self, event)
 
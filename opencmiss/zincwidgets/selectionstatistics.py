@@ -0,0 +1,163 @@
+"""
+Zinc Selection Statistics
+
+Count, centroid and axis-aligned bounding box of the coordinates of the
+selected nodes and data points in a region tree, kept up to date from the
+added and removed identifiers of selection summaries so only changed nodes
+are evaluated. Coordinates are re-read for a nodeset when its coordinate
+field changes.
+
+Coordinates are those of each region's coordinate field; scene transforms
+of child regions are not applied.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import numpy
+
+from opencmiss.zinc.field import Field
+from opencmiss.zinc.status import OK
+from selectionoperations import findCoordinateField, splitSelectionKey
+
+
+class _NodesetStatistics(object):
+
+    def __init__(self, nodeset, coordinate_field):
+        self.nodeset = nodeset
+        self.coordinate_field = coordinate_field
+        self.identifiers = numpy.zeros(0, dtype=numpy.int64)
+        self.coordinates = numpy.zeros((0, 3))
+        self.dirty = False
+        fieldmodule = nodeset.getFieldmodule()
+        self._fieldmodulenotifier = fieldmodule.createFieldmodulenotifier()
+        self._fieldmodulenotifier.setCallback(self._zincFieldmoduleEvent)
+
+    def _zincFieldmoduleEvent(self, event):
+        if event.getFieldChangeFlags(self.coordinate_field) & Field.CHANGE_FLAG_RESULT:
+            self.dirty = True
+
+    def evaluate(self, identifiers):
+        '''
+        Return the identifiers of the nodes with coordinates and an N x 3
+        array of their coordinates.
+        '''
+        fieldmodule = self.nodeset.getFieldmodule()
+        fieldcache = fieldmodule.createFieldcache()
+        number_of_components = self.coordinate_field.getNumberOfComponents()
+        evaluated = []
+        coordinates = numpy.zeros((len(identifiers), 3))
+        for identifier in identifiers:
+            node = self.nodeset.findNodeByIdentifier(int(identifier))
+            fieldcache.setNode(node)
+            result, x = self.coordinate_field.evaluateReal(fieldcache, number_of_components)
+            if result == OK:
+                if number_of_components == 1:
+                    x = [x]
+                coordinates[len(evaluated), :min(3, number_of_components)] = x[:3]
+                evaluated.append(identifier)
+        return numpy.array(evaluated, dtype=numpy.int64), coordinates[:len(evaluated)]
+
+    def update(self, added, removed):
+        if self.dirty:
+            self.dirty = False
+            identifiers = numpy.union1d(numpy.setdiff1d(self.identifiers, removed), added)
+            self.identifiers, self.coordinates = self.evaluate(identifiers)
+            return
+        if len(removed):
+            keep = ~numpy.isin(self.identifiers, removed)
+            self.identifiers = self.identifiers[keep]
+            self.coordinates = self.coordinates[keep]
+        if len(added):
+            identifiers, coordinates = self.evaluate(added)
+            self.identifiers = numpy.concatenate((self.identifiers, identifiers))
+            self.coordinates = numpy.concatenate((self.coordinates, coordinates))
+
+
+class SelectionStatistics(object):
+
+    def __init__(self, region):
+        '''
+        Statistics of the selection group for region, updated by passing each
+        SelectionSummary of its changes to update.
+        '''
+        self._region = region
+        self._nodesets = {}
+
+    def _getNodesetStatistics(self, key):
+        if key in self._nodesets:
+            return self._nodesets[key]
+        path, name = splitSelectionKey(key)
+        region = self._region.findSubregion(path) if path else self._region
+        statistics = None
+        if region.isValid():
+            fieldmodule = region.getFieldmodule()
+            nodeset = fieldmodule.findNodesetByName(name)
+            coordinate_field = findCoordinateField(fieldmodule)
+            if nodeset.isValid() and coordinate_field.isValid():
+                statistics = _NodesetStatistics(nodeset, coordinate_field)
+        # elements and nodesets without coordinates are not included
+        self._nodesets[key] = statistics
+        return statistics
+
+    def update(self, summary):
+        '''
+        Apply the added and removed identifiers in the SelectionSummary.
+        '''
+        keys = set(summary.getNames())
+        keys.update(key for key in self._nodesets if self._nodesets[key] is not None)
+        for key in keys:
+            added = summary.getAdded(key)
+            removed = summary.getRemoved(key)
+            statistics = self._getNodesetStatistics(key)
+            if statistics is not None and (len(added) or len(removed) or statistics.dirty):
+                statistics.update(added, removed)
+
+    def _refresh(self):
+        for statistics in self._nodesets.values():
+            if statistics is not None and statistics.dirty:
+                statistics.update(numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64))
+
+    def _getCoordinates(self):
+        self._refresh()
+        arrays = [statistics.coordinates for statistics in self._nodesets.values() if statistics is not None]
+        if not arrays:
+            return numpy.zeros((0, 3))
+        return numpy.concatenate(arrays)
+
+    def getCount(self):
+        '''
+        Return the number of selected nodes and data points with coordinates.
+        '''
+        self._refresh()
+        return sum(len(statistics.identifiers) for statistics in self._nodesets.values() if statistics is not None)
+
+    def getCounts(self):
+        '''
+        Return a dict of the number of selected nodes with coordinates per
+        nodeset key.
+        '''
+        self._refresh()
+        return dict((key, len(statistics.identifiers)) for key, statistics in self._nodesets.items()
+                    if statistics is not None and len(statistics.identifiers))
+
+    def getCentroid(self):
+        '''
+        Return the mean of the selected node coordinates, or None if no nodes
+        are selected.
+        '''
+        coordinates = self._getCoordinates()
+        if len(coordinates) == 0:
+            return None
+        return coordinates.mean(axis=0).tolist()
+
+    def getBoundingBox(self):
+        '''
+        Return the minimum and maximum of the selected node coordinates, or
+        None if no nodes are selected.
+        '''
+        coordinates = self._getCoordinates()
+        if len(coordinates) == 0:
+            return None
+        return coordinates.min(axis=0).tolist(), coordinates.max(axis=0).tolist()
@@ -0,0 +1,186 @@
+"""
+Zinc Selection Summary
+
+Summarises a change to a scene's selection group: the number of selected
+objects in each nodeset and mesh of the region tree, and the identifiers
+added and removed since the previous summary. Changes made through known
+identifiers can be recorded as they happen so the next summary needs no
+reading of the whole selection.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import numpy
+
+from opencmiss.zinc.field import Field
+from selectionoperations import nodesetIdentifiers, meshIdentifiers, regionTree, getRegionGroup, \
+    getRelativeRegionPath, selectionKey
+
+
+def selectionIdentifiers(group):
+    '''
+    Return a dict mapping nodeset and mesh keys to sorted arrays of the
+    identifiers of the nodes and elements in the hierarchical group, for
+    those nodesets and meshes the group has a subgroup for. Keys are the
+    nodeset or mesh name in the group's own region, and prefixed by the
+    relative region path in subregions, e.g. 'heart/nodes'.
+    '''
+    identifiers = {}
+    if group is None or not group.isValid():
+        return identifiers
+    top_region = group.getFieldmodule().getRegion()
+    for region in regionTree(top_region):
+        region_group = getRegionGroup(group, region)
+        if not region_group.isValid():
+            continue
+        path = getRelativeRegionPath(top_region, region)
+        fieldmodule = region.getFieldmodule()
+        for domain_type in [Field.DOMAIN_TYPE_NODES, Field.DOMAIN_TYPE_DATAPOINTS]:
+            nodeset = fieldmodule.findNodesetByFieldDomainType(domain_type)
+            nodegroup = region_group.getFieldNodeGroup(nodeset)
+            if nodegroup.isValid():
+                identifiers[selectionKey(path, nodeset.getName())] = nodesetIdentifiers(nodegroup.getNodesetGroup())
+        for dimension in range(3, 0, -1):
+            mesh = fieldmodule.findMeshByDimension(dimension)
+            elementgroup = region_group.getFieldElementGroup(mesh)
+            if elementgroup.isValid():
+                identifiers[selectionKey(path, mesh.getName())] = meshIdentifiers(elementgroup.getMeshGroup())
+    return identifiers
+
+
+class SelectionSummary(object):
+
+    def __init__(self, previous, current, added=None, removed=None):
+        '''
+        Summarise the change between two dicts returned by
+        selectionIdentifiers. Dicts of the added and removed identifiers
+        may be passed if already known, otherwise they are found by
+        comparing previous and current.
+        '''
+        self._identifiers = current
+        if added is not None and removed is not None:
+            self._added = dict((name, ids) for name, ids in added.items() if len(ids))
+            self._removed = dict((name, ids) for name, ids in removed.items() if len(ids))
+            return
+        self._added = {}
+        self._removed = {}
+        empty = numpy.zeros(0, dtype=numpy.int64)
+        for name in set(previous) | set(current):
+            before = previous.get(name, empty)
+            after = current.get(name, empty)
+            added = numpy.setdiff1d(after, before, assume_unique=True)
+            removed = numpy.setdiff1d(before, after, assume_unique=True)
+            if len(added):
+                self._added[name] = added
+            if len(removed):
+                self._removed[name] = removed
+
+    def getNames(self):
+        '''
+        Return the keys of the nodesets and meshes with selected objects.
+        '''
+        return sorted(name for name in self._identifiers if len(self._identifiers[name]))
+
+    def getCounts(self):
+        '''
+        Return a dict of the number of selected objects per nodeset and mesh key.
+        '''
+        return dict((name, len(self._identifiers[name])) for name in self.getNames())
+
+    def getCount(self, name):
+        return len(self._identifiers.get(name, []))
+
+    def getIdentifiers(self, name):
+        return self._identifiers.get(name, numpy.zeros(0, dtype=numpy.int64))
+
+    def getAdded(self, name):
+        return self._added.get(name, numpy.zeros(0, dtype=numpy.int64))
+
+    def getRemoved(self, name):
+        return self._removed.get(name, numpy.zeros(0, dtype=numpy.int64))
+
+    def isChanged(self):
+        return bool(self._added or self._removed)
+
+    def __repr__(self):
+        return 'SelectionSummary(counts=%r, added=%r, removed=%r)' % (
+            self.getCounts(),
+            dict((name, len(ids)) for name, ids in self._added.items()),
+            dict((name, len(ids)) for name, ids in self._removed.items()))
+
+
+def _sortedContains(sorted_identifiers, identifiers):
+    '''
+    Return a mask of the identifiers array which are in the sorted array
+    sorted_identifiers, by binary search.
+    '''
+    positions = numpy.searchsorted(sorted_identifiers, identifiers)
+    mask = positions < len(sorted_identifiers)
+    mask[mask] = sorted_identifiers[positions[mask]] == identifiers[mask]
+    return mask
+
+
+class SelectionChanges(object):
+
+    def __init__(self, previous):
+        '''
+        Record changes to the selection summarised by previous, a dict
+        returned by selectionIdentifiers, from the identifiers added and
+        removed, so only the changed nodesets and meshes are updated.
+        '''
+        self._previous = previous
+        self._current = {}
+        self._added = {}
+        self._removed = {}
+
+    def _getCurrent(self, key):
+        current = self._current.get(key)
+        if current is None:
+            current = self._previous.get(key, numpy.zeros(0, dtype=numpy.int64))
+        return current
+
+    def change(self, key, add, identifiers, size):
+        '''
+        Record that the objects with the given identifiers were added to the
+        nodeset or mesh group with the key, or removed if add is False, where
+        identifiers may include objects already in or not in the group. Size
+        is the group size after the change. Returns False if it does not
+        match the recorded identifiers, e.g. when some identifiers have no
+        object, in which case the selection must be read again.
+        '''
+        identifiers = numpy.unique(numpy.asarray(identifiers, dtype=numpy.int64))
+        current = self._getCurrent(key)
+        contained = _sortedContains(current, identifiers)
+        empty = numpy.zeros(0, dtype=numpy.int64)
+        added = self._added.get(key, empty)
+        removed = self._removed.get(key, empty)
+        if add:
+            changed = identifiers[~contained]
+            current = numpy.insert(current, numpy.searchsorted(current, changed), changed)
+            self._added[key] = numpy.union1d(added, numpy.setdiff1d(changed, removed, assume_unique=True))
+            self._removed[key] = numpy.setdiff1d(removed, changed, assume_unique=True)
+        else:
+            changed = identifiers[contained]
+            current = numpy.delete(current, numpy.searchsorted(current, changed))
+            self._removed[key] = numpy.union1d(removed, numpy.setdiff1d(changed, added, assume_unique=True))
+            self._added[key] = numpy.setdiff1d(added, changed, assume_unique=True)
+        self._current[key] = current
+        return len(current) == size
+
+    def clear(self):
+        '''
+        Record that the whole selection was cleared.
+        '''
+        for key in set(self._previous) | set(self._current):
+            self.change(key, False, self._getCurrent(key), 0)
+
+    def getSummary(self):
+        '''
+        Return the current selection identifiers as returned by
+        selectionIdentifiers and the SelectionSummary of the recorded changes.
+        '''
+        current = dict(self._previous)
+        current.update(self._current)
+        return current, SelectionSummary(self._previous, current, self._added, self._removed)